@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "myapp.querybudget.QueryBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -58,6 +59,23 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Per-request query limits checked by QueryBudgetMiddleware (see myapp/querybudget.py).
+# Budgets are keyed by URL name; requests over budget are logged, or raised when RAISE is set.
+QUERY_BUDGET = {
+    "DEFAULT": config("QUERY_BUDGET_DEFAULT", default=50, cast=int),
+    "VIEWS": {},
+    "REPEAT_LIMIT": config("QUERY_BUDGET_REPEAT_LIMIT", default=10, cast=int),
+    "SAMPLE_RATE": config("QUERY_BUDGET_SAMPLE_RATE", default=1.0, cast=float),
+    "RAISE": config("QUERY_BUDGET_RAISE", default=False, cast=bool),
+}
+
+# Batching of the study-mode answer log (see myapp/reviewevents.py). Answers are
+# queued per process and written together every FLUSH_SIZE events or FLUSH_INTERVAL_MS.
+REVIEW_EVENTS = {
+    "FLUSH_SIZE": config("REVIEW_EVENTS_FLUSH_SIZE", default=200, cast=int),
+    "FLUSH_INTERVAL_MS": config("REVIEW_EVENTS_FLUSH_INTERVAL_MS", default=2000, cast=int),
+}
+
 X_FRAME_OPTIONS = "ALLOW-FROM preview.app.github.dev"
 
 ROOT_URLCONF = "flashcard.urls"
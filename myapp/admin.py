@@ -1,11 +1,16 @@
 from django.contrib import admin
 from .models import (
+    CardSchedule,
+    CardStat,
     FlashCardSet, 
     FlashCard, 
     Collection, 
     Comment, 
     CreationLimit, 
     Rating, 
+    RatingSummary,
+    ReviewEvent,
+    StudyEnrollment,
     UserDailyCreation,
     Tag,
     UserFavorite
@@ -63,6 +68,11 @@ class RatingAdmin(admin.ModelAdmin):
     search_fields = ('user__username',)
     list_filter = ('score',)
 
+@admin.register(RatingSummary)
+class RatingSummaryAdmin(admin.ModelAdmin):
+    list_display = ('content_object', 'score_count', 'average')
+    readonly_fields = ('score_sum', 'score_count', 'count_1', 'count_2', 'count_3', 'count_4', 'count_5')
+
 @admin.register(UserDailyCreation)
 class UserDailyCreationAdmin(admin.ModelAdmin):
     list_display = ('user', 'date', 'flashcards_created', 'sets_created', 'collections_created')
@@ -74,3 +84,28 @@ class UserFavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'content_object', 'added_at')
     search_fields = ('user__username',)
     list_filter = ('added_at',)
+
+@admin.register(CardSchedule)
+class CardScheduleAdmin(admin.ModelAdmin):
+    list_display = ('user', 'card', 'due_at', 'interval', 'ease', 'repetitions', 'lapses')
+    search_fields = ('user__username', 'card__question')
+    raw_id_fields = ('user', 'card', 'flashcard_set')
+
+@admin.register(StudyEnrollment)
+class StudyEnrollmentAdmin(admin.ModelAdmin):
+    list_display = ('user', 'flashcard_set', 'deck_version')
+    search_fields = ('user__username', 'flashcard_set__name')
+    raw_id_fields = ('user', 'flashcard_set')
+
+@admin.register(ReviewEvent)
+class ReviewEventAdmin(admin.ModelAdmin):
+    list_display = ('user', 'card', 'grade', 'correct', 'latency_ms', 'answered_at')
+    search_fields = ('user__username',)
+    list_filter = ('grade', 'correct')
+    raw_id_fields = ('user', 'card')
+
+@admin.register(CardStat)
+class CardStatAdmin(admin.ModelAdmin):
+    list_display = ('user', 'card', 'answers', 'correct', 'last_answered_at')
+    search_fields = ('user__username', 'card__question')
+    raw_id_fields = ('user', 'card')
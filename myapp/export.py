@@ -0,0 +1,84 @@
+# myapp/export.py
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .models import Collection, FlashCard, FlashCardSet
+from .utils import get_rating_summaries
+
+CHUNK_SIZE = 500
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def set_record(flashcard_set, summary):
+    return {
+        'type': 'set',
+        'id': flashcard_set.id,
+        'name': flashcard_set.name,
+        'author': flashcard_set.author.username if flashcard_set.author else None,
+        'createdAt': flashcard_set.createdAt,
+        'updatedAt': flashcard_set.updatedAt,
+        'tags': [tag.name for tag in flashcard_set.tags.all()],
+        'rating': {
+            'average': summary.average,
+            'count': summary.score_count,
+            'histogram': summary.histogram,
+        },
+        'cards': [
+            {'question': card.question, 'answer': card.answer, 'difficulty': card.difficulty}
+            for card in flashcard_set.cards.all()
+        ],
+    }
+
+
+def collection_record(collection):
+    return {
+        'type': 'collection',
+        'id': collection.id,
+        'name': collection.name,
+        'description': collection.description,
+        'comment': collection.comment,
+        'author': collection.author.username,
+        'createdAt': collection.created_at,
+        'sets': [flashcard_set.id for flashcard_set in collection.sets.all()],
+    }
+
+
+def iter_records(author=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield export records for every set and then every collection, optionally
+    only those of one author. Rows are read with .iterator(chunk_size), and the
+    cards, tags and rating summaries are fetched once per chunk, so memory use
+    depends on the chunk size rather than on the number of sets.
+    """
+    sets = FlashCardSet.objects.select_related('author').prefetch_related(
+        'tags',
+        Prefetch('cards', queryset=FlashCard.objects.order_by('id').only('set_id', 'question', 'answer', 'difficulty')),
+    ).order_by('id')
+    collections = Collection.objects.select_related('author').prefetch_related(
+        Prefetch('sets', queryset=FlashCardSet.objects.only('id'))
+    ).order_by('id')
+    if author is not None:
+        sets = sets.filter(author=author)
+        collections = collections.filter(author=author)
+
+    for chunk in _chunks(sets.iterator(chunk_size=chunk_size), chunk_size):
+        summaries = get_rating_summaries(chunk)
+        for flashcard_set in chunk:
+            yield set_record(flashcard_set, summaries[flashcard_set.id])
+
+    for collection in collections.iterator(chunk_size=chunk_size):
+        yield collection_record(collection)
+
+
+def iter_ndjson(author=None, chunk_size=CHUNK_SIZE):
+    """The export as NDJSON lines (one record per line, newline included)."""
+    for record in iter_records(author=author, chunk_size=chunk_size):
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
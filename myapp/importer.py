@@ -0,0 +1,221 @@
+# myapp/importer.py
+import csv
+import json
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+
+from . import quota, search
+from .models import FlashCard, FlashCardSet, Tag
+from .serializers import FlashCardSerializer
+from .tags import MAX_TAGS_PER_SET, parse_tag_names, resolve_tags, tag_index
+from .utils import touch_flashcard_set
+
+CHUNK_SIZE = 500
+FORMATS = ('csv', 'ndjson')
+# Errors that reject the whole set rather than one card
+SET_ERROR_KEYS = {'line', 'set', 'tags', 'cards'}
+
+
+class ImportRow:
+    """One card to import (card is None for a set without cards), with its source row number."""
+
+    def __init__(self, row, set_key, set_name, tags, card=None, errors=None):
+        self.row = row
+        self.set_key = set_key
+        self.set_name = set_name
+        self.tags = tags
+        self.card = card
+        self.errors = errors
+
+
+def iter_csv_rows(lines):
+    """
+    Rows of a CSV file with the columns set, question, answer and optionally
+    difficulty and tags (comma or semicolon separated). Rows with the same set
+    name go into one set; its tags come from the first of those rows.
+    """
+    reader = csv.DictReader(lines)
+    for record in reader:
+        name = (record.get('set') or '').strip()
+        card = {'question': record.get('question') or '', 'answer': record.get('answer') or ''}
+        if record.get('difficulty'):
+            card['difficulty'] = record['difficulty'].strip()
+        yield ImportRow(reader.line_num, name, name, parse_tag_names(record.get('tags')), card)
+
+
+def iter_ndjson_rows(lines):
+    """
+    Rows of an NDJSON file with one set per line, in the format written by the
+    export: {"name": ..., "tags": [...], "cards": [{"question": ..., ...}]}.
+    Collection records are skipped.
+    """
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield ImportRow(number, number, '', [], errors={'line': [f"Invalid JSON: {exc}"]})
+            continue
+        if not isinstance(record, dict):
+            yield ImportRow(number, number, '', [], errors={'line': ["Expected a JSON object."]})
+            continue
+        if record.get('type', 'set') != 'set':
+            continue
+
+        name = (record.get('name') or '').strip()
+        tags = parse_tag_names(record.get('tags'))
+        cards = record.get('cards') or []
+        if not isinstance(cards, list):
+            yield ImportRow(number, number, name, tags, errors={'cards': ["Expected a list."]})
+            continue
+        if not cards:
+            yield ImportRow(number, number, name, tags)
+        for card in cards:
+            yield ImportRow(number, number, name, tags, card)
+
+
+def _validate(row):
+    errors = {}
+    if not row.set_name:
+        errors['set'] = ["A set name is required."]
+    elif len(row.set_name) > FlashCardSet._meta.get_field('name').max_length:
+        errors['set'] = ["The set name is too long."]
+    if len(row.tags) > MAX_TAGS_PER_SET:
+        errors['tags'] = [f"A set cannot have more than {MAX_TAGS_PER_SET} tags."]
+    elif any(len(name) > Tag._meta.get_field('name').max_length for name in row.tags):
+        errors['tags'] = ["A tag name is too long."]
+    if row.card is not None:
+        serializer = FlashCardSerializer(data=row.card)
+        if serializer.is_valid():
+            row.card = serializer.validated_data
+        else:
+            errors.update(serializer.errors)
+    return errors
+
+
+def run_import(rows, user, chunk_size=CHUNK_SIZE):
+    """
+    Import rows from iter_csv_rows() / iter_ndjson_rows() for `user`, chunk by
+    chunk. Only one chunk is held in memory; each chunk is charged against the
+    daily set and flashcard limits as a batch and written in one transaction
+    with bulk_create.
+
+    Yields event dicts as it goes: {'type': 'error', 'row', 'errors'} for each
+    rejected row, {'type': 'progress', ...} after each chunk and a final
+    {'type': 'summary', ...}. An exceeded limit, or a line that is not UTF-8,
+    stops the import; the rows before it are kept.
+    """
+    set_ids = {}
+    totals = Counter()
+    rows = iter(rows)
+    stopped = None
+    # Source row whose set was rejected; its other cards are skipped without a new error
+    rejected_row = None
+
+    while not stopped:
+        chunk, undecodable = _read_chunk(rows, chunk_size)
+        if undecodable is not None:
+            stopped = "The file is not UTF-8 text."
+        if not chunk and not stopped:
+            break
+
+        accepted = []
+        for row in chunk:
+            totals['rows'] += 1
+            if row.row == rejected_row:
+                continue
+            errors = row.errors or _validate(row)
+            if errors:
+                if SET_ERROR_KEYS & errors.keys():
+                    rejected_row = row.row
+                totals['errors'] += 1
+                yield {'type': 'error', 'row': row.row, 'errors': errors}
+            else:
+                accepted.append(row)
+
+        try:
+            written = _write_chunk(accepted, user, set_ids)
+        except quota.QuotaExceeded as exc:
+            stopped = str(exc)
+            yield {'type': 'error', 'row': chunk[0].row, 'errors': {'quota': [stopped]}}
+            break
+        totals.update(written)
+        yield {'type': 'progress', 'rows': totals['rows'], 'sets_created': totals['sets'], 'cards_created': totals['cards']}
+        if undecodable is not None:
+            # Reported against the row after the last one read
+            totals['errors'] += 1
+            yield {
+                'type': 'error',
+                'row': chunk[-1].row + 1 if chunk else 1,
+                'errors': {'file': [f"{stopped} {undecodable.reason} at byte {undecodable.start} of a line."]},
+            }
+
+    yield {
+        'type': 'summary',
+        'rows': totals['rows'],
+        'sets_created': totals['sets'],
+        'cards_created': totals['cards'],
+        'errors': totals['errors'],
+        'stopped': stopped,
+    }
+
+
+def _read_chunk(rows, chunk_size):
+    """
+    Up to `chunk_size` rows, and the UnicodeDecodeError that cut them short, if
+    any. The upload is decoded as it is read, so a bad byte only surfaces here.
+    """
+    chunk = []
+    try:
+        for row in islice(rows, chunk_size):
+            chunk.append(row)
+    except UnicodeDecodeError as exc:
+        return chunk, exc
+    return chunk, None
+
+
+def _write_chunk(rows, user, set_ids):
+    new_sets = {}
+    for row in rows:
+        if row.set_key not in set_ids and row.set_key not in new_sets:
+            new_sets[row.set_key] = row
+    cards = [row for row in rows if row.card is not None]
+    if not new_sets and not cards:
+        return {}
+
+    with transaction.atomic():
+        if new_sets:
+            quota.consume(user, 'set', len(new_sets))
+        if cards:
+            quota.consume(user, 'flashcard', len(cards))
+
+        created_sets = FlashCardSet.objects.bulk_create(
+            [FlashCardSet(name=row.set_name, author=user) for row in new_sets.values()]
+        )
+        tags = resolve_tags(name for row in new_sets.values() for name in row.tags)
+        SetTag = FlashCardSet.tags.through
+        memberships = []
+        for key, flashcard_set in zip(new_sets, created_sets):
+            set_ids[key] = flashcard_set.pk
+            memberships += [SetTag(flashcardset_id=flashcard_set.pk, tag_id=tags[name].pk) for name in set(new_sets[key].tags)]
+        SetTag.objects.bulk_create(memberships, ignore_conflicts=True)
+        tag_index.adjust_counts(Counter(membership.tag_id for membership in memberships))
+
+        # bulk_create skips the signal handlers, so update counters once per set
+        next_ordinal = {}
+        for set_id, count in Counter(set_ids[row.set_key] for row in cards).items():
+            next_ordinal[set_id] = FlashCard.reserve_ordinals(set_id, count)
+            touch_flashcard_set(set_id, 'card_version')
+        new_cards = []
+        for row in cards:
+            set_id = set_ids[row.set_key]
+            new_cards.append(FlashCard(set_id=set_id, ordinal=next_ordinal[set_id], **row.card))
+            next_ordinal[set_id] += 1
+        FlashCard.objects.bulk_create(new_cards)
+
+    touched = {set_ids[row.set_key] for row in rows}
+    search.index_sets(touched)
+    return {'sets': len(created_sets), 'cards': len(cards)}
@@ -0,0 +1,117 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from myapp.models import Comment, FlashCardSet, Rating, UserFavorite
+
+# Indexes added for the comment and rating lookups
+BENCHMARKED_INDEXES = ['comment_set_recent_idx', 'rating_target_score_idx']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large throwaway dataset, then print the query plan and timing of the hot "
+        "comment, rating and favorite lookups with and without their indexes. "
+        "Everything runs in one transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sets', type=int, default=2000, help="Number of flashcard sets to seed.")
+        parser.add_argument('--users', type=int, default=200, help="Number of users to seed.")
+        parser.add_argument('--comments-per-set', type=int, default=20)
+        parser.add_argument('--ratings-per-user', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                queries = self.hot_queries()
+                self.report("With indexes", queries, options['repeat'])
+                with connection.cursor() as cursor:
+                    for name in BENCHMARKED_INDEXES:
+                        cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+                self.report("Without indexes", queries, options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS("Done; seeded rows and index changes were rolled back."))
+
+    def seed(self, options):
+        rng = random.Random(0)
+        users = User.objects.bulk_create(
+            [User(username=f'bench-user-{i}') for i in range(options['users'])]
+        )
+        sets = FlashCardSet.objects.bulk_create(
+            [FlashCardSet(name=f'Bench set {i}', author=rng.choice(users)) for i in range(options['sets'])],
+            batch_size=1000,
+        )
+        set_ct = ContentType.objects.get_for_model(FlashCardSet)
+
+        comments = []
+        for flashcard_set in sets:
+            for i in range(options['comments_per_set']):
+                comments.append(Comment(
+                    author=rng.choice(users), content=f'Comment {i}', flashcard_set=flashcard_set,
+                    content_type=set_ct, object_id=flashcard_set.id,
+                ))
+        Comment.objects.bulk_create(comments, batch_size=1000)
+
+        ratings, favorites = [], []
+        per_user = min(options['ratings_per_user'], len(sets))
+        for user in users:
+            for flashcard_set in rng.sample(sets, per_user):
+                ratings.append(Rating(user=user, score=rng.randint(1, 5), content_type=set_ct, object_id=flashcard_set.id))
+                favorites.append(UserFavorite(user=user, content_type=set_ct, object_id=flashcard_set.id))
+        Rating.objects.bulk_create(ratings, batch_size=1000)
+        UserFavorite.objects.bulk_create(favorites, batch_size=1000)
+
+        self.stdout.write(
+            f"Seeded {len(users)} users, {len(sets)} sets, {len(comments)} comments, "
+            f"{len(ratings)} ratings and {len(favorites)} favorites."
+        )
+        self.sample_set = sets[len(sets) // 2]
+        self.sample_user = users[len(users) // 2]
+        self.set_ct = set_ct
+
+    def hot_queries(self):
+        # The query shapes used by the views
+        set_id = self.sample_set.id
+        return {
+            "comments on a set, newest first": Comment.objects.for_set(set_id)[:51],
+            "rating totals for a set": Rating.objects.filter(
+                content_type=self.set_ct, object_id=set_id
+            ).values('content_type_id', 'object_id').annotate(total=Sum('score'), count=Count('id')).order_by(),
+            "favorite sets of a user": UserFavorite.objects.filter(
+                user=self.sample_user, content_type=self.set_ct
+            ).values_list('object_id', flat=True),
+        }
+
+    def report(self, heading, queries, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(heading))
+        for label, queryset in queries.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(f"  {label}: best of {repeat} {min(timings) * 1000:.2f} ms")
+            for line in self.explain(queryset, heading):
+                self.stdout.write(f"    {line}")
+
+    def explain(self, queryset, tag):
+        # The tag makes each pass a distinct statement: sqlite3 caches prepared
+        # statements by SQL text and would otherwise report the pre-DROP INDEX plan.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql} /* {tag} */", params)
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
@@ -0,0 +1,97 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from myapp import rescheduling
+from myapp.models import CardSchedule, FlashCard, FlashCardSet
+
+
+class _Rollback(Exception):
+    pass
+
+
+def reschedule_each(schedules, interval_modifier=1.0, max_interval=None, min_ease=rescheduling.study.MIN_EASE):
+    """The per-row baseline: load each schedule as a model instance and save it."""
+    for schedule in schedules.filter(last_reviewed_at__isnull=False, interval__gt=0).order_by('id'):
+        schedule.interval *= interval_modifier
+        if max_interval is not None:
+            schedule.interval = min(schedule.interval, max_interval)
+        schedule.ease = max(schedule.ease, min_ease)
+        schedule.due_at = schedule.last_reviewed_at + timedelta(days=schedule.interval)
+        schedule.save(update_fields=['interval', 'ease', 'due_at'])
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway deck with reviewed cards, then time rescheduling it card by card "
+        "against the batch scheduler (myapp.rescheduling). Everything runs in one "
+        "transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=20000, help="Number of cards in the deck.")
+        parser.add_argument('--interval-modifier', type=float, default=0.8)
+        parser.add_argument('--max-interval', type=float, default=365)
+
+    def handle(self, *args, **options):
+        parameters = {'interval_modifier': options['interval_modifier'], 'max_interval': options['max_interval']}
+        try:
+            with transaction.atomic():
+                schedules = self.seed(options['cards'])
+
+                try:
+                    with transaction.atomic():
+                        per_row = self.timed(reschedule_each, schedules, **parameters)
+                        expected = self.snapshot(schedules)
+                        raise _Rollback
+                except _Rollback:
+                    pass
+                batch = self.timed(rescheduling.reschedule, schedules, **parameters)
+
+                self.stdout.write(f"  per-row loop: {per_row:.2f} s")
+                self.stdout.write(f"  batch: {batch:.2f} s, {per_row / batch:.1f}x faster")
+                if self.snapshot(schedules) != expected:
+                    self.stderr.write(self.style.ERROR("  The two methods produced different schedules."))
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS("Done; seeded rows were rolled back."))
+
+    def seed(self, count):
+        rng = random.Random(0)
+        now = timezone.now()
+        user = User.objects.create(username='bench-rescheduling')
+        flashcard_set = FlashCardSet.objects.create(name='Bench deck', author=user)
+        cards = FlashCard.objects.bulk_create(
+            [FlashCard(question=f'Q{i}', answer=f'A{i}', set=flashcard_set) for i in range(count)],
+            batch_size=1000,
+        )
+        schedules = []
+        for card in cards:
+            interval = rng.choice([0, 1, 6]) if rng.random() < 0.3 else rng.uniform(1, 400)
+            reviewed_at = now - timedelta(days=rng.uniform(0, interval or 1))
+            schedules.append(CardSchedule(
+                user=user, card=card, flashcard_set=flashcard_set, interval=interval,
+                ease=rng.uniform(1.2, 3.0), repetitions=rng.randint(1, 10), last_reviewed_at=reviewed_at,
+                due_at=reviewed_at + timedelta(days=interval),
+            ))
+        CardSchedule.objects.bulk_create(schedules, batch_size=1000)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Rescheduling {count} reviewed cards"))
+        return CardSchedule.objects.filter(user=user, flashcard_set=flashcard_set)
+
+    def timed(self, function, *args, **kwargs):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        return time.perf_counter() - start
+
+    def snapshot(self, schedules):
+        # Rounded to the millisecond: the batch path adds seconds as floats
+        return [
+            (schedule_id, round(interval, 9), round(ease, 9), round(due_at.timestamp(), 3))
+            for schedule_id, interval, ease, due_at in schedules.order_by('id').values_list('id', 'interval', 'ease', 'due_at')
+        ]
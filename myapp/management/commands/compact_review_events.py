@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp import reviewevents
+
+
+class Command(BaseCommand):
+    help = "Roll old study-mode answers up into per-user, per-card statistics and delete the raw events."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=float,
+            default=reviewevents.COMPACT_AFTER.days,
+            help="Compact the events answered more than this many days ago.",
+        )
+        parser.add_argument('--chunk-size', type=int, default=reviewevents.COMPACT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['older_than_days'])
+        compacted, written = reviewevents.compact(before, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Compacted {compacted} review events into {written} card stats."))
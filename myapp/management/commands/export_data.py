@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import export
+
+
+class Command(BaseCommand):
+    help = "Write flashcard sets (with cards, tags and ratings) and collections as NDJSON, one record per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only export this user's sets and collections (username).")
+        parser.add_argument('--output', '-o', help="File to write to; defaults to standard output.")
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE, help="Rows read per database round trip.")
+
+    def handle(self, *args, **options):
+        author = None
+        if options['user']:
+            try:
+                author = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        lines = export.iter_ndjson(author=author, chunk_size=options['chunk_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        count = 0
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} records to {options['output']}."))
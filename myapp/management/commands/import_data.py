@@ -0,0 +1,44 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import importer
+
+
+class Command(BaseCommand):
+    help = "Import flashcard sets and cards for a user from a CSV or NDJSON file, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (set,question,answer[,difficulty][,tags]) or NDJSON file.")
+        parser.add_argument('--user', required=True, help="Username that will own the imported sets.")
+        parser.add_argument('--format', choices=importer.FORMATS, help="Defaults to csv for *.csv files, else ndjson.")
+        parser.add_argument('--chunk-size', type=int, default=importer.CHUNK_SIZE, help="Rows written per transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+
+        file_format = options['format'] or ('csv' if options['path'].lower().endswith('.csv') else 'ndjson')
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            rows = importer.iter_csv_rows(lines) if file_format == 'csv' else importer.iter_ndjson_rows(lines)
+            for event in importer.run_import(rows, user, chunk_size=options['chunk_size']):
+                if event['type'] == 'error':
+                    self.stderr.write(self.style.WARNING(f"Row {event['row']}: {json.dumps(event['errors'])}"))
+                elif event['type'] == 'progress':
+                    self.stdout.write(
+                        f"{event['rows']} rows read, {event['sets_created']} sets and "
+                        f"{event['cards_created']} cards created"
+                    )
+                else:
+                    summary = event
+
+        message = (
+            f"Imported {summary['sets_created']} sets and {summary['cards_created']} cards "
+            f"from {summary['rows']} rows ({summary['errors']} rejected)."
+        )
+        if summary['stopped']:
+            raise CommandError(f"{message} Stopped early: {summary['stopped']}")
+        self.stdout.write(self.style.SUCCESS(message))
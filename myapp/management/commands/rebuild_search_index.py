@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from myapp import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for flashcard sets from the database."
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            self.stdout.write(self.style.WARNING(
+                "Full-text search needs SQLite FTS5; searches fall back to icontains on this database."
+            ))
+            return
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} flashcard sets."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from myapp.utils import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild rating summaries (sum, count and histogram per object) from the Rating table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report how many summaries are out of date.",
+        )
+
+    def handle(self, *args, **options):
+        drifted = rebuild_rating_summaries(dry_run=options['dry_run'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All rating summaries are up to date."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{drifted} rating summaries are out of date."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries ({drifted} were out of date)."))
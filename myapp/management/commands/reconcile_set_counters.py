@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from myapp.utils import rebuild_card_ordinals, rebuild_set_counters
+
+
+class Command(BaseCommand):
+    help = "Verify and repair the card, comment and favorite counts stored on flashcard sets, and the card ordinals."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report how many sets have wrong counts.",
+        )
+
+    def handle(self, *args, **options):
+        drifted = rebuild_set_counters(dry_run=options['dry_run'])
+        misnumbered = rebuild_card_ordinals(dry_run=options['dry_run'])
+        if not drifted and not misnumbered:
+            self.stdout.write(self.style.SUCCESS("All set counters are up to date."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f"{drifted} sets have out-of-date counters; {misnumbered} cards have wrong ordinals."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Repaired counters on {drifted} sets and the ordinals of {misnumbered} cards."
+            ))
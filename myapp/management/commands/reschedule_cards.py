@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from myapp import rescheduling, study
+from myapp.models import CardSchedule
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the intervals and due dates of reviewed cards after a change of "
+        "scheduling parameters, optionally only for one user or set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval-modifier', type=float, default=1.0, help="Scale every interval by this factor.")
+        parser.add_argument('--max-interval', type=float, help="Cap intervals at this many days.")
+        parser.add_argument('--min-ease', type=float, default=study.MIN_EASE, help="Raise lower ease factors to this.")
+        parser.add_argument('--user', type=int, help="Only this user's cards (user id).")
+        parser.add_argument('--set', type=int, help="Only the cards of this set (set id).")
+
+    def handle(self, *args, **options):
+        schedules = CardSchedule.objects.all()
+        if options['user'] is not None:
+            schedules = schedules.filter(user_id=options['user'])
+        if options['set'] is not None:
+            schedules = schedules.filter(flashcard_set_id=options['set'])
+        updated = rescheduling.reschedule(
+            schedules,
+            interval_modifier=options['interval_modifier'],
+            max_interval=options['max_interval'],
+            min_ease=options['min_ease'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rescheduled {updated} cards."))
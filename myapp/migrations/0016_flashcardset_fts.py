@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+FTS_TABLE = "myapp_flashcardset_fts"
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, tags, questions, "
+        "tokenize = 'unicode61 remove_diacritics 2', "
+        "prefix = '2 3')"
+    )
+    schema_editor.execute(
+        f"""
+        INSERT INTO {FTS_TABLE} (rowid, name, tags, questions)
+        SELECT s.id,
+               s.name,
+               COALESCE((SELECT group_concat(t.name, ' ')
+                         FROM myapp_tag t
+                         JOIN myapp_flashcardset_tags st ON st.tag_id = t.id
+                         WHERE st.flashcardset_id = s.id), ''),
+               COALESCE((SELECT group_concat(c.question, ' ')
+                         FROM myapp_flashcard c
+                         WHERE c.set_id = s.id), '')
+        FROM myapp_flashcardset s
+        """
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0015_alter_collection_name"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
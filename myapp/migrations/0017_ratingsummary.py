@@ -0,0 +1,65 @@
+# Generated by Django 5.0.14 on 2026-10-18 01:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_rating_summaries(apps, schema_editor):
+    Rating = apps.get_model("myapp", "Rating")
+    RatingSummary = apps.get_model("myapp", "RatingSummary")
+    histogram = {
+        f"count_{score}": Count("id", filter=Q(score=score)) for score in range(1, 6)
+    }
+    rows = (
+        Rating.objects.values("content_type_id", "object_id")
+        .annotate(score_sum=Sum("score"), score_count=Count("id"), **histogram)
+        .order_by()
+    )
+    RatingSummary.objects.bulk_create(
+        (RatingSummary(**row) for row in rows.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("myapp", "0016_flashcardset_fts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RatingSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField()),
+                ("score_sum", models.PositiveIntegerField(default=0)),
+                ("score_count", models.PositiveIntegerField(default=0)),
+                ("count_1", models.PositiveIntegerField(default=0)),
+                ("count_2", models.PositiveIntegerField(default=0)),
+                ("count_3", models.PositiveIntegerField(default=0)),
+                ("count_4", models.PositiveIntegerField(default=0)),
+                ("count_5", models.PositiveIntegerField(default=0)),
+                (
+                    "content_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("content_type", "object_id")},
+            },
+        ),
+        migrations.RunPython(populate_rating_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-18 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0017_ratingsummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flashcardset",
+            name="card_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="flashcardset",
+            name="comment_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.14 on 2026-10-18 01:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("myapp", "0018_flashcardset_versions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="userfavorite",
+            name="myapp_userf_user_id_3406e6_idx",
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["content_type", "object_id", "-created_at"],
+                name="comment_target_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["flashcard_set", "-created_at", "-id"],
+                name="comment_set_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rating",
+            index=models.Index(
+                fields=["content_type", "object_id", "score"],
+                name="rating_target_score_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.14 on 2026-10-18 01:57
+
+from django.db import migrations
+from django.db.models import Exists, F, Max, OuterRef
+
+BATCH_SIZE = 1000
+
+
+def backfill_comment_targets(apps, schema_editor):
+    """
+    Make flashcard_set and (content_type, object_id) agree for every comment
+    on a set. Runs in primary-key chunks, each its own UPDATE, so large tables
+    are not locked for the whole backfill.
+    """
+    Comment = apps.get_model("myapp", "Comment")
+    FlashCardSet = apps.get_model("myapp", "FlashCardSet")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    set_ct, _ = ContentType.objects.get_or_create(
+        app_label="myapp", model="flashcardset"
+    )
+
+    last_id = Comment.objects.aggregate(last=Max("id"))["last"] or 0
+    set_exists = Exists(FlashCardSet.objects.filter(pk=OuterRef("object_id")))
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        chunk = Comment.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE)
+        # Written through the foreign key: copy it into the generic relation
+        chunk.filter(flashcard_set__isnull=False).update(
+            content_type_id=set_ct.id, object_id=F("flashcard_set_id")
+        )
+        # Written through content_object: copy it into the foreign key,
+        # skipping comments whose set no longer exists
+        chunk.filter(flashcard_set__isnull=True, content_type_id=set_ct.id).filter(
+            set_exists
+        ).update(flashcard_set_id=F("object_id"))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("myapp", "0019_generic_relation_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_comment_targets, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="comment",
+            name="comment_target_recent_idx",
+        ),
+    ]
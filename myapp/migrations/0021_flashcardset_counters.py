@@ -0,0 +1,57 @@
+# Generated by Django 5.0.14 on 2026-10-18 01:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count_of(queryset, field):
+    counts = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .values(field)
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def populate_set_counters(apps, schema_editor):
+    FlashCardSet = apps.get_model("myapp", "FlashCardSet")
+    FlashCard = apps.get_model("myapp", "FlashCard")
+    Comment = apps.get_model("myapp", "Comment")
+    UserFavorite = apps.get_model("myapp", "UserFavorite")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    set_ct = ContentType.objects.filter(app_label="myapp", model="flashcardset").first()
+    favorites = UserFavorite.objects.filter(content_type=set_ct)
+    FlashCardSet.objects.update(
+        card_count=_count_of(FlashCard.objects.all(), "set"),
+        comment_count=_count_of(Comment.objects.all(), "flashcard_set"),
+        favorite_count=_count_of(favorites, "object_id"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("myapp", "0020_unify_comment_target"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flashcardset",
+            name="card_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="flashcardset",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="flashcardset",
+            name="favorite_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_set_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.14 on 2026-10-18 02:10
+
+from django.db import migrations
+
+
+def normalize_tag_names(apps, schema_editor):
+    """
+    Rename tags to their normalized form (lower-case, single spaces). Tags that
+    normalize to the same name are merged into the oldest one.
+    """
+    Tag = apps.get_model("myapp", "Tag")
+    SetTag = apps.get_model("myapp", "FlashCardSet").tags.through
+
+    keep = {}
+    for tag in Tag.objects.order_by("id"):
+        name = " ".join(tag.name.split()).lower()
+        survivor = keep.setdefault(name, tag)
+        if survivor.pk == tag.pk:
+            continue
+        set_ids = SetTag.objects.filter(tag_id=tag.pk).values_list(
+            "flashcardset_id", flat=True
+        )
+        SetTag.objects.bulk_create(
+            [SetTag(flashcardset_id=set_id, tag_id=survivor.pk) for set_id in set_ids],
+            ignore_conflicts=True,
+        )
+        tag.delete()
+
+    for name, tag in keep.items():
+        if tag.name != name:
+            Tag.objects.filter(pk=tag.pk).update(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0021_flashcardset_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_tag_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.14 on 2026-10-18 02:42
+
+import myapp.models
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+
+def number_cards(apps, schema_editor):
+    # Each set's cards get ordinals 0 .. n - 1 in card order
+    FlashCard = apps.get_model("myapp", "FlashCard")
+    ranked = FlashCard.objects.annotate(
+        rank=Window(RowNumber(), partition_by=[F("set_id")], order_by=[F("id").asc()])
+    ).values_list("id", "rank")
+    cards = [
+        FlashCard(id=card_id, ordinal=rank - 1)
+        for card_id, rank in ranked.iterator(chunk_size=2000)
+    ]
+    FlashCard.objects.bulk_update(cards, ["ordinal"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0024_study_session"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="studysession",
+            name="card_ids",
+        ),
+        migrations.AddField(
+            model_name="flashcard",
+            name="ordinal",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="studysession",
+            name="deck_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="studysession",
+            name="seed",
+            field=models.PositiveIntegerField(default=myapp.models.new_session_seed),
+        ),
+        migrations.AddIndex(
+            model_name="flashcard",
+            index=models.Index(fields=["set", "ordinal"], name="card_set_ordinal_idx"),
+        ),
+        migrations.RunPython(number_cards, migrations.RunPython.noop),
+    ]
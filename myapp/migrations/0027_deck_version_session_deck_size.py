@@ -0,0 +1,42 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def size_sessions(apps, schema_editor):
+    # Existing sessions keep their order over the cards the set has now
+    StudySession = apps.get_model("myapp", "StudySession")
+    FlashCardSet = apps.get_model("myapp", "FlashCardSet")
+    StudySession.objects.update(
+        deck_size=Subquery(
+            FlashCardSet.objects.filter(pk=OuterRef("flashcard_set_id")).values(
+                "card_count"
+            )[:1]
+        ),
+        start_deck_version=0,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0026_review_event_card_stat"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flashcardset",
+            name="deck_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RenameField(
+            model_name="studysession",
+            old_name="deck_version",
+            new_name="start_deck_version",
+        ),
+        migrations.AddField(
+            model_name="studysession",
+            name="deck_size",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(size_sessions, migrations.RunPython.noop),
+    ]
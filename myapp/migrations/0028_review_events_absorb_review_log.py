@@ -0,0 +1,57 @@
+# Generated by Django 5.0.14 on 2026-10-18 03:19
+
+from django.db import migrations, models
+
+
+def copy_review_logs(apps, schema_editor):
+    # The review history joins the answer log; any grade but "again" was a right answer
+    ReviewLog = apps.get_model("myapp", "ReviewLog")
+    ReviewEvent = apps.get_model("myapp", "ReviewEvent")
+    ReviewEvent.objects.bulk_create(
+        (
+            ReviewEvent(
+                user_id=log.user_id,
+                card_id=log.card_id,
+                correct=log.grade != 1,
+                answered_at=log.reviewed_at,
+                grade=log.grade,
+                interval=log.interval,
+                ease=log.ease,
+            )
+            for log in ReviewLog.objects.order_by("id").iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0027_deck_version_session_deck_size"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reviewevent",
+            name="ease",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reviewevent",
+            name="grade",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                choices=[(1, "again"), (2, "hard"), (3, "good"), (4, "easy")],
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="reviewevent",
+            name="interval",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_review_logs, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name="ReviewLog",
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0029_study_enrollment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flashcardset",
+            name="stats_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,4 +1,9 @@
-from django.db import models
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import models, transaction
 from django.contrib.auth.models import User  # Import the default User model
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -20,6 +25,25 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+class FlashCardSetQuerySet(models.QuerySet):
+
+    def with_api_relations(self, fields=None):
+        """
+        Load everything FlashCardSetSerializer nests, in a fixed number of queries.
+        Pass the set of serialized field names to skip relations that are not needed.
+        """
+        queryset = self
+        if fields is None or 'author' in fields:
+            queryset = queryset.select_related('author')
+        if fields is None or 'cards' in fields:
+            queryset = queryset.prefetch_related('cards')
+        if fields is None or 'comments' in fields:
+            queryset = queryset.prefetch_related(
+                models.Prefetch('comments', queryset=Comment.objects.newest_first())
+            )
+        return queryset
+
+
 class FlashCardSet(models.Model):
     """Model representing a set of flashcards."""
     name = models.CharField(max_length=255)
@@ -33,6 +57,19 @@ class FlashCardSet(models.Model):
         blank=True
     )
     tags = models.ManyToManyField(Tag, related_name="sets", blank=True)
+    # Bumped whenever a card, comment, rating or favorite of the set changes;
+    # used for HTTP validators. updatedAt only follows edits to the set and its cards.
+    card_version = models.PositiveIntegerField(default=0, editable=False)
+    comment_version = models.PositiveIntegerField(default=0, editable=False)
+    stats_version = models.PositiveIntegerField(default=0, editable=False)  # ratings and favorites
+    # Bumped only when cards are added or removed, which moves cards between ordinals
+    deck_version = models.PositiveIntegerField(default=0, editable=False)
+    # Maintained by signal handlers; `manage.py reconcile_set_counters` repairs drift
+    card_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    favorite_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = FlashCardSetQuerySet.as_manager()
 
     def clean(self):
         super().clean()
@@ -51,6 +88,35 @@ class FlashCard(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     difficulty = models.CharField(max_length=10, choices=Difficulty.choices, null=True,blank=True)
     set = models.ForeignKey(FlashCardSet, related_name="cards", on_delete=models.CASCADE)
+    # Position of the card in its set, 0 .. card_count - 1, in the order cards
+    # were added, which shuffled study sessions permute. Kept dense: deleting a
+    # card moves the later ones down one place.
+    ordinal = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['set', 'ordinal'], name='card_set_ordinal_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            self.ordinal = FlashCard.reserve_ordinals(self.set_id)
+            super().save(*args, **kwargs)
+
+    @staticmethod
+    def reserve_ordinals(set_id, count=1):
+        """
+        Count `count` new cards into the set's card_count and deck_version and
+        return the first of their ordinals. The UPDATE runs before card_count
+        is read, so it holds the set's row lock (on SQLite, the write lock) and
+        concurrent inserts into the set each get their own range. Call it in
+        the transaction that inserts the cards.
+        """
+        sets = FlashCardSet.objects.filter(pk=set_id)
+        sets.update(card_count=models.F('card_count') + count, deck_version=models.F('deck_version') + 1)
+        return sets.values_list('card_count', flat=True).get() - count
 
     def __str__(self):
         return f"FlashCard: {self.question}"
@@ -84,15 +150,28 @@ class UserFavorite(models.Model):
     added_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        indexes = [
-            models.Index(fields=['user', 'content_type', 'object_id']),
-        ]
+        # The unique constraint's index (user, content_type, object_id) also serves
+        # the "favorites of this user of this type" lookups, so no extra index is needed.
         unique_together = ('user', 'content_type', 'object_id')
 
     def __str__(self):
         return f"{self.user.username}'s favorite: {self.content_object}"
     
 
+class CommentQuerySet(models.QuerySet):
+
+    def newest_first(self):
+        return self.select_related('author').order_by('-created_at', '-id')
+
+    def for_set(self, flashcard_set):
+        """
+        Comments on a set, newest first. Reads go through the flashcard_set column
+        (and its comment_set_recent_idx index) only; Comment.save() keeps the
+        generic relation columns in step for older code paths.
+        """
+        return self.filter(flashcard_set=flashcard_set).newest_first()
+
+
 class Comment(models.Model):
     """Model representing comments on a flashcard set or collection."""
     author = models.ForeignKey(
@@ -118,6 +197,27 @@ class Comment(models.Model):
     object_id = models.PositiveIntegerField(null=True, blank=True)
     content_object = GenericForeignKey('content_type', 'object_id')
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Comments on a set, newest first: the index behind CommentQuerySet.for_set()
+            models.Index(fields=['flashcard_set', '-created_at', '-id'], name='comment_set_recent_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.sync_target()
+        super().save(*args, **kwargs)
+
+    def sync_target(self):
+        """Fill flashcard_set and the generic relation from each other, for comments on sets."""
+        set_ct = ContentType.objects.get_for_model(FlashCardSet)
+        if self.flashcard_set_id:
+            self.content_type = set_ct
+            self.object_id = self.flashcard_set_id
+        elif self.content_type_id == set_ct.id and self.object_id:
+            self.flashcard_set_id = self.object_id
+
     def __str__(self):
         author_name = self.author.username if self.author else "Unknown Author"
         return f"Comment by {author_name} on {self.content_object}"
@@ -129,12 +229,75 @@ class CreationLimit(models.Model):
     daily_set_limit = models.PositiveIntegerField(default=5)
     daily_collection_limit = models.PositiveIntegerField(default=5)
 
+    # The cached copies are dropped once the change is committed; dropping them
+    # earlier would let another worker cache the old row under the new stamp
+
     def save(self, *args, **kwargs):
         self.pk = 1 
         super().save(*args, **kwargs)
+        transaction.on_commit(creation_limit_cache.invalidate)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(creation_limit_cache.invalidate)
+        return result
+
+    @classmethod
+    def get_solo(cls):
+        """The limits row, served from the process-local cache."""
+        return creation_limit_cache.get()
 
     def __str__(self):
         return "Global Creation Limits"
+
+
+class CreationLimitCache:
+    """
+    Process-local copy of the CreationLimit row.
+
+    Saving the row stores a new version stamp in Django's cache once the save
+    is committed. Other worker processes compare their copy's stamp with it at
+    most every `check_interval` seconds, so with a shared cache backend a
+    change reaches every worker within that time. With a per-process backend the stamp cannot be shared, so copies
+    are also dropped after `max_age` seconds. Queryset .update() calls bypass
+    save() and are only picked up after `max_age`.
+    """
+    version_key = 'myapp:creation_limit:version'
+    check_interval = 5
+    max_age = 60
+
+    def __init__(self):
+        self._entry = None  # (instance, version, loaded_at, checked_at)
+
+    def get(self):
+        entry = self._entry
+        clock = time.monotonic()
+        if entry is not None:
+            instance, version, loaded_at, checked_at = entry
+            if clock - loaded_at < self.max_age:
+                if clock - checked_at < self.check_interval:
+                    return instance
+                if cache.get(self.version_key) == version:
+                    self._entry = (instance, version, loaded_at, clock)
+                    return instance
+        return self._load(clock)
+
+    def _load(self, clock):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.add(self.version_key, version, None)
+            version = cache.get(self.version_key, version)
+        instance, _ = CreationLimit.objects.get_or_create(pk=1)
+        self._entry = (instance, version, clock, clock)
+        return instance
+
+    def invalidate(self):
+        self._entry = None
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+
+creation_limit_cache = CreationLimitCache()
     
 
 
@@ -148,10 +311,52 @@ class Rating(models.Model):
 
     class Meta:
         unique_together = ('user', 'content_type', 'object_id')
+        indexes = [
+            # Ratings of one object; includes the score so aggregates never touch the table
+            models.Index(fields=['content_type', 'object_id', 'score'], name='rating_target_score_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored score so the rating summary can be adjusted on change
+        instance._loaded_score = instance.score if 'score' in field_names else None
+        return instance
 
     def __str__(self):
         return f"Rating {self.score} by {self.user.username} for {self.content_object}"
 
+
+class RatingSummary(models.Model):
+    """Running totals of the ratings for one object, kept in step with Rating rows."""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    score_sum = models.PositiveIntegerField(default=0)
+    score_count = models.PositiveIntegerField(default=0)
+    # Histogram: number of ratings with each score
+    count_1 = models.PositiveIntegerField(default=0)
+    count_2 = models.PositiveIntegerField(default=0)
+    count_3 = models.PositiveIntegerField(default=0)
+    count_4 = models.PositiveIntegerField(default=0)
+    count_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('content_type', 'object_id')
+
+    @property
+    def average(self):
+        if not self.score_count:
+            return 0.0
+        return round(self.score_sum / self.score_count, 1)
+
+    @property
+    def histogram(self):
+        return {score: getattr(self, f'count_{score}') for score in range(1, 6)}
+
+    def __str__(self):
+        return f"Rating summary for {self.content_object}: {self.average} ({self.score_count})"
+
 class UserDailyCreation(models.Model):
     """Model to track daily creation counts for each user."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_creations')
@@ -166,3 +371,149 @@ class UserDailyCreation(models.Model):
 
     def __str__(self):
         return f"Daily creations for {self.user.username} on {self.date}"
+
+
+class ReviewGrade(models.IntegerChoices):
+    """How well the user recalled a card in study mode."""
+    AGAIN = 1, "again"
+    HARD = 2, "hard"
+    GOOD = 3, "good"
+    EASY = 4, "easy"
+
+
+class CardSchedule(models.Model):
+    """
+    A user's spaced-repetition state for one card. Rows are created when the
+    user starts studying a set and updated by each review; see myapp/study.py.
+    """
+    # The unique (user, card) index covers lookups by user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='card_schedules', db_index=False)
+    card = models.ForeignKey(FlashCard, on_delete=models.CASCADE, related_name='schedules')
+    # Copied from the card so that a set's due cards come straight from an index
+    flashcard_set = models.ForeignKey(FlashCardSet, on_delete=models.CASCADE, related_name='schedules')
+    due_at = models.DateTimeField()
+    interval = models.FloatField(default=0)  # days
+    ease = models.FloatField(default=2.5)
+    repetitions = models.PositiveIntegerField(default=0)  # successful reviews in a row
+    lapses = models.PositiveIntegerField(default=0)
+    last_reviewed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'card')
+        indexes = [
+            # The next due cards of a user, overall and in one set
+            models.Index(fields=['user', 'due_at'], name='schedule_user_due_idx'),
+            models.Index(fields=['user', 'flashcard_set', 'due_at'], name='schedule_user_set_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}'s schedule for {self.card}: due {self.due_at}"
+
+
+class StudyEnrollment(models.Model):
+    """
+    The set's deck_version when the user's schedule rows were last created,
+    so study mode only looks for cards without a schedule after cards were added.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='study_enrollments', db_index=False)
+    flashcard_set = models.ForeignKey(FlashCardSet, on_delete=models.CASCADE, related_name='enrollments')
+    deck_version = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('user', 'flashcard_set')
+
+    def __str__(self):
+        return f"{self.user.username} studies {self.flashcard_set}"
+
+
+class ReviewEvent(models.Model):
+    """
+    One answer given in study mode, with the grade and the schedule it
+    produced. Rows are only ever appended, in batches through the buffer in
+    myapp/reviewevents.py, and are rolled up into CardStat rows and deleted
+    once they are old (compact_review_events); scheduling only reads
+    CardSchedule.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_events')
+    card = models.ForeignKey(FlashCard, on_delete=models.CASCADE, related_name='review_events')
+    correct = models.BooleanField()
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)  # time taken to answer, when the client measured it
+    answered_at = models.DateTimeField(default=timezone.now)
+    grade = models.PositiveSmallIntegerField(choices=ReviewGrade.choices, null=True, blank=True)
+    # The schedule the review produced
+    interval = models.FloatField(null=True, blank=True)
+    ease = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} answered {self.card} {'correctly' if self.correct else 'wrongly'}"
+
+
+class CardStat(models.Model):
+    """A user's answers to one card, summed from the ReviewEvent rows compacted so far."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='card_stats')
+    card = models.ForeignKey(FlashCard, on_delete=models.CASCADE, related_name='stats')
+    answers = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    timed_answers = models.PositiveIntegerField(default=0)  # answers with a latency
+    total_latency_ms = models.PositiveBigIntegerField(default=0)
+    first_answered_at = models.DateTimeField()
+    last_answered_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'card')
+
+    @property
+    def accuracy(self):
+        return self.correct / self.answers if self.answers else None
+
+    @property
+    def mean_latency_ms(self):
+        return self.total_latency_ms / self.timed_answers if self.timed_answers else None
+
+    def __str__(self):
+        return f"{self.user.username}'s stats for {self.card}"
+
+
+def new_session_seed():
+    return random.getrandbits(31)
+
+
+class StudySession(models.Model):
+    """
+    A pass through a set's cards, in card order or shuffled. The API serves
+    it a window of cards at a time, and `position` lets the user resume on
+    any device; see myapp/study.py.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='study_sessions')
+    flashcard_set = models.ForeignKey(FlashCardSet, on_delete=models.CASCADE, related_name='study_sessions')
+    shuffled = models.BooleanField(default=False)
+    # Shuffled sessions store the seed of their permutation of card ordinals,
+    # not the order itself. The permutation covers the deck_size cards the set
+    # had at the start; cards added later follow them.
+    seed = models.PositiveIntegerField(default=new_session_seed)
+    deck_size = models.PositiveIntegerField(default=0)
+    start_deck_version = models.PositiveIntegerField(default=0)  # the set's deck_version at the start
+    position = models.PositiveIntegerField(default=0)  # index of the card the user is on
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The latest session of a user for a set, which the set page resumes
+            models.Index(fields=['user', 'flashcard_set', '-updated_at'], name='session_user_set_recent_idx'),
+        ]
+
+    @property
+    def card_total(self):
+        if self.shuffled:
+            return max(self.deck_size, self.flashcard_set.card_count)
+        return self.flashcard_set.card_count
+
+    @property
+    def deck_changed(self):
+        """Whether cards were added or removed since the session started."""
+        return self.start_deck_version != self.flashcard_set.deck_version
+
+    def __str__(self):
+        return f"{self.user.username}'s study session of {self.flashcard_set}"
@@ -0,0 +1,37 @@
+# myapp/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class StableCursorPagination(CursorPagination):
+    """
+    Keyset pagination over an ordering that ends in the primary key, so pages
+    stay stable while rows are being added.
+    Clients can pass ?page_size=<n> (up to max_page_size), and ?paginate=false
+    to get the legacy unpaginated list described in the OpenAPI spec.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    legacy_query_param = 'paginate'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.legacy_query_param, '').lower() in ('false', '0', 'no'):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class FlashCardSetCursorPagination(StableCursorPagination):
+    ordering = ('-createdAt', '-id')
+
+
+class CommentCursorPagination(StableCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class CollectionCursorPagination(StableCursorPagination):
+    # created_at is nullable for older collections, so page on the id alone
+    ordering = '-id'
+
+
+class UserCursorPagination(StableCursorPagination):
+    ordering = 'id'
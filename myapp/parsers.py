@@ -0,0 +1,31 @@
+# myapp/parsers.py
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON (one JSON object per line) into a list.
+    Blank lines are skipped; errors report the offending line number.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        reader = codecs.getreader(encoding)(stream)
+        return list(iter_ndjson(reader))
+
+
+def iter_ndjson(lines):
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            raise ParseError(f"NDJSON parse error on line {number}: {exc}")
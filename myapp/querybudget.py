@@ -0,0 +1,143 @@
+# myapp/querybudget.py
+import contextlib
+import logging
+import random
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'DEFAULT': 50,        # max queries per request
+    'VIEWS': {},          # URL name -> max queries, overriding DEFAULT
+    'REPEAT_LIMIT': 10,   # max runs of one query shape before it counts as an N+1
+    'SAMPLE_RATE': 1.0,   # share of requests the middleware checks
+    'RAISE': False,       # raise QueryBudgetExceeded instead of logging a warning
+}
+
+# Collapses "IN (%s, %s, %s)" and literals so queries that differ only in their
+# values share one template
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+def sql_template(sql):
+    """The shape of a query, with value lists and literals replaced by placeholders."""
+    return _LITERALS.sub('?', _IN_LIST.sub('IN (...)', sql))
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised, when the budget is set to raise, for a request that ran too many queries."""
+
+
+class QueryLog:
+    """
+    Database execute wrapper that counts queries and their total time.
+    Queries are grouped by their SQL text, which is parameterized, so the
+    rows of an N+1 loop land in one group. Templates are only worked out
+    when a report is made.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.by_sql = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.by_sql[sql] += 1
+
+    def repeated(self, limit):
+        """(template, runs) for the query shapes that ran more than `limit` times, most first."""
+        templates = Counter()
+        for sql, runs in self.by_sql.items():
+            templates[sql_template(sql)] += runs
+        return [(template, runs) for template, runs in templates.most_common() if runs > limit]
+
+    def problems(self, max_queries, repeat_limit):
+        """Descriptions of what is over budget; empty when the log is within it."""
+        problems = []
+        if max_queries is not None and self.count > max_queries:
+            problems.append(f"{self.count} queries (budget {max_queries})")
+        for template, runs in self.repeated(repeat_limit):
+            problems.append(f"{runs} runs of: {template}")
+        return problems
+
+    def report(self, label, problems):
+        return (
+            f"{label}: {self.count} queries in {self.duration * 1000:.1f} ms over budget\n  "
+            + '\n  '.join(problems)
+        )
+
+
+@contextlib.contextmanager
+def track_queries():
+    """Record the queries run on every database connection inside the block in a QueryLog."""
+    log = QueryLog()
+    with contextlib.ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
+
+
+@contextlib.contextmanager
+def assert_query_budget(max_queries=None, repeat_limit=None, label='block'):
+    """
+    Test helper: fail with the offending SQL templates when the block runs more
+    than `max_queries` queries, or any one query shape more than `repeat_limit`
+    times (the configured REPEAT_LIMIT by default).
+    """
+    if repeat_limit is None:
+        repeat_limit = get_config()['REPEAT_LIMIT']
+    with track_queries() as log:
+        yield log
+    problems = log.problems(max_queries, repeat_limit)
+    assert not problems, log.report(label, problems)
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts the queries of a sample of requests and reports the ones over their
+    view's budget or with a query shape repeated more than REPEAT_LIMIT times.
+    Reports go to the myapp.querybudget logger as warnings, or are raised as
+    QueryBudgetExceeded when RAISE is set. Budgets are keyed by URL name; see
+    DEFAULTS for the QUERY_BUDGET setting.
+
+    Unsampled requests cost one random() call. Sampled ones add a counter
+    update per query; the SQL is only normalized for requests being reported.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_config()
+        if random.random() >= config['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        with track_queries() as log:
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view_name = (match.view_name or match._func_path) if match else request.path
+        max_queries = config['VIEWS'].get(view_name, config['DEFAULT'])
+        problems = log.problems(max_queries, config['REPEAT_LIMIT'])
+        if problems:
+            message = log.report(f"{request.method} {view_name}", problems)
+            if config['RAISE']:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
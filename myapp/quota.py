@@ -0,0 +1,92 @@
+# myapp/quota.py
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CreationLimit, UserDailyCreation
+
+# item type -> (UserDailyCreation counter, CreationLimit field)
+QUOTA_FIELDS = {
+    'set': ('sets_created', 'daily_set_limit'),
+    'flashcard': ('flashcards_created', 'daily_flashcard_limit'),
+    'collection': ('collections_created', 'daily_collection_limit'),
+}
+
+# What is left of a user's daily allowance after a successful consume().
+# Both are None for users without a limit (superusers).
+Allowance = namedtuple('Allowance', ['limit', 'remaining'])
+
+
+class QuotaExceeded(Exception):
+    """Raised when a creation would take the user past their daily limit."""
+
+    def __init__(self, item_type, limit):
+        self.item_type = item_type
+        self.limit = limit
+        super().__init__(f"You have reached the daily limit of {limit} {item_type}s.")
+
+
+def get_limit(item_type):
+    _, limit_field = QUOTA_FIELDS[item_type]
+    return getattr(CreationLimit.get_solo(), limit_field)
+
+
+def consume(user, item_type, amount=1):
+    """
+    Reserve `amount` creations of `item_type` for the user today.
+
+    The counter is raised with one conditional UPDATE (counter + amount <= limit),
+    so concurrent requests cannot push a user past the limit. Call it inside the
+    same transaction.atomic() block as the insert, so the reservation is rolled
+    back if the insert fails.
+
+    Returns an Allowance; raises QuotaExceeded if the limit would be exceeded.
+    """
+    if user.is_superuser:
+        return Allowance(None, None)
+
+    counter_field, _ = QUOTA_FIELDS[item_type]
+    limit = get_limit(item_type)
+    today = timezone.now().date()
+
+    with transaction.atomic():
+        updated = _increment(user, today, counter_field, amount, limit)
+        if not updated and _create_daily_row(user, today):
+            updated = _increment(user, today, counter_field, amount, limit)
+        if not updated:
+            raise QuotaExceeded(item_type, limit)
+
+        created = UserDailyCreation.objects.filter(user=user, date=today).values_list(counter_field, flat=True).get()
+    return Allowance(limit, limit - created)
+
+
+def remaining(user, item_type):
+    """Remaining allowance without consuming any of it."""
+    if user.is_superuser:
+        return Allowance(None, None)
+    counter_field, _ = QUOTA_FIELDS[item_type]
+    limit = get_limit(item_type)
+    created = UserDailyCreation.objects.filter(
+        user=user, date=timezone.now().date()
+    ).values_list(counter_field, flat=True).first() or 0
+    return Allowance(limit, max(limit - created, 0))
+
+
+def _increment(user, today, counter_field, amount, limit):
+    return UserDailyCreation.objects.filter(
+        user=user,
+        date=today,
+        **{f'{counter_field}__lte': limit - amount}
+    ).update(**{counter_field: F(counter_field) + amount})
+
+
+def _create_daily_row(user, today):
+    """Create today's counter row. Returns False if it already existed."""
+    try:
+        with transaction.atomic():
+            UserDailyCreation.objects.create(user=user, date=today)
+    except IntegrityError:
+        return False
+    return True
@@ -0,0 +1,88 @@
+# myapp/rescheduling.py
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import study
+from .models import CardSchedule
+
+CHUNK_SIZE = 5000
+SECONDS_PER_DAY = 86400
+
+
+def reschedule(schedules, interval_modifier=1.0, max_interval=None, min_ease=study.MIN_EASE, chunk_size=CHUNK_SIZE):
+    """
+    Recompute the interval, ease and due date of every reviewed card in the
+    `schedules` queryset after a change of scheduling parameters: intervals
+    are scaled by `interval_modifier` and capped at `max_interval` days, eases
+    are raised to at least `min_ease`, and each card becomes due that many days
+    after its last review. Cards being relearned (interval 0) keep their due
+    date.
+
+    Rows are read a chunk at a time into column lists, recomputed a column at a
+    time and written back with one batched UPDATE per chunk, all on the
+    queryset's database. Returns the number of rows updated.
+    """
+    rows = (
+        schedules.filter(last_reviewed_at__isnull=False, interval__gt=0)
+        .order_by('id')
+        .values_list('id', 'interval', 'ease', 'last_reviewed_at')
+    )
+    updated = last_id = 0
+    # All or nothing, since running it again would scale the intervals twice
+    with transaction.atomic(using=schedules.db):
+        # Chunks are read by id rather than through one open cursor, which SQLite
+        # does not isolate from the updates written in between
+        while chunk := list(rows.filter(id__gt=last_id)[:chunk_size]):
+            last_id = chunk[-1][0]
+            ids, intervals, eases, reviewed_at = zip(*chunk)
+            intervals, eases, due_at = recompute(intervals, eases, reviewed_at, interval_modifier, max_interval, min_ease)
+            _write_chunk(connections[schedules.db], ids, intervals, eases, due_at)
+            updated += len(chunk)
+    return updated
+
+
+def _write_chunk(connection, ids, intervals, eases, due_at):
+    # One prepared UPDATE run for every row. QuerySet.bulk_update() builds a
+    # CASE expression per field and batch, which costs more than the
+    # arithmetic saves (about 0.5 ms a row on SQLite, no faster than save()).
+    table = connection.ops.quote_name(CardSchedule._meta.db_table)
+    column = connection.ops.quote_name
+    due_field = CardSchedule._meta.get_field('due_at')
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {table} SET {column('interval')} = %s, {column('ease')} = %s, {column('due_at')} = %s "
+            f"WHERE {column('id')} = %s",
+            [
+                (interval, ease, due_field.get_db_prep_value(due, connection), schedule_id)
+                for schedule_id, interval, ease, due in zip(ids, intervals, eases, due_at)
+            ],
+        )
+
+
+def recompute(intervals, eases, reviewed_at, interval_modifier=1.0, max_interval=None, min_ease=study.MIN_EASE):
+    """The new (intervals, eases, due dates) columns for the given columns."""
+    # Plain lists: converting a chunk to and from NumPy arrays costs more than
+    # the vectorized arithmetic saves
+    intervals = [interval * interval_modifier for interval in intervals]
+    if max_interval is not None:
+        intervals = [min(interval, max_interval) for interval in intervals]
+    eases = [max(ease, min_ease) for ease in eases]
+    due = [moment.timestamp() + interval * SECONDS_PER_DAY for moment, interval in zip(reviewed_at, intervals)]
+    return intervals, eases, [datetime.fromtimestamp(moment, dt_timezone.utc) for moment in due]
+
+
+def reset(user, flashcard_set, now=None):
+    """
+    Start a set over for the user: every card becomes new and due now. One
+    UPDATE; no per-card work is needed. Returns the number of rows reset.
+    """
+    return CardSchedule.objects.filter(user=user, flashcard_set=flashcard_set).update(
+        due_at=now or timezone.now(),
+        interval=0,
+        ease=CardSchedule._meta.get_field('ease').default,
+        repetitions=0,
+        lapses=0,
+        last_reviewed_at=None,
+    )
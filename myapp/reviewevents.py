@@ -0,0 +1,214 @@
+# myapp/reviewevents.py
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import CardStat, FlashCard, ReviewEvent, User
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'FLUSH_SIZE': 200,          # write the queue once this many events are waiting
+    'FLUSH_INTERVAL_MS': 2000,  # ... or once the oldest of them has waited this long
+    'BACKGROUND_FLUSH': True,   # also flush from a timer thread, so a quiet process does not sit on events
+    'MAX_QUEUED': 10000,        # events kept for a retry after a failed write; the oldest are dropped
+}
+
+# Events older than this are rolled up into CardStat rows by compact()
+COMPACT_AFTER = timedelta(days=30)
+COMPACT_CHUNK_SIZE = 5000
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'REVIEW_EVENTS', {})}
+
+
+class ReviewEventBuffer:
+    """
+    Process-local queue of ReviewEvents, written with one bulk_create once
+    FLUSH_SIZE events are queued or the oldest has waited FLUSH_INTERVAL_MS
+    (see DEFAULTS for the REVIEW_EVENTS setting). Recording an answer costs no
+    query of its own.
+
+    Events still queued when a process dies are lost; the queue is flushed at
+    interpreter exit. When a write fails because a card or user was deleted
+    while its answers were queued, those answers are dropped and the rest
+    written; any other failed write puts the events back for the next flush.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._first_queued_at = None
+        self._timer = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def record(self, user_id, card_id, correct, latency_ms=None, answered_at=None, **schedule):
+        """
+        Queue one answer, and write the queue if it is due. `schedule` holds the
+        grade, interval and ease of a graded review.
+        """
+        config = get_config()
+        event = ReviewEvent(
+            user_id=user_id,
+            card_id=card_id,
+            correct=correct,
+            latency_ms=latency_ms,
+            answered_at=answered_at or timezone.now(),
+            **schedule,
+        )
+        with self._lock:
+            if not self._events:
+                self._first_queued_at = time.monotonic()
+                if config['BACKGROUND_FLUSH']:
+                    self._start_timer(config['FLUSH_INTERVAL_MS'] / 1000)
+            self._events.append(event)
+            waited_ms = (time.monotonic() - self._first_queued_at) * 1000
+            due = len(self._events) >= config['FLUSH_SIZE'] or waited_ms >= config['FLUSH_INTERVAL_MS']
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write every queued event. Returns the number written."""
+        with self._lock:
+            events, self._events = self._events, []
+            self._first_queued_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not events:
+            return 0
+        try:
+            try:
+                self._write(events)
+            except IntegrityError:
+                # Most likely a card or user deleted while its answers were queued;
+                # those answers cannot be written, and must not hold up the rest
+                events = _without_deleted_targets(events)
+                self._write(events)
+        except DatabaseError:
+            logger.exception("Could not write %d review events; keeping them for the next flush", len(events))
+            self._requeue(events)
+            return 0
+        return len(events)
+
+    @staticmethod
+    def _write(events):
+        for event in events:
+            # A failed attempt may have assigned ids that were rolled back
+            event.pk = None
+        with transaction.atomic():
+            ReviewEvent.objects.bulk_create(events, batch_size=500)
+
+    def clear(self):
+        """Drop the queued events without writing them."""
+        with self._lock:
+            self._events = []
+            self._first_queued_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _requeue(self, events):
+        max_queued = get_config()['MAX_QUEUED']
+        with self._lock:
+            self._events = (events + self._events)[-max_queued:]
+            if self._first_queued_at is None:
+                self._first_queued_at = time.monotonic()
+
+    def _start_timer(self, delay):
+        self._timer = threading.Timer(delay, self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread's own database connection
+            connections.close_all()
+
+
+def _without_deleted_targets(events):
+    """The events whose user and card still exist."""
+    users = set(User.objects.filter(pk__in={event.user_id for event in events}).values_list('pk', flat=True))
+    cards = set(FlashCard.objects.filter(pk__in={event.card_id for event in events}).values_list('pk', flat=True))
+    kept = [event for event in events if event.user_id in users and event.card_id in cards]
+    if len(kept) < len(events):
+        logger.warning("Dropped %d review events of deleted cards or users", len(events) - len(kept))
+    return kept
+
+
+review_events = ReviewEventBuffer()
+atexit.register(review_events.flush)
+
+
+def compact(before=None, chunk_size=COMPACT_CHUNK_SIZE):
+    """
+    Roll the events answered before `before` (by default COMPACT_AFTER ago)
+    into the CardStat rows of their user and card, and delete them. Works
+    through the events in chunks of ids, each summed per (user, card) in SQL
+    and merged and deleted in its own transaction, so an interrupted run
+    loses nothing and can be started again.
+    Returns (events compacted, CardStat rows written).
+    """
+    before = before or timezone.now() - COMPACT_AFTER
+    old = ReviewEvent.objects.filter(answered_at__lt=before)
+    compacted = written = last_id = 0
+    while True:
+        with transaction.atomic():
+            ids = list(old.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            chunk = old.filter(id__gte=ids[0], id__lte=last_id)
+            totals = chunk.values('user_id', 'card_id').order_by().annotate(
+                answers=Count('id'),
+                correct=Count('id', filter=Q(correct=True)),
+                timed_answers=Count('latency_ms'),
+                total_latency_ms=Sum('latency_ms', default=0),
+                first_answered_at=Min('answered_at'),
+                last_answered_at=Max('answered_at'),
+            )
+            written += _merge_stats(list(totals))
+            compacted += chunk.delete()[0]
+    return compacted, written
+
+
+def _merge_stats(totals):
+    stats = {
+        (stat.user_id, stat.card_id): stat
+        for stat in CardStat.objects.filter(
+            user_id__in={row['user_id'] for row in totals},
+            card_id__in={row['card_id'] for row in totals},
+        )
+    }
+    new, changed = [], []
+    for row in totals:
+        stat = stats.get((row['user_id'], row['card_id']))
+        if stat is None:
+            new.append(CardStat(**row))
+            continue
+        stat.answers += row['answers']
+        stat.correct += row['correct']
+        stat.timed_answers += row['timed_answers']
+        stat.total_latency_ms += row['total_latency_ms']
+        stat.first_answered_at = min(stat.first_answered_at, row['first_answered_at'])
+        stat.last_answered_at = max(stat.last_answered_at, row['last_answered_at'])
+        changed.append(stat)
+    CardStat.objects.bulk_create(new, batch_size=500)
+    CardStat.objects.bulk_update(
+        changed,
+        ['answers', 'correct', 'timed_answers', 'total_latency_ms', 'first_answered_at', 'last_answered_at'],
+        batch_size=500,
+    )
+    return len(new) + len(changed)
@@ -0,0 +1,177 @@
+# myapp/search.py
+import re
+import threading
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+
+from .models import FlashCard, FlashCardSet, Tag
+
+# One row per flashcard set; rowid is the set id.
+FTS_TABLE = 'myapp_flashcardset_fts'
+
+# bm25 weights for the (name, tags, questions) columns.
+NAME_WEIGHT = 10.0
+TAGS_WEIGHT = 5.0
+QUESTIONS_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Database name -> whether its FTS table can be queried
+_fts_probed = {}
+# Set ids waiting for the current transaction to commit, per thread
+_queued = threading.local()
+
+
+def fts_available():
+    """
+    Whether the index table exists and can be queried. It is only created on
+    SQLite builds with FTS5; everything else falls back to icontains. Probed
+    once per database and process.
+    """
+    name = connection.settings_dict['NAME']
+    if name not in _fts_probed:
+        available = False
+        if connection.vendor == 'sqlite':
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT rowid FROM {FTS_TABLE} LIMIT 0")
+                available = True
+            except DatabaseError:
+                pass
+        _fts_probed[name] = available
+    return _fts_probed[name]
+
+
+def _document_sql(where=''):
+    # Builds the indexed document for each set straight from the source tables,
+    # so rebuilding and reindexing a handful of sets share one code path.
+    set_table = FlashCardSet._meta.db_table
+    card_table = FlashCard._meta.db_table
+    tag_table = Tag._meta.db_table
+    through_table = FlashCardSet.tags.through._meta.db_table
+    return f"""
+        INSERT INTO {FTS_TABLE} (rowid, name, tags, questions)
+        SELECT s.id,
+               s.name,
+               COALESCE((SELECT group_concat(t.name, ' ')
+                         FROM {tag_table} t
+                         JOIN {through_table} st ON st.tag_id = t.id
+                         WHERE st.flashcardset_id = s.id), ''),
+               COALESCE((SELECT group_concat(c.question, ' ')
+                         FROM {card_table} c
+                         WHERE c.set_id = s.id), '')
+        FROM {set_table} s
+        {where}
+    """
+
+
+def index_sets(set_ids):
+    """
+    (Re)index the given sets once the current transaction commits, or at once
+    outside a transaction. However many of its cards and tags a transaction
+    changes, each set's document is rebuilt once. Ids that no longer exist are
+    simply dropped.
+    """
+    set_ids = {int(pk) for pk in set_ids if pk is not None}
+    if not set_ids or not fts_available():
+        return
+    queued = getattr(_queued, 'set_ids', None)
+    if queued is None:
+        queued = _queued.set_ids = set()
+    queued.update(set_ids)
+    # Every call registers a callback, since a rolled-back transaction drops
+    # its callbacks but not the ids; the first callback to run indexes them all
+    transaction.on_commit(_index_queued)
+
+
+def _index_queued():
+    set_ids, _queued.set_ids = getattr(_queued, 'set_ids', None), None
+    if set_ids:
+        _index_now(sorted(set_ids))
+
+
+def _index_now(set_ids):
+    placeholders = ', '.join(['%s'] * len(set_ids))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", set_ids)
+        cursor.execute(_document_sql(f"WHERE s.id IN ({placeholders})"), set_ids)
+
+
+def remove_sets(set_ids):
+    set_ids = [int(pk) for pk in set_ids if pk is not None]
+    if not set_ids or not fts_available():
+        return
+    placeholders = ', '.join(['%s'] * len(set_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", set_ids)
+
+
+def rebuild_index():
+    """Drop every indexed row and rebuild from the source tables. Returns the row count."""
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(_document_sql())
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def build_match_expression(query):
+    """
+    Turn free text into an FTS5 MATCH expression.
+    Every word must match, and every word is treated as a prefix, so "capit fra"
+    finds "Capitals of France". Words are quoted so FTS5 operators typed by the
+    user are matched literally instead of being interpreted.
+    """
+    tokens = _TOKEN_RE.findall(query or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_set_ids(query, limit=None):
+    """
+    Return the ids of sets matching the query, best match first.
+    Sets are ranked by bm25, with name and tag hits weighted above card questions.
+    """
+    if not fts_available():
+        return _fallback_search_set_ids(query, limit)
+
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+
+    sql = (
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+        f"ORDER BY bm25({FTS_TABLE}, %s, %s, %s)"
+    )
+    params = [expression, NAME_WEIGHT, TAGS_WEIGHT, QUESTIONS_WEIGHT]
+    if limit:
+        sql += " LIMIT %s"
+        params.append(int(limit))
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_search_set_ids(query, limit=None):
+    query = (query or '').strip()
+    if not query:
+        return []
+    ids = FlashCardSet.objects.filter(
+        Q(name__icontains=query) |
+        Q(cards__question__icontains=query) |
+        Q(tags__name__icontains=query)
+    ).distinct().order_by('-updatedAt').values_list('id', flat=True)
+    if limit:
+        ids = ids[:limit]
+    return list(ids)
+
+
+def search_sets(query, limit=None):
+    """Return matching FlashCardSet objects in rank order."""
+    set_ids = search_set_ids(query, limit)
+    sets_by_id = FlashCardSet.objects.select_related('author').prefetch_related('tags').in_bulk(set_ids)
+    return [sets_by_id[pk] for pk in set_ids if pk in sets_by_id]
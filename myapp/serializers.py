@@ -1,10 +1,47 @@
 from rest_framework import serializers
-from .models import FlashCardSet, FlashCard, Comment, Collection
+from django.db import models
+from .models import CardSchedule, FlashCardSet, FlashCard, Comment, Collection, ReviewGrade, StudySession
+from .utils import get_average_ratings
 from django.contrib.auth.models import User 
 
 
 
-class UserSerializer(serializers.ModelSerializer):
+def resolve_sparse_fields(all_fields, optional_fields, fields=None, include=None):
+    """
+    Work out which fields to serialize for ?fields= and ?include=.
+    Returns None when neither was given, meaning the full representation.
+    fields lists the top-level fields to keep; include adds optional nested
+    fields, which are left out as soon as either parameter is used.
+    """
+    if fields is None and include is None:
+        return None
+    if fields is None:
+        kept = set(all_fields) - set(optional_fields)
+    else:
+        kept = set(fields)
+    kept |= set(include or ())
+    return kept & set(all_fields)
+
+
+# Drops fields that were not requested through the serializer context
+# ('fields' and 'include', filled in by the API views).
+class SparseFieldsMixin:
+    optional_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        kept = resolve_sparse_fields(
+            self.Meta.fields,
+            self.optional_fields,
+            self.context.get('fields'),
+            self.context.get('include'),
+        )
+        if kept is not None:
+            for name in set(self.fields) - kept:
+                self.fields.pop(name)
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     admin = serializers.SerializerMethodField()
 
     class Meta:
@@ -34,21 +71,104 @@ class CommentSerializer(serializers.ModelSerializer):
 
 
 
-class FlashCardSetSerializer(serializers.ModelSerializer):
+# Computes the average ratings for a whole list of sets in one query
+# before the items are serialized.
+class AverageRatingListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if 'average_rating' in self.child.fields:
+            self.context['average_ratings'] = get_average_ratings(items)
+        return super().to_representation(items)
+
+
+class AverageRatingMixin(serializers.Serializer):
+    average_rating = serializers.SerializerMethodField()
+
+    def get_average_rating(self, obj):
+        ratings = self.context.get('average_ratings')
+        if ratings is None or obj.id not in ratings:
+            ratings = get_average_ratings([obj])
+        return ratings[obj.id]
+
+
+class FlashCardSetSerializer(SparseFieldsMixin, AverageRatingMixin, serializers.ModelSerializer):
     cards = FlashCardSerializer(many=True, read_only=True)  
     comments = CommentSerializer(many=True, read_only=True)  
     author = UserSerializer(read_only=True)
+    optional_fields = ('cards', 'comments')
 
     class Meta:
         model = FlashCardSet
-        fields = ['id', 'name', 'createdAt', 'updatedAt', 'author', 'cards', 'comments']
+        fields = [
+            'id', 'name', 'createdAt', 'updatedAt', 'author', 'average_rating',
+            'card_count', 'comment_count', 'favorite_count', 'cards', 'comments',
+        ]
+        list_serializer_class = AverageRatingListSerializer
+
 
 
 
+# Lightweight set representation without nested cards or comments.
+class FlashCardSetSummarySerializer(AverageRatingMixin, serializers.ModelSerializer):
+    author = UserSerializer(read_only=True)
+
+    class Meta:
+        model = FlashCardSet
+        fields = [
+            'id', 'name', 'createdAt', 'updatedAt', 'author', 'average_rating',
+            'card_count', 'comment_count', 'favorite_count',
+        ]
+        list_serializer_class = AverageRatingListSerializer
+
+
 
-class CollectionSerializer(serializers.ModelSerializer):
+class CollectionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
 
     class Meta:
         model = Collection
         fields = ['id', 'name', 'description', 'comment', 'author']
+
+
+
+# A card with the user's spaced-repetition schedule for it.
+class CardScheduleSerializer(serializers.ModelSerializer):
+    card = FlashCardSerializer(read_only=True)
+
+    class Meta:
+        model = CardSchedule
+        fields = ['card', 'due_at', 'interval', 'ease', 'repetitions', 'lapses', 'last_reviewed_at']
+
+
+class ReviewSerializer(serializers.Serializer):
+    card = serializers.PrimaryKeyRelatedField(queryset=FlashCard.objects.all())
+    grade = serializers.ChoiceField(choices=ReviewGrade.choices)
+    # For the answer log; when correct is left out, any grade but "again" counts as correct
+    correct = serializers.BooleanField(required=False, allow_null=True, default=None)
+    latency_ms = serializers.IntegerField(required=False, allow_null=True, min_value=0, default=None)
+
+
+class StudySessionSerializer(serializers.ModelSerializer):
+    set = serializers.PrimaryKeyRelatedField(source='flashcard_set', queryset=FlashCardSet.objects.all())
+    total = serializers.IntegerField(source='card_total', read_only=True)
+    deck_changed = serializers.BooleanField(read_only=True)
+    deck_version = serializers.IntegerField(source='flashcard_set.deck_version', read_only=True)
+
+    class Meta:
+        model = StudySession
+        fields = ['id', 'set', 'shuffled', 'position', 'total', 'deck_changed', 'deck_version', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance._state.adding:
+            # Shown by the set page before the user starts it; see study.current_session()
+            data['id'] = None
+        return data
+
+    def validate_position(self, value):
+        if self.instance is not None and value >= max(self.instance.card_total, 1):
+            raise serializers.ValidationError("Position is past the last card.")
+        return value
+
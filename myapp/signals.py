@@ -0,0 +1,194 @@
+# myapp/signals.py
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import search
+from .tags import tag_index
+from .models import Comment, FlashCard, FlashCardSet, Rating, Tag, UserFavorite
+from .utils import apply_rating_change, bump_flashcard_set, close_card_gap, rebuild_card_ordinals, touch_flashcard_set
+
+
+# Keep the full-text search index in sync with sets, cards and tags.
+
+@receiver(post_save, sender=FlashCardSet)
+def index_set_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_sets([instance.pk])
+
+
+@receiver(post_delete, sender=FlashCardSet)
+def unindex_set_on_delete(sender, instance, **kwargs):
+    search.remove_sets([instance.pk])
+
+
+@receiver(post_save, sender=FlashCard)
+@receiver(post_delete, sender=FlashCard)
+def reindex_set_on_card_change(sender, instance, raw=False, origin=None, **kwargs):
+    # A deleted set leaves the index with its own post_delete
+    if not raw and not isinstance(origin, FlashCardSet):
+        search.index_sets([instance.set_id])
+
+
+@receiver(m2m_changed, sender=FlashCardSet.tags.through)
+def reindex_sets_on_tag_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # tag.sets.clear() does not report which sets lost the tag, so remember them now
+        instance._cleared_set_ids = list(instance.sets.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        set_ids = pk_set if pk_set is not None else getattr(instance, '_cleared_set_ids', [])
+    else:
+        set_ids = [instance.pk]
+    search.index_sets(set_ids)
+
+
+@receiver(post_save, sender=Tag)
+def reindex_sets_on_tag_save(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_sets(instance.sets.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def capture_sets_before_tag_delete(sender, instance, **kwargs):
+    instance._indexed_set_ids = list(instance.sets.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def reindex_sets_on_tag_delete(sender, instance, **kwargs):
+    search.index_sets(getattr(instance, '_indexed_set_ids', []))
+
+
+# Keep the tag autocomplete index in step with tags and their set counts.
+
+@receiver(post_save, sender=Tag)
+def index_tag_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        tag_index.add(instance.pk, instance.name)
+    else:
+        tag_index.rename(instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Tag)
+def unindex_tag_on_delete(sender, instance, **kwargs):
+    tag_index.remove(instance.pk)
+
+
+@receiver(m2m_changed, sender=FlashCardSet.tags.through)
+def count_tag_membership_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # clear() does not report what it removes, so remember it now
+        if reverse:
+            instance._cleared_set_count = instance.sets.count()
+        else:
+            instance._cleared_tag_ids = list(instance.tags.values_list('id', flat=True))
+        return
+    if action in ('post_add', 'post_remove'):
+        delta = 1 if action == 'post_add' else -1
+        if reverse:
+            tag_index.adjust_counts({instance.pk: delta * len(pk_set)})
+        else:
+            tag_index.adjust_counts(dict.fromkeys(pk_set, delta))
+    elif action == 'post_clear':
+        if reverse:
+            tag_index.adjust_counts({instance.pk: -getattr(instance, '_cleared_set_count', 0)})
+        else:
+            tag_index.adjust_counts(dict.fromkeys(getattr(instance, '_cleared_tag_ids', []), -1))
+
+
+@receiver(pre_delete, sender=FlashCardSet)
+def capture_tags_before_set_delete(sender, instance, **kwargs):
+    # Deleting a set removes its tag memberships without an m2m_changed signal
+    instance._deleted_tag_ids = list(instance.tags.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=FlashCardSet)
+def count_tags_on_set_delete(sender, instance, **kwargs):
+    tag_index.adjust_counts(dict.fromkeys(getattr(instance, '_deleted_tag_ids', []), -1))
+
+
+# Keep RatingSummary totals in step with Rating rows.
+
+@receiver(post_save, sender=Rating)
+def update_rating_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_score = None if created else getattr(instance, '_loaded_score', None)
+    apply_rating_change(instance.content_type_id, instance.object_id, old_score, instance.score)
+    instance._loaded_score = instance.score
+
+
+@receiver(post_delete, sender=Rating)
+def update_rating_summary_on_delete(sender, instance, **kwargs):
+    old_score = getattr(instance, '_loaded_score', instance.score)
+    apply_rating_change(instance.content_type_id, instance.object_id, old_score, None)
+
+
+# Changes to a set's cards, comments, ratings and favorites change its API
+# representation, so they bump the set's version counters (see ETag handling)
+# and keep its denormalized counts up to date. Only card changes are edits of
+# the set and refresh its updatedAt.
+
+def _count_delta(signal, created=False):
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver(post_save, sender=FlashCard)
+@receiver(post_delete, sender=FlashCard)
+def touch_set_on_card_change(sender, instance, signal, created=False, raw=False, origin=None, **kwargs):
+    # Cards deleted along with their set have no set left to update
+    if raw or isinstance(origin, FlashCardSet):
+        return
+    if signal is post_delete:
+        touch_flashcard_set(instance.set_id, 'card_version', 'deck_version', card_count=-1)
+    else:
+        # New cards were already counted when their ordinal was reserved (FlashCard.save)
+        touch_flashcard_set(instance.set_id, 'card_version')
+
+
+@receiver(post_delete, sender=FlashCard)
+def close_card_gap_on_delete(sender, instance, origin=None, **kwargs):
+    # Nothing to keep dense when the whole set is being deleted
+    if isinstance(origin, FlashCardSet):
+        return
+    if isinstance(origin, FlashCard):
+        close_card_gap(instance.set_id, instance.ordinal)
+        return
+    # Several cards deleted at once: every row is gone before the first signal,
+    # so the ordinals the other instances carry are stale after one shift.
+    # Renumber each of their sets once instead.
+    renumbered = getattr(origin, '_renumbered_card_sets', None)
+    if renumbered is None:
+        renumbered = set()
+        if origin is not None:
+            origin._renumbered_card_sets = renumbered
+    if instance.set_id not in renumbered:
+        renumbered.add(instance.set_id)
+        rebuild_card_ordinals(set_ids=[instance.set_id])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_set_on_comment_change(sender, instance, signal, created=False, raw=False, origin=None, **kwargs):
+    if not raw and not isinstance(origin, FlashCardSet):
+        bump_flashcard_set(instance.flashcard_set_id, 'comment_version', comment_count=_count_delta(signal, created))
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def touch_set_on_rating_change(sender, instance, raw=False, **kwargs):
+    if not raw and instance.content_type_id == ContentType.objects.get_for_model(FlashCardSet).id:
+        bump_flashcard_set(instance.object_id, 'stats_version')
+
+
+@receiver(post_save, sender=UserFavorite)
+@receiver(post_delete, sender=UserFavorite)
+def touch_set_on_favorite_change(sender, instance, signal, created=False, raw=False, **kwargs):
+    if not raw and instance.content_type_id == ContentType.objects.get_for_model(FlashCardSet).id:
+        bump_flashcard_set(instance.object_id, 'stats_version', favorite_count=_count_delta(signal, created))
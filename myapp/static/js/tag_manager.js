@@ -9,6 +9,10 @@ class TagManager {
         this.tags = config.initialTags || [];
         this.tags.forEach(tag => this.addTagElement(tag));
 
+        if (config.autocompleteUrl) {
+            this.initAutocomplete(config.autocompleteUrl);
+        }
+
         this.addButton.addEventListener('click', () => this.addTagFromInput());
         this.input.addEventListener('keypress', e => {
             if (e.key === 'Enter') {
@@ -24,6 +28,40 @@ class TagManager {
         });
     }
 
+    // Suggests existing tags (most used first) in a datalist while typing
+    static initAutocomplete(url) {
+        this.suggestions = document.createElement('datalist');
+        this.suggestions.id = `${this.input.id || 'tag-input'}-suggestions`;
+        this.input.setAttribute('list', this.suggestions.id);
+        this.input.insertAdjacentElement('afterend', this.suggestions);
+
+        let timer = null;
+        this.input.addEventListener('input', () => {
+            clearTimeout(timer);
+            const query = this.input.value.trim();
+            if (!query) {
+                this.suggestions.innerHTML = '';
+                return;
+            }
+            timer = setTimeout(() => {
+                fetch(`${url}?q=${encodeURIComponent(query)}`)
+                    .then(response => response.json())
+                    .then(data => {
+                        this.suggestions.innerHTML = '';
+                        data.results
+                            .filter(tag => !this.tags.includes(tag.name))
+                            .forEach(tag => {
+                                const option = document.createElement('option');
+                                option.value = tag.name;
+                                option.label = `${tag.name} (${tag.set_count})`;
+                                this.suggestions.appendChild(option);
+                            });
+                    })
+                    .catch(() => {});
+            }, 150);
+        });
+    }
+
     static addTagFromInput() {
         const newTag = this.input.value.trim();
         if (newTag && !this.tags.includes(newTag)) {
@@ -0,0 +1,259 @@
+# myapp/study.py
+import hashlib
+import logging
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import CardSchedule, FlashCard, ReviewGrade, StudyEnrollment, StudySession
+from .reviewevents import review_events
+from .utils import rebuild_card_ordinals
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 20
+MAX_BATCH_SIZE = 100
+# Cards per study session window
+WINDOW_SIZE = 20
+MAX_WINDOW_SIZE = 100
+# Rounds of the Feistel network that shuffles a session's cards
+FEISTEL_ROUNDS = 4
+
+# SM-2: the ease factor moves with the quality of recall (0-5), never below MIN_EASE
+QUALITY = {ReviewGrade.AGAIN: 2, ReviewGrade.HARD: 3, ReviewGrade.GOOD: 4, ReviewGrade.EASY: 5}
+MIN_EASE = 1.3
+HARD_FACTOR = 1.2
+EASY_BONUS = 1.3
+# A forgotten card comes back later in the same session
+RELEARN_DELAY = timedelta(minutes=10)
+
+ReviewState = namedtuple('ReviewState', ['interval', 'ease', 'repetitions', 'lapses'])
+
+
+def next_state(state, grade):
+    """
+    The ReviewState after grading a card in `state`, and the delay until its
+    next review. Follows SM-2: the first two successful reviews are due after
+    1 and 6 days, later ones after the previous interval times the ease factor.
+    Hard reviews grow the interval by HARD_FACTOR instead, easy ones get a
+    bonus, and a forgotten card starts over.
+    """
+    interval, ease, repetitions, lapses = state
+    quality = QUALITY[grade]
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    if grade == ReviewGrade.AGAIN:
+        return ReviewState(0.0, ease, 0, lapses + 1), RELEARN_DELAY
+
+    if repetitions == 0:
+        interval = 1.0
+    elif repetitions == 1:
+        interval = 6.0
+    elif grade == ReviewGrade.HARD:
+        interval *= HARD_FACTOR
+    else:
+        interval *= ease
+    if grade == ReviewGrade.EASY:
+        interval *= EASY_BONUS
+    return ReviewState(interval, ease, repetitions + 1, lapses), timedelta(days=interval)
+
+
+def enroll(user, flashcard_set, now=None):
+    """
+    Create the user's schedule rows for the cards of the set that have none,
+    all due now. Cards added to the set later are picked up by the next call.
+    Returns the number of rows created.
+    """
+    now = now or timezone.now()
+    missing = flashcard_set.cards.filter(
+        ~Exists(CardSchedule.objects.filter(user=user, card=OuterRef('pk')))
+    ).order_by('pk').values_list('pk', flat=True)
+    created = CardSchedule.objects.bulk_create(
+        [CardSchedule(user=user, card_id=card_id, flashcard_set=flashcard_set, due_at=now) for card_id in missing],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    return len(created)
+
+
+def ensure_enrolled(user, flashcard_set, now=None):
+    """
+    enroll() the user in the set unless they already were since cards were last
+    added to it. One indexed read when nothing changed, instead of enroll()'s
+    search of the whole set. Returns the number of schedule rows created.
+    """
+    version = flashcard_set.deck_version
+    if StudyEnrollment.objects.filter(user=user, flashcard_set=flashcard_set, deck_version=version).exists():
+        return 0
+    created = enroll(user, flashcard_set, now)
+    StudyEnrollment.objects.update_or_create(user=user, flashcard_set=flashcard_set, defaults={'deck_version': version})
+    return created
+
+
+def _schedules(user, flashcard_set=None):
+    schedules = CardSchedule.objects.filter(user=user)
+    if flashcard_set is not None:
+        schedules = schedules.filter(flashcard_set=flashcard_set)
+    return schedules
+
+
+def due_cards(user, flashcard_set=None, limit=BATCH_SIZE, now=None):
+    """
+    The next `limit` schedules due by `now`, earliest first, with their cards.
+    Read from the (user, due_at) or (user, flashcard_set, due_at) index, so the
+    cost depends on `limit`, not on how many cards or reviews the user has.
+    """
+    now = now or timezone.now()
+    return list(
+        _schedules(user, flashcard_set)
+        .filter(due_at__lte=now)
+        .select_related('card')
+        .order_by('due_at', 'id')[:limit]
+    )
+
+
+def next_due_at(user, flashcard_set=None, now=None):
+    """When the first card that is not due yet becomes due, or None."""
+    now = now or timezone.now()
+    return _schedules(user, flashcard_set).filter(due_at__gt=now).order_by('due_at').values_list('due_at', flat=True).first()
+
+
+def record_review(user, card, grade, now=None, correct=None, latency_ms=None):
+    """
+    Grade a card for the user: update its schedule and queue a ReviewEvent
+    for the answer log. Unless given, any grade but AGAIN counts as correct.
+    Returns the updated CardSchedule.
+    """
+    now = now or timezone.now()
+    grade = ReviewGrade(grade)
+    with transaction.atomic():
+        schedule, _ = CardSchedule.objects.select_for_update().get_or_create(
+            user=user, card=card, defaults={'flashcard_set_id': card.set_id, 'due_at': now},
+        )
+        state, delay = next_state(
+            ReviewState(schedule.interval, schedule.ease, schedule.repetitions, schedule.lapses), grade
+        )
+        schedule.interval, schedule.ease, schedule.repetitions, schedule.lapses = state
+        schedule.due_at = now + delay
+        schedule.last_reviewed_at = now
+        schedule.save()
+    review_events.record(
+        user.id,
+        card.id,
+        correct=grade != ReviewGrade.AGAIN if correct is None else correct,
+        latency_ms=latency_ms,
+        answered_at=now,
+        grade=grade,
+        interval=state.interval,
+        ease=state.ease,
+    )
+    return schedule
+
+
+def new_session(user, flashcard_set, shuffle=False):
+    """An unsaved study session over the set's cards, in card order or shuffled."""
+    return StudySession(
+        user=user,
+        flashcard_set=flashcard_set,
+        shuffled=shuffle,
+        deck_size=flashcard_set.card_count,
+        start_deck_version=flashcard_set.deck_version,
+    )
+
+
+def start_session(user, flashcard_set, shuffle=False):
+    """A new study session over the set's cards, in card order or shuffled."""
+    session = new_session(user, flashcard_set, shuffle)
+    session.save()
+    return session
+
+
+def current_session(user, flashcard_set):
+    """
+    The user's most recently used session for the set or, when they have none,
+    an unsaved one in card order. Viewing a set saves nothing; the page starts
+    a session through the API once the user moves through the cards.
+    """
+    session = (
+        StudySession.objects.filter(user=user, flashcard_set=flashcard_set)
+        .select_related('flashcard_set')
+        .order_by('-updated_at')
+        .first()
+    )
+    return session or new_session(user, flashcard_set)
+
+
+def session_window(session, start, limit=WINDOW_SIZE):
+    """
+    (position, card) for the cards at positions start .. start + limit - 1 of
+    the session. Sessions in card order serve the card with ordinal p at
+    position p, so a window is one range of the (set, ordinal) index, however
+    far into the set it starts: cards in the order they were added.
+
+    A shuffled session maps each of its first deck_size positions to a card
+    ordinal with its seeded permutation, and later positions to the cards
+    added since it started, in order; the window's ordinals are read from the
+    (set, ordinal) index, so no order is stored or materialized. Adding cards
+    leaves every position in place. Deleting a card moves every later card
+    down one ordinal, so those positions map to other cards; deck_changed
+    tells the client to reload its windows.
+    """
+    if session.shuffled:
+        positions = range(start, min(start + limit, session.card_total))
+        ordinals = [session_ordinal(session, position) for position in positions]
+        cards = _cards_by_ordinal(session.flashcard_set_id, ordinal__in=ordinals)
+        return [(position, cards[ordinal]) for position, ordinal in zip(positions, ordinals) if ordinal in cards]
+    cards = _cards_by_ordinal(session.flashcard_set_id, ordinal__gte=start, ordinal__lt=start + limit)
+    return sorted(cards.items())
+
+
+def _cards_by_ordinal(set_id, **filters):
+    cards = {}
+    for card in FlashCard.objects.filter(set_id=set_id, **filters).order_by('ordinal', 'id'):
+        if card.ordinal in cards:
+            # A shared ordinal would hide one of the cards: renumber the set in
+            # (ordinal, id) order and read the window again.
+            logger.warning(
+                "Cards %s and %s of set %s share ordinal %s; renumbering the set",
+                cards[card.ordinal].pk, card.pk, set_id, card.ordinal,
+            )
+            rebuild_card_ordinals(set_ids=[set_id])
+            return {card.ordinal: card for card in FlashCard.objects.filter(set_id=set_id, **filters)}
+        cards[card.ordinal] = card
+    return cards
+
+
+def session_ordinal(session, position):
+    """The ordinal of the card at `position` of a shuffled session."""
+    if position < session.deck_size:
+        return shuffled_ordinal(position, session.deck_size, session.seed)
+    return position
+
+
+def shuffled_ordinal(position, size, seed):
+    """
+    The ordinal at `position` of the seeded permutation of 0 .. size - 1.
+    A balanced Feistel network keyed by `seed` permutes the smallest range of
+    an even number of bits that holds `size`; results outside 0 .. size - 1
+    are fed through again ("cycle walking"), which keeps the mapping a
+    permutation. That range can be almost four times `size` (4096 for 1025),
+    so a lookup takes up to about four passes on average.
+    """
+    half = max((size - 1).bit_length() + 1, 2) // 2
+    mask = (1 << half) - 1
+    value = position
+    while True:
+        left, right = value >> half, value & mask
+        for round_number in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ (_round_key(seed, round_number, right) & mask)
+        value = (left << half) | right
+        if value < size:
+            return value
+
+
+def _round_key(seed, round_number, value):
+    digest = hashlib.blake2b(f'{seed}:{round_number}:{value}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
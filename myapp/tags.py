@@ -0,0 +1,273 @@
+# myapp/tags.py
+import bisect
+import heapq
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Tag
+
+MAX_TAGS_PER_SET = 8
+
+
+def normalize_tag_name(name):
+    """Tags are stored lower-case with single spaces, so "Spanish  Verbs" == "spanish verbs"."""
+    return ' '.join(name.split()).lower()
+
+
+def parse_tag_names(raw):
+    """
+    Normalized, de-duplicated tag names (in their original order) from a
+    comma-separated string or a list of names. Semicolons also separate names.
+    """
+    if isinstance(raw, str):
+        raw = raw.replace(';', ',').split(',')
+    names = (normalize_tag_name(name) for name in raw or [] if isinstance(name, str))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def resolve_tags(names):
+    """
+    Tag objects for the given names, keyed by normalized name, creating the
+    missing ones. Costs one SELECT, plus one INSERT and one re-SELECT when some
+    are new. Concurrent requests creating the same tag are safe: the insert
+    ignores rows that already exist and the re-select picks up whichever won.
+    """
+    names = set(parse_tag_names(list(names)))
+    if not names:
+        return {}
+    tags = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+    missing = names - tags.keys()
+    if missing:
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        created = list(Tag.objects.filter(name__in=missing))
+        # bulk_create skips post_save, so tell the autocomplete index directly
+        for tag in created:
+            tag_index.add(tag.pk, tag.name)
+        tags.update((tag.name, tag) for tag in created)
+    return tags
+
+
+def set_tags(flashcard_set, names):
+    """
+    Make `names` the tags of the set. Only the difference to the current tags
+    is written, so saving a set with unchanged tags costs no writes.
+    """
+    with transaction.atomic():
+        wanted = {tag.pk for tag in resolve_tags(names).values()}
+        current = set(flashcard_set.tags.values_list('pk', flat=True))
+        if wanted - current:
+            flashcard_set.tags.add(*(wanted - current))
+        if current - wanted:
+            flashcard_set.tags.remove(*(current - wanted))
+
+
+TagSuggestion = namedtuple('TagSuggestion', ['name', 'set_count'])
+
+
+class TagPrefixIndex:
+    """
+    Process-local index of tag names for autocomplete, ranked by how many sets
+    use each tag.
+
+    Every tag is filed under its full name and under each later word, so
+    "verb" finds "spanish verbs". Entries are (key, tag id) pairs kept in a
+    sorted list; a prefix query bisects to the matching range and picks the
+    most used tags with a heap. Short prefixes match so many tags that it is
+    cheaper to walk a second list of all tags, most used first, and stop at
+    the first `limit` matches.
+
+    The signal handlers report each change once its transaction commits, so
+    rolled-back changes never reach the index. A change is applied here and
+    appended to a change log in Django's cache: a sequence number and one
+    entry per change, kept for `log_ttl` seconds. Other worker processes read
+    the sequence number at most every `check_interval` seconds and apply the
+    entries they have not seen, so tagging a set costs them no database
+    query. They reload from the database when entries are missing (expired,
+    evicted, or more than `max_replay` behind) or when invalidate() stored a
+    new version stamp. Every copy is also reloaded after `max_age` seconds,
+    which corrects any drift from writes that bypass the signals.
+    """
+    version_key = 'myapp:tag_index:version'
+    log_key = 'myapp:tag_index:log'
+    check_interval = 5
+    max_age = 300
+    log_ttl = 600
+    max_replay = 1000
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []    # sorted (key, tag id)
+        self._ranked = []  # sorted (-set count, name, tag id)
+        self._tags = {}    # tag id -> [name, set count]
+        self._version = None
+        self._seq = 0      # last change log entry applied
+        self._loaded_at = self._checked_at = None
+
+    @staticmethod
+    def _keys_for(name):
+        words = name.split(' ')
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def search(self, prefix, limit=10):
+        """The `limit` most used tags with a word starting with `prefix`, as TagSuggestions."""
+        prefix = normalize_tag_name(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            self._ensure_fresh()
+            return self._best(prefix, limit)
+
+    def _best(self, prefix, limit):
+        start = bisect.bisect_left(self._keys, (prefix,))
+        end = bisect.bisect_left(self._keys, (prefix + '\uffff',), start)
+        # Walking the ranked list takes about limit * len(tags) / matches steps
+        if (end - start) ** 2 > limit * len(self._tags):
+            needle = ' ' + prefix
+            best = []
+            for negative_count, name, _ in self._ranked:
+                if needle in ' ' + name:
+                    best.append(TagSuggestion(name, -negative_count))
+                    if len(best) == limit:
+                        break
+            return best
+        tag_ids = {tag_id for _, tag_id in self._keys[start:end]}
+        best = heapq.nsmallest(limit, (self._tags[tag_id] for tag_id in tag_ids), key=lambda tag: (-tag[1], tag[0]))
+        return [TagSuggestion(name, count) for name, count in best]
+
+    def _ensure_fresh(self):
+        clock = time.monotonic()
+        if self._loaded_at is not None and clock - self._loaded_at < self.max_age:
+            if clock - self._checked_at < self.check_interval:
+                return
+            stamps = cache.get_many([self.version_key, self.log_key])
+            if stamps.get(self.version_key) == self._version and self._catch_up(stamps.get(self.log_key, 0)):
+                self._checked_at = clock
+                return
+        self._load(clock)
+
+    def _load(self, clock):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.add(self.version_key, version, None)
+            version = cache.get(self.version_key, version)
+        seq = cache.get(self.log_key, 0)
+        rows = Tag.objects.annotate(set_count=Count('sets')).values_list('id', 'name', 'set_count')
+        self.build(rows)
+        self._version, self._seq = version, seq
+        self._loaded_at = self._checked_at = clock
+
+    def _catch_up(self, seq):
+        """
+        Apply the change log entries up to `seq`. Returns False, having applied
+        nothing, when some of them are no longer in the cache.
+        """
+        if seq == self._seq:
+            return True
+        # A smaller sequence number means the log itself was evicted
+        if not self._seq < seq <= self._seq + self.max_replay:
+            return False
+        keys = [f'{self.log_key}:{number}' for number in range(self._seq + 1, seq + 1)]
+        entries = cache.get_many(keys)
+        if len(entries) < len(keys):
+            return False
+        for key in keys:
+            self._apply(entries[key])
+        self._seq = seq
+        return True
+
+    def build(self, rows):
+        """Replace the contents with (id, name, set count) rows."""
+        with self._lock:
+            self._tags = {tag_id: [name, count] for tag_id, name, count in rows}
+            self._keys = sorted((key, tag_id) for tag_id, (name, _) in self._tags.items() for key in self._keys_for(name))
+            self._ranked = sorted((-count, name, tag_id) for tag_id, (name, count) in self._tags.items())
+
+    def invalidate(self):
+        """Drop this copy and make every process reload on its next query."""
+        with self._lock:
+            self._loaded_at = None
+            cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    # Changes reported by the signal handlers, published once committed
+
+    def add(self, tag_id, name):
+        self._publish(('add', tag_id, name))
+
+    def remove(self, tag_id):
+        self._publish(('remove', tag_id, None))
+
+    def rename(self, tag_id, name):
+        self._publish(('rename', tag_id, name))
+
+    def adjust_counts(self, deltas):
+        """Apply {tag id: change in set count}."""
+        deltas = {tag_id: delta for tag_id, delta in deltas.items() if delta}
+        if deltas:
+            self._publish(('counts', None, deltas))
+
+    def _publish(self, change):
+        """Apply and log a (kind, tag id, value) change once the current transaction commits."""
+        transaction.on_commit(lambda: self._commit(change))
+
+    def _commit(self, change):
+        cache.add(self.log_key, 0, None)
+        seq = cache.incr(self.log_key)
+        cache.set(f'{self.log_key}:{seq}', change, self.log_ttl)
+        with self._lock:
+            # Entries other processes logged before this one come first
+            if self._loaded_at is not None and not self._catch_up(seq - 1):
+                self._loaded_at = None
+            if self._loaded_at is not None:
+                self._apply(change)
+                self._seq = seq
+
+    def _apply(self, change):
+        kind, tag_id, value = change
+        if kind == 'add':
+            if tag_id not in self._tags:
+                self._insert(tag_id, value, 0)
+        elif kind == 'remove':
+            if tag_id in self._tags:
+                self._delete(tag_id)
+        elif kind == 'rename':
+            if tag_id not in self._tags or self._tags[tag_id][0] != value:
+                count = self._delete(tag_id) if tag_id in self._tags else 0
+                self._insert(tag_id, value, count)
+        elif kind == 'counts':
+            for tag_id, delta in value.items():
+                if tag_id in self._tags:
+                    name, count = self._tags[tag_id]
+                    _remove_sorted(self._ranked, (-count, name, tag_id))
+                    count = max(count + delta, 0)
+                    self._tags[tag_id][1] = count
+                    bisect.insort(self._ranked, (-count, name, tag_id))
+
+    def _insert(self, tag_id, name, count):
+        self._tags[tag_id] = [name, count]
+        for key in self._keys_for(name):
+            bisect.insort(self._keys, (key, tag_id))
+        bisect.insort(self._ranked, (-count, name, tag_id))
+
+    def _delete(self, tag_id):
+        """Remove a tag and return its set count."""
+        name, count = self._tags.pop(tag_id)
+        for key in self._keys_for(name):
+            _remove_sorted(self._keys, (key, tag_id))
+        _remove_sorted(self._ranked, (-count, name, tag_id))
+        return count
+
+
+def _remove_sorted(entries, entry):
+    index = bisect.bisect_left(entries, entry)
+    if index < len(entries) and entries[index] == entry:
+        del entries[index]
+
+
+tag_index = TagPrefixIndex()
@@ -0,0 +1,62 @@
+import contextlib
+
+import pytest
+from django.db import connections
+from django.db.models import QuerySet
+from django.template.backends.django import Template
+
+from myapp.models import creation_limit_cache
+from myapp.reviewevents import review_events
+
+
+@pytest.fixture
+def no_template_queries(monkeypatch):
+    """
+    Fail any template render that queries the database, e.g. a `set.tags.all`
+    the view did not prefetch. Querysets passed in the context are evaluated
+    before rendering, so only the lazy loads the template triggers count.
+    """
+    render = Template.render
+
+    def guarded_render(self, context=None, request=None):
+        for value in (context or {}).values():
+            if isinstance(value, QuerySet):
+                value._fetch_all()
+
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record))
+            content = render(self, context, request)
+        assert not queries, f"{self.template.name} ran {len(queries)} queries while rendering:\n" + '\n'.join(queries)
+        return content
+
+    monkeypatch.setattr(Template, 'render', guarded_render)
+
+
+@pytest.fixture(autouse=True)
+def raise_over_query_budget(settings):
+    """Every request made in the tests fails when it is over its query budget or runs an N+1."""
+    settings.QUERY_BUDGET = {**settings.QUERY_BUDGET, 'SAMPLE_RATE': 1.0, 'RAISE': True}
+
+
+@pytest.fixture(autouse=True)
+def review_event_buffer(settings):
+    """Review events are only written when a test flushes them or fills the buffer, never from a timer."""
+    settings.REVIEW_EVENTS = {**settings.REVIEW_EVENTS, 'BACKGROUND_FLUSH': False}
+    yield review_events
+    review_events.clear()
+
+
+@pytest.fixture(autouse=True)
+def fresh_creation_limits():
+    """
+    Saving limits only drops the cached copy on commit, which never comes inside
+    a test's transaction, so every test starts without a copy from the last one.
+    """
+    creation_limit_cache.invalidate()
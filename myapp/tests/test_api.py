@@ -3,9 +3,20 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
-from myapp.models import FlashCardSet, FlashCard, Collection, CreationLimit, UserDailyCreation
+from myapp.models import FlashCardSet, FlashCard, Collection, Comment, CreationLimit, Rating, Tag, UserDailyCreation, UserFavorite
+from myapp import quota, querybudget
+from myapp.utils import pick_random_row
+from myapp.models import creation_limit_cache
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.http import http_date
 from django.test import TestCase
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from datetime import timedelta
+from io import StringIO
 
 
 
@@ -35,8 +46,32 @@ class TestFlashcardSets:
     def test_list_flashcard_sets_empty(self):
         response = self.client.get(self.sets_url, format='json')
         assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'] == []
+        assert response.data['next'] is None
+
+    def test_list_flashcard_sets_legacy_unpaginated(self):
+        FlashCardSet.objects.create(name="Legacy Set", author=self.user)
+        response = self.client.get(self.sets_url, {'paginate': 'false'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
         assert isinstance(response.data, list)
-        assert len(response.data) == 0
+        assert len(response.data) == 1
+
+    def test_list_flashcard_sets_cursor_pages(self):
+        created = [FlashCardSet.objects.create(name=f"Set {i}", author=self.user) for i in range(5)]
+        seen = []
+        response = self.client.get(self.sets_url, {'page_size': 2}, format='json')
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.data['results']) <= 2
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'], format='json')
+        # Newest first, every set exactly once
+        assert seen == [s.id for s in reversed(created)]
+
+        previous = self.client.get(response.data['previous'], format='json')
+        assert [item['id'] for item in previous.data['results']] == seen[-3:-1]
 
     def test_create_flashcard_set_success(self):
         data = {"name": "European Capitals"}
@@ -83,6 +118,244 @@ class TestFlashcardSets:
         assert response.status_code == status.HTTP_204_NO_CONTENT
 
 
+@pytest.mark.django_db
+class TestSetQueryCounts:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="querycount", password="testpass")
+        self.client = APIClient()
+
+    def make_sets(self, count):
+        for i in range(count):
+            set_obj = FlashCardSet.objects.create(name=f"Set {i}", author=self.user)
+            for j in range(3):
+                FlashCard.objects.create(question=f"Q{j}", answer=f"A{j}", set=set_obj)
+                Comment.objects.create(content=f"C{j}", author=self.user, flashcard_set=set_obj)
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        return len(ctx.captured_queries)
+
+    def test_set_list_query_count_is_constant(self):
+        self.make_sets(2)
+        few = self.count_queries(reverse('api-sets'))
+        self.make_sets(10)
+        many = self.count_queries(reverse('api-sets'))
+        assert many == few
+        assert many <= 5
+        assert self.count_queries(reverse('api-sets'), paginate='false') <= 5
+
+    def test_user_set_list_query_count_is_constant(self):
+        url = reverse('api-user-sets', kwargs={'userId': self.user.id})
+        self.make_sets(2)
+        few = self.count_queries(url)
+        self.make_sets(10)
+        assert self.count_queries(url) == few <= 5
+
+    def test_set_detail_query_count(self):
+        self.make_sets(1)
+        set_obj = FlashCardSet.objects.get()
+        # set, cards, comments, rating summary and the conditional-GET validator lookup
+        assert self.count_queries(reverse('api-set-detail', kwargs={'pk': set_obj.id})) <= 5
+
+
+@pytest.mark.django_db
+class TestQueryBudget:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="budget", password="testpass")
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        for i in range(12):
+            set_obj = FlashCardSet.objects.create(name=f"Set {i}", author=self.user)
+            set_obj.tags.add(Tag.objects.create(name=f"tag {i}"))
+
+    def unprefetched_set_list(self, monkeypatch):
+        monkeypatch.setattr(
+            'myapp.views.FlashCardSetListView.get_queryset',
+            lambda view: FlashCardSet.objects.filter(author=view.request.user),
+        )
+
+    def test_sql_template_collapses_values(self):
+        sql = 'SELECT * FROM "t" WHERE "t"."id" IN (%s, %s, %s) AND "t"."name" = \'x\' LIMIT 21'
+        assert querybudget.sql_template(sql) == 'SELECT * FROM "t" WHERE "t"."id" IN (...) AND "t"."name" = ? LIMIT ?'
+
+    def test_n_plus_one_is_raised(self, monkeypatch):
+        self.unprefetched_set_list(monkeypatch)
+        with pytest.raises(querybudget.QueryBudgetExceeded) as excinfo:
+            self.client.get(reverse('flashcard-set-list'))
+        message = str(excinfo.value)
+        assert message.startswith("GET flashcard-set-list: ")
+        assert "24 runs of: SELECT" in message and '"myapp_tag"' in message
+
+    def test_view_budget_is_logged(self, settings, caplog):
+        settings.QUERY_BUDGET = {**settings.QUERY_BUDGET, 'RAISE': False, 'VIEWS': {'flashcard-set-list': 2}}
+        with caplog.at_level('WARNING', logger='myapp.querybudget'):
+            response = self.client.get(reverse('flashcard-set-list'))
+        assert response.status_code == 200
+        assert "GET flashcard-set-list" in caplog.text
+        assert "(budget 2)" in caplog.text and " ms over budget" in caplog.text
+
+    def test_unsampled_requests_are_not_checked(self, settings, monkeypatch):
+        settings.QUERY_BUDGET = {**settings.QUERY_BUDGET, 'SAMPLE_RATE': 0}
+        self.unprefetched_set_list(monkeypatch)
+        assert self.client.get(reverse('flashcard-set-list')).status_code == 200
+
+    def test_assert_query_budget_helper(self):
+        with querybudget.assert_query_budget(max_queries=2) as log:
+            list(FlashCardSet.objects.prefetch_related('tags'))
+        assert log.count == 2
+        with pytest.raises(AssertionError, match="12 runs of"):
+            with querybudget.assert_query_budget(repeat_limit=5):
+                for set_obj in FlashCardSet.objects.all():
+                    list(set_obj.tags.all())
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="sparse", password="testpass")
+        self.client = APIClient()
+        self.set_obj = FlashCardSet.objects.create(name="Sparse Set", author=self.user)
+        FlashCard.objects.create(question="Q", answer="A", set=self.set_obj)
+        Comment.objects.create(content="Nice", author=self.user, flashcard_set=self.set_obj)
+        self.sets_url = reverse('api-sets')
+
+    def test_fields_limit_the_representation(self):
+        response = self.client.get(self.sets_url, {'fields': 'id,name,updatedAt'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert set(response.data['results'][0]) == {'id', 'name', 'updatedAt'}
+
+    def test_include_selects_nested_relations(self):
+        response = self.client.get(self.sets_url, {'include': 'cards'}, format='json')
+        item = response.data['results'][0]
+        assert 'cards' in item and 'comments' not in item
+        assert item['cards'][0]['question'] == "Q"
+        assert item['author']['username'] == "sparse"
+
+        detail = self.client.get(reverse('api-set-detail', kwargs={'pk': self.set_obj.id}), {'include': 'comments'})
+        assert 'comments' in detail.data and 'cards' not in detail.data
+
+    def test_default_shape_is_unchanged(self):
+        item = self.client.get(self.sets_url, format='json').data['results'][0]
+        assert {'cards', 'comments', 'author', 'average_rating'} <= set(item)
+
+    def test_unrequested_relations_are_not_queried(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.sets_url, {'fields': 'id,name,updatedAt'}, format='json')
+        sql = " ".join(q['sql'] for q in ctx.captured_queries)
+        assert 'myapp_flashcard"' not in sql
+        assert 'myapp_comment' not in sql
+        assert 'myapp_ratingsummary' not in sql
+        assert len(ctx.captured_queries) == 1
+
+    def test_collection_and_user_fields(self):
+        Collection.objects.create(name="Coll", author=self.user)
+        response = self.client.get(reverse('api-collections'), {'fields': 'id,name'}, format='json')
+        assert set(response.data['results'][0]) == {'id', 'name'}
+        response = self.client.get(reverse('api-users'), {'fields': 'username'}, format='json')
+        assert response.data['results'] == [{'username': "sparse"}]
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    def setup_method(self):
+        CreationLimit.objects.create(pk=1, daily_set_limit=5, daily_flashcard_limit=50, daily_collection_limit=5)
+        self.user = User.objects.create_user(username="etaguser", password="testpass")
+        self.client = APIClient()
+        self.client.login(username="etaguser", password="testpass")
+        self.set_obj = FlashCardSet.objects.create(name="Cached Set", author=self.user)
+        self.card = FlashCard.objects.create(question="Q1", answer="A1", set=self.set_obj)
+        self.detail_url = reverse('api-set-detail', kwargs={'pk': self.set_obj.id})
+        self.cards_url = reverse('api-set-cards', kwargs={'pk': self.set_obj.id})
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_set_returns_304_without_serializing(self):
+        first = self.client.get(self.detail_url, format='json')
+        assert first.status_code == status.HTTP_200_OK
+        etag = first['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.revalidate(self.detail_url, etag)
+        assert second.status_code == status.HTTP_304_NOT_MODIFIED
+        # Session/user lookups plus one validator query, nothing else
+        assert not any('myapp_flashcard"' in q['sql'] for q in ctx.captured_queries)
+
+    def test_card_changes_bump_the_validator(self):
+        etag = self.client.get(self.detail_url, format='json')['ETag']
+        cards_etag = self.client.get(self.cards_url, format='json')['ETag']
+
+        self.card.answer = "Changed"
+        self.card.save()
+        assert self.revalidate(self.detail_url, etag).status_code == status.HTTP_200_OK
+        assert self.revalidate(self.cards_url, cards_etag).status_code == status.HTTP_200_OK
+
+        cards_etag = self.client.get(self.cards_url, format='json')['ETag']
+        response = self.client.post(self.cards_url, {"question": "Q2", "answer": "A2"}, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert self.revalidate(self.cards_url, cards_etag).status_code == status.HTTP_200_OK
+
+        cards_etag = self.client.get(self.cards_url, format='json')['ETag']
+        self.card.delete()
+        assert self.revalidate(self.cards_url, cards_etag).status_code == status.HTTP_200_OK
+
+    def test_comment_changes_bump_the_validator(self):
+        etag = self.client.get(self.detail_url, format='json')['ETag']
+        Comment.objects.create(content="New", author=self.user, flashcard_set=self.set_obj)
+        assert self.revalidate(self.detail_url, etag).status_code == status.HTTP_200_OK
+
+    def test_if_modified_since_is_not_answered_from_updated_at(self):
+        first = self.client.get(self.detail_url, format='json')
+        assert 'Last-Modified' not in first
+        Comment.objects.create(content="New", author=self.user, flashcard_set=self.set_obj)
+        since = timezone.now() + timedelta(days=1)
+        response = self.client.get(self.detail_url, format='json', HTTP_IF_MODIFIED_SINCE=http_date(since.timestamp()))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['comment_count'] == 1
+
+    def test_ratings_and_favorites_bump_the_validator_but_not_updated_at(self):
+        set_ct = ContentType.objects.get_for_model(FlashCardSet)
+        updated_at = FlashCardSet.objects.get(pk=self.set_obj.pk).updatedAt
+        for activity in (
+            lambda: Rating.objects.create(user=self.user, score=4, content_type=set_ct, object_id=self.set_obj.id),
+            lambda: UserFavorite.objects.create(user=self.user, content_type=set_ct, object_id=self.set_obj.id),
+            lambda: Comment.objects.create(content="New", author=self.user, flashcard_set=self.set_obj),
+        ):
+            etag = self.client.get(self.detail_url, format='json')['ETag']
+            activity()
+            assert self.revalidate(self.detail_url, etag).status_code == status.HTTP_200_OK
+        assert FlashCardSet.objects.get(pk=self.set_obj.pk).updatedAt == updated_at
+
+    def test_query_string_is_part_of_the_etag(self):
+        etag = self.client.get(self.detail_url, format='json')['ETag']
+        response = self.client.get(self.detail_url, {'fields': 'id'}, format='json', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+class TestSetDeletion:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="deleter", password="testpass")
+        self.client = APIClient()
+        self.client.login(username="deleter", password="testpass")
+
+    def delete_set_with(self, count):
+        flashcard_set = FlashCardSet.objects.create(name=f"Doomed {count}", author=self.user)
+        for i in range(count):
+            FlashCard.objects.create(question=f"Q{i}", answer="A", set=flashcard_set)
+            Comment.objects.create(content=f"C{i}", author=self.user, flashcard_set=flashcard_set)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('flashcard-set-delete', kwargs={'pk': flashcard_set.pk}))
+        assert response.status_code == 302
+        assert not FlashCard.objects.filter(set_id=flashcard_set.pk).exists()
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_cards_and_comments(self):
+        assert self.delete_set_with(2) == self.delete_set_with(40)
+
+
 @pytest.mark.django_db
 class TestFlashcardsInSet:
     def setup_method(self):
@@ -111,6 +384,62 @@ class TestFlashcardsInSet:
         assert response.data['question'] == "What is the capital of France?"
 
 
+@pytest.mark.django_db
+class TestBulkFlashcards:
+    def setup_method(self):
+        CreationLimit.objects.create(pk=1, daily_set_limit=5, daily_flashcard_limit=50, daily_collection_limit=5)
+        self.user = User.objects.create_user(username="bulkuser", password="testpass")
+        self.client = APIClient()
+        self.client.login(username="bulkuser", password="testpass")
+        self.flashcard_set = FlashCardSet.objects.create(name="Bulk", author=self.user)
+        self.url = reverse('api-set-cards-bulk', kwargs={'pk': self.flashcard_set.id})
+
+    def test_creates_batch_with_constant_queries(self):
+        cards = [{"question": f"Q{i}", "answer": f"A{i}"} for i in range(40)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, cards, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['created'] == 40
+        assert [r['index'] for r in response.data['results']] == list(range(40))
+        assert len(ctx.captured_queries) < 25
+        assert response['X-Quota-Remaining'] == '10'
+
+        self.flashcard_set.refresh_from_db()
+        assert self.flashcard_set.card_count == 40
+        assert self.flashcard_set.card_version == 1
+        assert UserDailyCreation.objects.get(user=self.user).flashcards_created == 40
+
+    def test_ndjson_with_invalid_items_reports_per_item(self):
+        body = '{"question": "Q1", "answer": "A1"}\n\n{"question": "Q2", "difficulty": "Impossible"}\n{"question": "Q3"}\n'
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert response.data['created'] == 2
+        assert [r['status'] for r in response.data['results']] == ['created', 'error', 'created']
+        assert 'difficulty' in response.data['results'][1]['errors']
+        assert UserDailyCreation.objects.get(user=self.user).flashcards_created == 2
+
+    def test_malformed_ndjson_is_rejected(self):
+        response = self.client.post(self.url, '{"question": "Q1"}\n{oops\n', content_type='application/x-ndjson')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'line 2' in str(response.data)
+
+    def test_batch_over_quota_creates_nothing(self):
+        cards = [{"question": f"Q{i}", "answer": "A"} for i in range(51)]
+        response = self.client.post(self.url, cards, format='json')
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert not FlashCard.objects.exists()
+
+    def test_only_author_can_bulk_create(self):
+        User.objects.create_user(username="intruder", password="testpass")
+        self.client.login(username="intruder", password="testpass")
+        response = self.client.post(self.url, [{"question": "Q", "answer": "A"}], format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_rejects_non_list_body(self):
+        response = self.client.post(self.url, {"question": "Q"}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 @pytest.mark.django_db
 class TestCollections:
     def setup_method(self):
@@ -124,8 +453,10 @@ class TestCollections:
     def test_list_collections_empty(self):
         response = self.client.get(self.collections_url, format='json')
         assert response.status_code == status.HTTP_200_OK
-        assert isinstance(response.data, list)
-        assert len(response.data) == 0
+        assert response.data['results'] == []
+
+        legacy = self.client.get(self.collections_url, {'paginate': 'false'}, format='json')
+        assert legacy.data == []
 
     def test_create_collection(self):
         data = [
@@ -152,6 +483,58 @@ class TestCollections:
         else:
             assert r1.status_code == status.HTTP_404_NOT_FOUND
 
+    def test_random_collection_filters(self):
+        other = User.objects.create_user(username="otheruser", password="testpass")
+        tagged_set = FlashCardSet.objects.create(name="Tagged", author=other)
+        tagged_set.tags.add(Tag.objects.create(name="french"))
+        mine = Collection.objects.create(name="Mine", author=self.user)
+        mine.sets.add(self.flashcard_set)
+        theirs = Collection.objects.create(name="Theirs", author=other)
+        theirs.sets.add(tagged_set)
+        random_url = reverse('api-collections-random')
+
+        for _ in range(5):
+            response = self.client.get(random_url, {'author': self.user.id})
+            assert response.status_code == 302
+            assert response['Location'].rstrip('/').endswith(f'/{mine.id}')
+
+            response = self.client.get(random_url, {'tag': 'french'})
+            assert response.status_code == 302
+            assert response['Location'].rstrip('/').endswith(f'/{theirs.id}')
+
+        assert self.client.get(random_url, {'tag': 'german'}).status_code == status.HTTP_404_NOT_FOUND
+        assert self.client.get(random_url, {'author': 'abc'}).status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_random_collection_pick_is_indexed(self):
+        tagged_set = FlashCardSet.objects.create(name="Tagged", author=self.user)
+        tagged_set.tags.add(Tag.objects.create(name="french"))
+        for i in range(3):
+            Collection.objects.create(name=f"C{i}", author=self.user).sets.add(tagged_set)
+        tagged = Collection.sets.through.objects.filter(flashcardset__tags__name='french').values('collection_id')
+        for collections in (
+            Collection.objects.all(),
+            Collection.objects.filter(author_id=self.user.id),
+            Collection.objects.filter(id__in=tagged),
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                pick_random_row(collections, 'id', 'author_id')
+            for query in queries:
+                plan = connection.ops.explain_query_prefix() + ' ' + query['sql']
+                with connection.cursor() as cursor:
+                    cursor.execute(plan)
+                    steps = ' | '.join(row[-1] for row in cursor.fetchall())
+                assert 'SCAN' not in steps, f"{query['sql']}\n{steps}"
+
+    def test_random_collection_skips_id_gaps(self):
+        collections = [Collection.objects.create(name=f"C{i}", author=self.user) for i in range(4)]
+        collections[1].delete()
+        collections[2].delete()
+        picked = {
+            self.client.get(reverse('api-collections-random'))['Location'].rstrip('/').rsplit('/', 1)[-1]
+            for _ in range(30)
+        }
+        assert picked <= {str(collections[0].id), str(collections[3].id)}
+
 
 @pytest.mark.django_db
 class TestDailyLimit:
@@ -209,3 +592,104 @@ class TestCollectionCreationLimit:
         data2 = {"name": "Another Collection", "description": "desc"}
         r2 = self.client.post(self.collections_url, data2, format='json')
         assert r2.status_code == 429
+
+
+@pytest.mark.django_db
+class TestQuotaService:
+    def setup_method(self):
+        CreationLimit.objects.create(pk=1, daily_set_limit=3, daily_flashcard_limit=5, daily_collection_limit=5)
+        self.user = User.objects.create_user(username="quotauser", password="testpass")
+
+    def test_consume_returns_remaining_and_stops_at_limit(self):
+        assert quota.consume(self.user, 'set') == quota.Allowance(3, 2)
+        assert quota.consume(self.user, 'set', amount=2).remaining == 0
+        with pytest.raises(quota.QuotaExceeded):
+            quota.consume(self.user, 'set')
+        assert UserDailyCreation.objects.get(user=self.user).sets_created == 3
+
+    def test_batch_larger_than_allowance_is_rejected_whole(self):
+        quota.consume(self.user, 'flashcard', amount=4)
+        with pytest.raises(quota.QuotaExceeded):
+            quota.consume(self.user, 'flashcard', amount=2)
+        assert quota.remaining(self.user, 'flashcard').remaining == 1
+
+    def test_reservation_rolls_back_with_failed_insert(self):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                quota.consume(self.user, 'collection')
+                raise RuntimeError("insert failed")
+        assert quota.remaining(self.user, 'collection').remaining == 5
+
+    def test_failed_tagging_rolls_back_the_set_and_its_quota(self, monkeypatch):
+        def fail(flashcard_set, names):
+            raise RuntimeError("tagging failed")
+        monkeypatch.setattr('myapp.tags.set_tags', fail)
+        client = APIClient()
+        client.login(username="quotauser", password="testpass")
+        with pytest.raises(RuntimeError):
+            client.post(reverse('api-sets'), {"name": "Tagged Set", "tag_names": "geo"}, format='json')
+        assert not FlashCardSet.objects.filter(name="Tagged Set").exists()
+        assert quota.remaining(self.user, 'set').remaining == 3
+
+    def test_api_reports_remaining_allowance(self):
+        client = APIClient()
+        client.login(username="quotauser", password="testpass")
+        response = client.post(reverse('api-sets'), {"name": "Quota Set"}, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response['X-Quota-Remaining'] == "2"
+
+    def test_superuser_is_not_limited(self):
+        admin = User.objects.create_superuser(username="quotaadmin", password="testpass")
+        for _ in range(5):
+            assert quota.consume(admin, 'set').remaining is None
+
+
+@pytest.mark.django_db
+class TestCreationLimitCache:
+    def setup_method(self):
+        CreationLimit.objects.create(pk=1, daily_set_limit=5, daily_flashcard_limit=50, daily_collection_limit=5)
+
+    def test_limits_are_served_without_queries(self, django_assert_num_queries):
+        CreationLimit.get_solo()
+        with django_assert_num_queries(0):
+            assert CreationLimit.get_solo().daily_set_limit == 5
+
+    def test_admin_save_invalidates_on_commit(self, django_capture_on_commit_callbacks):
+        limits = CreationLimit.get_solo()
+        limits.daily_set_limit = 7
+        version = cache.get(creation_limit_cache.version_key)
+        with django_capture_on_commit_callbacks(execute=True):
+            limits.save()
+            # Until the change is committed, other workers could only re-read the old row
+            assert cache.get(creation_limit_cache.version_key) == version
+        assert cache.get(creation_limit_cache.version_key) != version
+        assert CreationLimit.get_solo().daily_set_limit == 7
+
+    def test_other_workers_pick_up_new_version_stamp(self, monkeypatch):
+        CreationLimit.get_solo()
+        # Another worker saved new limits: the row changed and the stamp moved on
+        CreationLimit.objects.update(daily_set_limit=9)
+        monkeypatch.setattr(creation_limit_cache, 'check_interval', 0)
+        assert CreationLimit.get_solo().daily_set_limit == 5
+        cache.set(creation_limit_cache.version_key, "saved-elsewhere", None)
+        assert CreationLimit.get_solo().daily_set_limit == 9
+
+    def test_copies_expire_after_max_age(self, monkeypatch):
+        CreationLimit.get_solo()
+        CreationLimit.objects.update(daily_collection_limit=2)
+        monkeypatch.setattr(creation_limit_cache, 'max_age', 0)
+        assert CreationLimit.get_solo().daily_collection_limit == 2
+
+
+@pytest.mark.django_db(transaction=True)
+class TestQueryPlanBenchmark:
+    def test_benchmark_reports_index_plans_and_rolls_back(self):
+        out = StringIO()
+        call_command('benchmark_query_plans', sets=20, users=5, ratings_per_user=3, repeat=1, stdout=out)
+        output = out.getvalue()
+        with_indexes, without_indexes = output.split("Without indexes")
+        assert 'comment_set_recent_idx' in with_indexes
+        assert 'rating_target_score_idx' in with_indexes
+        assert 'comment_set_recent_idx' not in without_indexes
+        assert not Comment.objects.exists()
+        assert not User.objects.filter(username__startswith='bench-user-').exists()
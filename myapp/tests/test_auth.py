@@ -20,7 +20,10 @@ class TestUserEndpoints:
         """
         response = self.client.get(self.users_url, format='json')
         assert response.status_code == status.HTTP_200_OK
-        assert isinstance(response.data, list)
+        assert [u['username'] for u in response.data['results']] == ["usertest"]
+
+        legacy = self.client.get(self.users_url, {'paginate': 'false'}, format='json')
+        assert isinstance(legacy.data, list)
 
     def test_create_user(self):
         """
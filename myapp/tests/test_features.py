@@ -4,10 +4,25 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
-from myapp.models import FlashCardSet, FlashCard, Comment, CreationLimit, UserFavorite, Tag, Rating, Collection
+from myapp.models import FlashCardSet, FlashCard, Comment, CreationLimit, UserFavorite, Tag, Rating, RatingSummary, Collection, CardSchedule, CardStat, ReviewEvent, ReviewGrade, StudySession
 from django.contrib.contenttypes.models import ContentType
 from rest_framework.test import APITestCase
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from io import StringIO
+from myapp import export, importer, rescheduling, reviewevents, search, study, tags
+from myapp.reviewevents import review_events
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import CaptureQueriesContext
+from myapp.utils import bulk_create_flashcards, get_average_rating, get_average_ratings
 import json
+import logging
+import random
+import time
+import timeit
+from datetime import timedelta
+from django.utils import timezone
+from django.core.cache import cache
 
 @pytest.mark.django_db
 class TestComments:
@@ -22,7 +37,7 @@ class TestComments:
     def test_list_comments_empty(self):
         response = self.client.get(self.comment_url, format='json')
         assert response.status_code == status.HTTP_200_OK
-        assert response.data == []
+        assert response.data['results'] == []
 
     def test_create_comment(self):
         data = {"content": "I love this set!"}
@@ -32,6 +47,42 @@ class TestComments:
         assert response.data['content'] == "I love this set!"
         assert 'author' in response.data
 
+    def test_comment_written_either_way_is_read_the_same_way(self):
+        via_fk = Comment.objects.create(content="FK", author=self.user, flashcard_set=self.flashcard_set)
+        via_gfk = Comment(content="GFK", author=self.user)
+        via_gfk.content_object = self.flashcard_set
+        via_gfk.save()
+
+        assert via_fk.content_object == self.flashcard_set
+        assert via_gfk.flashcard_set_id == self.flashcard_set.id
+        assert list(Comment.objects.for_set(self.flashcard_set)) == [via_gfk, via_fk]
+
+        page = self.client.get(reverse('flashcard-set-detail', kwargs={'pk': self.flashcard_set.id}))
+        assert list(page.context['comments']) == [via_gfk, via_fk]
+        api = self.client.get(self.comment_url, format='json')
+        assert [c['content'] for c in api.data['results']] == ["GFK", "FK"]
+
+    def test_backfill_migration_links_legacy_rows(self):
+        import importlib
+        from django.apps import apps
+        migration = importlib.import_module('myapp.migrations.0020_unify_comment_target')
+        set_ct = ContentType.objects.get_for_model(FlashCardSet)
+        legacy_fk = Comment.objects.create(content="FK", flashcard_set=self.flashcard_set)
+        legacy_gfk = Comment.objects.create(content="GFK", content_type=set_ct, object_id=self.flashcard_set.id)
+        orphan = Comment.objects.create(content="Orphan", content_type=set_ct, object_id=self.flashcard_set.id + 100)
+        # Undo what Comment.save() filled in, as rows written before it did so
+        Comment.objects.filter(pk=legacy_fk.pk).update(content_type=None, object_id=None)
+        Comment.objects.filter(pk__in=[legacy_gfk.pk, orphan.pk]).update(flashcard_set=None)
+
+        migration.backfill_comment_targets(apps, connection.schema_editor())
+
+        legacy_fk.refresh_from_db()
+        legacy_gfk.refresh_from_db()
+        orphan.refresh_from_db()
+        assert (legacy_fk.content_type, legacy_fk.object_id) == (set_ct, self.flashcard_set.id)
+        assert legacy_gfk.flashcard_set_id == self.flashcard_set.id
+        assert orphan.flashcard_set_id is None
+
 
 @pytest.mark.django_db
 class TestFavorites:
@@ -165,6 +216,77 @@ class TestRating:
         assert r2.json()['average_rating'] == 5.0
 
 
+@pytest.mark.django_db
+class TestBulkRatings:
+    def setup_method(self):
+        self.users = [User.objects.create(username=f"bulkrater{i}") for i in range(3)]
+        self.sets = [FlashCardSet.objects.create(name=f"Bulk Set {i}") for i in range(5)]
+        set_ct = ContentType.objects.get_for_model(FlashCardSet)
+        for user, score in zip(self.users, [5, 4, 2]):
+            Rating.objects.create(user=user, score=score, content_type=set_ct, object_id=self.sets[0].id)
+        Rating.objects.create(user=self.users[0], score=3, content_type=set_ct, object_id=self.sets[1].id)
+
+    def test_average_ratings_in_one_query(self, django_assert_num_queries):
+        ContentType.objects.get_for_model(FlashCardSet)  # warm the content type cache
+        with django_assert_num_queries(1):
+            ratings = get_average_ratings(self.sets)
+        assert ratings[self.sets[0].id] == 3.7
+        assert ratings[self.sets[1].id] == 3.0
+        assert ratings[self.sets[4].id] == 0.0
+        assert get_average_rating(self.sets[0]) == 3.7
+
+    def test_set_list_api_includes_ratings(self):
+        response = APIClient().get(reverse('api-sets'), format='json')
+        assert response.status_code == 200
+        by_id = {item['id']: item['average_rating'] for item in response.data['results']}
+        assert by_id[self.sets[0].id] == 3.7
+        assert by_id[self.sets[2].id] == 0.0
+
+
+@pytest.mark.django_db
+class TestRatingSummary:
+    def setup_method(self):
+        self.set_obj = FlashCardSet.objects.create(name="Summarised Set")
+        self.set_ct = ContentType.objects.get_for_model(FlashCardSet)
+        self.users = [User.objects.create(username=f"summary{i}") for i in range(2)]
+
+    def summary(self):
+        return RatingSummary.objects.get(content_type=self.set_ct, object_id=self.set_obj.id)
+
+    def test_summary_follows_create_change_and_delete(self):
+        first = Rating.objects.create(user=self.users[0], score=5, content_type=self.set_ct, object_id=self.set_obj.id)
+        Rating.objects.create(user=self.users[1], score=2, content_type=self.set_ct, object_id=self.set_obj.id)
+        summary = self.summary()
+        assert (summary.score_sum, summary.score_count, summary.average) == (7, 2, 3.5)
+        assert summary.histogram == {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}
+
+        first = Rating.objects.get(pk=first.pk)
+        first.score = 3
+        first.save()
+        summary = self.summary()
+        assert (summary.score_sum, summary.score_count) == (5, 2)
+        assert summary.histogram == {1: 0, 2: 1, 3: 1, 4: 0, 5: 0}
+
+        first.delete()
+        summary = self.summary()
+        assert (summary.score_sum, summary.score_count, summary.average) == (2, 1, 2.0)
+
+    def test_reconcile_command_repairs_drift(self):
+        Rating.objects.create(user=self.users[0], score=4, content_type=self.set_ct, object_id=self.set_obj.id)
+        # Queryset updates bypass the signal handlers
+        Rating.objects.update(score=1)
+        assert self.summary().score_sum == 4
+
+        out = StringIO()
+        call_command('reconcile_rating_summaries', '--dry-run', stdout=out)
+        assert "1 rating summaries are out of date" in out.getvalue()
+        assert self.summary().score_sum == 4
+
+        call_command('reconcile_rating_summaries', stdout=StringIO())
+        summary = self.summary()
+        assert (summary.score_sum, summary.count_1, summary.count_4) == (1, 1, 0)
+
+
 @pytest.mark.django_db
 class TestUnauthorizedActions:
     def setup_method(self):
@@ -184,7 +306,12 @@ class TestUnauthorizedActions:
 
 @pytest.mark.django_db
 class TestSearch:
-    def setup_method(self):
+    @pytest.fixture(autouse=True)
+    def indexed_sets(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            self.create_sets()
+
+    def create_sets(self):
         CreationLimit.objects.create(pk=1, daily_set_limit=5, daily_flashcard_limit=50, daily_collection_limit=5)
         self.user = User.objects.create_user(username="searchuser", password="testpass")
         self.client = APIClient()
@@ -201,7 +328,12 @@ class TestSearch:
 
 @pytest.mark.django_db
 class TestSearchByTags:
-    def setup_method(self):
+    @pytest.fixture(autouse=True)
+    def indexed_sets(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            self.create_sets()
+
+    def create_sets(self):
         CreationLimit.objects.create(pk=1, daily_set_limit=5, daily_flashcard_limit=50, daily_collection_limit=5)
         self.user = User.objects.create_user(username="tagsearch", password="testpass")
         self.client = APIClient()
@@ -221,6 +353,70 @@ class TestSearchByTags:
         assert response2.status_code == 200
         assert "French Geography" not in str(response2.content)
 
+@pytest.mark.django_db
+class TestFullTextSearch:
+    @pytest.fixture(autouse=True)
+    def indexed_sets(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            self.create_sets()
+
+    def create_sets(self):
+        self.user = User.objects.create_user(username="ftsuser", password="testpass")
+        self.client = APIClient()
+        self.client.login(username="ftsuser", password="testpass")
+        self.capitals = FlashCardSet.objects.create(name="European Capitals", author=self.user)
+        self.card = FlashCard.objects.create(question="Capital of Portugal?", answer="Lisbon", set=self.capitals)
+        self.rivers = FlashCardSet.objects.create(name="Rivers of the World", author=self.user)
+        FlashCard.objects.create(question="Which capital lies on the Danube?", answer="Vienna", set=self.rivers)
+        self.api_url = reverse('api-search')
+
+    def test_prefix_match_ranks_name_above_questions(self):
+        response = self.client.get(self.api_url, {'q': 'capit'})
+        assert response.status_code == 200
+        ids = [r['id'] for r in response.data['results']]
+        assert ids == [self.capitals.id, self.rivers.id]
+
+    def test_index_follows_card_and_tag_changes(self, django_capture_on_commit_callbacks):
+        assert search.search_set_ids("portugal") == [self.capitals.id]
+        with django_capture_on_commit_callbacks(execute=True):
+            self.card.delete()
+        assert search.search_set_ids("portugal") == []
+
+        tag = Tag.objects.create(name="geography")
+        with django_capture_on_commit_callbacks(execute=True):
+            self.rivers.tags.add(tag)
+        assert search.search_set_ids("geogr") == [self.rivers.id]
+        tag.name = "hydrology"
+        with django_capture_on_commit_callbacks(execute=True):
+            tag.save()
+        assert search.search_set_ids("geogr") == []
+        assert search.search_set_ids("hydrology") == [self.rivers.id]
+
+    def test_each_set_is_reindexed_once_per_transaction(self, django_capture_on_commit_callbacks):
+        with CaptureQueriesContext(connection) as queries, django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                for i in range(5):
+                    FlashCard.objects.create(question=f"Tributary {i}", answer="A", set=self.rivers)
+                FlashCard.objects.create(question="Capital of Spain?", answer="Madrid", set=self.capitals)
+        reindexes = [query for query in queries if f"INSERT INTO {search.FTS_TABLE}" in query['sql']]
+        # Both sets in one statement, and the table was probed before
+        assert len(reindexes) == 1 and not [query for query in queries if "LIMIT 0" in query['sql']]
+        assert search.search_set_ids("tributary") == [self.rivers.id]
+        assert search.search_set_ids("spain") == [self.capitals.id]
+
+    def test_operators_in_query_are_literal(self):
+        response = self.client.get(self.api_url, {'q': 'rivers OR "NEAR('})
+        assert response.status_code == 200
+        assert response.data['results'] == []
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.FTS_TABLE}")
+        assert search.search_set_ids("danube") == []
+        call_command('rebuild_search_index', stdout=StringIO())
+        assert search.search_set_ids("danube") == [self.rivers.id]
+
+
 class StudyModeTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="studymode", password="testpass")
@@ -366,3 +562,826 @@ class TagLimitTest(TestCase):
             'name': 'Tag Heavy Set',
             'tag_names': too_many_tags
         })
+
+
+@pytest.mark.django_db
+class TestSetCounters:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="counter", password="testpass")
+        self.set_obj = FlashCardSet.objects.create(name="Counted", author=self.user)
+        self.set_ct = ContentType.objects.get_for_model(FlashCardSet)
+
+    def test_counts_follow_creates_and_deletes(self):
+        cards = [FlashCard.objects.create(question=f"Q{i}", answer="A", set=self.set_obj) for i in range(3)]
+        Comment.objects.create(content="Hi", author=self.user, flashcard_set=self.set_obj)
+        favorite = UserFavorite.objects.create(user=self.user, content_type=self.set_ct, object_id=self.set_obj.id)
+        cards[0].question = "Edited"
+        cards[0].save()
+        cards[1].delete()
+
+        self.set_obj.refresh_from_db()
+        assert (self.set_obj.card_count, self.set_obj.comment_count, self.set_obj.favorite_count) == (2, 1, 1)
+
+        favorite.delete()
+        self.set_obj.refresh_from_db()
+        assert self.set_obj.favorite_count == 0
+
+    def test_counts_are_serialized_without_extra_queries(self, django_assert_num_queries):
+        FlashCard.objects.create(question="Q", answer="A", set=self.set_obj)
+        client = APIClient()
+        with django_assert_num_queries(1):
+            response = client.get(reverse('api-sets'), {'fields': 'id,card_count,comment_count,favorite_count'})
+        assert response.data['results'][0]['card_count'] == 1
+
+    def test_reconcile_command_repairs_drift(self):
+        FlashCard.objects.create(question="Q", answer="A", set=self.set_obj)
+        FlashCardSet.objects.filter(pk=self.set_obj.pk).update(card_count=7, favorite_count=3)
+
+        out = StringIO()
+        call_command('reconcile_set_counters', '--dry-run', stdout=out)
+        assert "1 sets have out-of-date counters" in out.getvalue()
+
+        call_command('reconcile_set_counters', stdout=StringIO())
+        self.set_obj.refresh_from_db()
+        assert (self.set_obj.card_count, self.set_obj.favorite_count) == (1, 0)
+
+    def test_decrement_never_goes_negative(self):
+        card = FlashCard.objects.create(question="Q", answer="A", set=self.set_obj)
+        FlashCardSet.objects.filter(pk=self.set_obj.pk).update(card_count=0)
+        card.delete()
+        self.set_obj.refresh_from_db()
+        assert self.set_obj.card_count == 0
+
+
+@pytest.mark.django_db
+class TestExport:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="exporter", password="testpass")
+        self.other = User.objects.create_user(username="other", password="testpass")
+        self.client = APIClient()
+        self.client.login(username="exporter", password="testpass")
+        self.set_ct = ContentType.objects.get_for_model(FlashCardSet)
+
+        self.set_obj = FlashCardSet.objects.create(name="Export Me", author=self.user)
+        self.set_obj.tags.add(Tag.objects.create(name="geo"))
+        FlashCard.objects.create(question="Q1", answer="A1", set=self.set_obj)
+        FlashCard.objects.create(question="Q2", answer="A2", difficulty="Hard", set=self.set_obj)
+        Rating.objects.create(user=self.other, score=4, content_type=self.set_ct, object_id=self.set_obj.id)
+        collection = Collection.objects.create(name="Mine", author=self.user)
+        collection.sets.add(self.set_obj)
+        FlashCardSet.objects.create(name="Not Mine", author=self.other)
+
+    def _records(self, response):
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def test_streams_own_sets_and_collections(self):
+        response = self.client.get(reverse('api-export'))
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/x-ndjson'
+        records = self._records(response)
+        assert [r['type'] for r in records] == ['set', 'collection']
+        exported = records[0]
+        assert exported['name'] == "Export Me"
+        assert exported['tags'] == ["geo"]
+        assert exported['rating'] == {'average': 4.0, 'count': 1, 'histogram': {'1': 0, '2': 0, '3': 0, '4': 1, '5': 0}}
+        assert [c['question'] for c in exported['cards']] == ["Q1", "Q2"]
+        assert records[1]['sets'] == [self.set_obj.id]
+
+    def test_only_admins_export_others(self):
+        assert self.client.get(reverse('api-export'), {'all': 'true'}).status_code == 403
+        User.objects.create_superuser(username="admin", password="testpass")
+        self.client.login(username="admin", password="testpass")
+        records = self._records(self.client.get(reverse('api-export'), {'all': 'true'}))
+        assert {r['name'] for r in records if r['type'] == 'set'} == {"Export Me", "Not Mine"}
+        assert self.client.get(reverse('api-export'), {'user': 'abc'}).status_code == 400
+        assert self.client.get(reverse('api-export'), {'user': '999999'}).status_code == 404
+
+    def test_queries_do_not_grow_with_sets(self):
+        for i in range(10):
+            extra = FlashCardSet.objects.create(name=f"Extra {i}", author=self.user)
+            FlashCard.objects.create(question="Q", answer="A", set=extra)
+        with CaptureQueriesContext(connection) as ctx:
+            records = list(export.iter_records(author=self.user, chunk_size=4))
+        assert len(records) == 12
+        # One streamed set query, 3 chunks x (tags, cards, summaries), then collections and their sets
+        assert len(ctx.captured_queries) == 1 + 3 * 3 + 2
+
+    def test_command_writes_ndjson(self, tmp_path):
+        target = tmp_path / "export.ndjson"
+        call_command('export_data', '--user', 'exporter', '--output', str(target), stderr=StringIO())
+        lines = target.read_text().splitlines()
+        assert [json.loads(line)['type'] for line in lines] == ['set', 'collection']
+
+
+@pytest.mark.django_db
+class TestImport:
+    def setup_method(self):
+        CreationLimit.objects.create(pk=1, daily_set_limit=5, daily_flashcard_limit=50, daily_collection_limit=5)
+        self.user = User.objects.create_user(username="importer", password="testpass")
+        self.client = APIClient()
+        self.client.login(username="importer", password="testpass")
+        Tag.objects.create(name="existing")
+
+    def _upload(self, name, content, **extra):
+        upload = SimpleUploadedFile(name, content.encode())
+        response = self.client.post(reverse('api-import'), {'file': upload, **extra}, format='multipart')
+        assert response.status_code == 200
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def test_csv_import_groups_rows_into_sets(self, django_capture_on_commit_callbacks):
+        content = (
+            "set,question,answer,difficulty,tags\n"
+            "Capitals,France?,Paris,Easy,\"geo, existing\"\n"
+            "Capitals,Spain?,Madrid,,\n"
+            ",Orphan?,No set,,\n"
+            "Verbs,Ser?,To be,Impossible,\n"
+            "Verbs,Estar?,To be,Medium,spanish\n"
+        )
+        with django_capture_on_commit_callbacks(execute=True):
+            events = self._upload("decks.csv", content)
+        errors = [e for e in events if e['type'] == 'error']
+        assert [e['row'] for e in errors] == [4, 5]
+        assert 'set' in errors[0]['errors'] and 'difficulty' in errors[1]['errors']
+        assert events[-1] == {
+            'type': 'summary', 'rows': 5, 'sets_created': 2, 'cards_created': 3, 'errors': 2, 'stopped': None,
+        }
+
+        capitals = FlashCardSet.objects.get(name="Capitals", author=self.user)
+        assert capitals.card_count == 2
+        assert sorted(capitals.tags.values_list('name', flat=True)) == ["existing", "geo"]
+        assert FlashCardSet.objects.get(name="Verbs").card_count == 1
+        assert search.search_set_ids("Madrid") == [] and search.search_set_ids("Spain") == [capitals.id]
+
+    def test_ndjson_roundtrips_the_export_format(self):
+        lines = [
+            {"type": "set", "name": "Deck", "tags": ["t1"], "cards": [{"question": "Q1", "answer": "A1"}, {"question": "Q2", "answer": "A2"}]},
+            {"type": "collection", "name": "Ignored"},
+            {"name": "", "cards": [{"question": "Q", "answer": "A"}, {"question": "Q", "answer": "A"}]},
+        ]
+        content = "\n".join(json.dumps(line) for line in lines) + "\n{broken\n"
+        events = self._upload("decks.ndjson", content)
+        assert [(e['row'], list(e['errors'])) for e in events if e['type'] == 'error'] == [(3, ['set']), (4, ['line'])]
+        assert events[-1]['cards_created'] == 2
+        assert FlashCardSet.objects.get(name="Deck").cards.count() == 2
+
+    def test_chunks_report_progress_and_stop_at_the_quota(self):
+        rows = "".join(f"Deck,Q{i},A{i},,\n" for i in range(60))
+        events = list(importer.run_import(importer.iter_csv_rows(StringIO("set,question,answer,difficulty,tags\n" + rows)), self.user, chunk_size=20))
+        progress = [e for e in events if e['type'] == 'progress']
+        assert [e['cards_created'] for e in progress] == [20, 40]
+        assert events[-1]['stopped'] == "You have reached the daily limit of 50 flashcards."
+        assert FlashCard.objects.count() == 40
+        assert FlashCardSet.objects.get(name="Deck").card_count == 40
+
+    def test_undecodable_line_ends_the_stream_with_a_summary(self):
+        content = "set,question,answer\nDeck,Q1,A1\nDeck,Q2,A2\n".encode() + b"Deck,Q\xff,A\nDeck,Q4,A4\n"
+        upload = SimpleUploadedFile("decks.csv", content)
+        response = self.client.post(reverse('api-import'), {'file': upload}, format='multipart')
+        events = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        assert events[-2]['type'] == 'error' and events[-2]['row'] == 4 and 'file' in events[-2]['errors']
+        assert events[-1] == {
+            'type': 'summary', 'rows': 2, 'sets_created': 1, 'cards_created': 2, 'errors': 1,
+            'stopped': "The file is not UTF-8 text.",
+        }
+        assert FlashCardSet.objects.get(name="Deck").card_count == 2
+
+    def test_command_imports_file(self, tmp_path):
+        source = tmp_path / "deck.csv"
+        source.write_text("set,question,answer\nCmd,Q,A\n")
+        out = StringIO()
+        call_command('import_data', str(source), '--user', 'importer', stdout=out, stderr=StringIO())
+        assert "Imported 1 sets and 1 cards" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestTagResolution:
+    def setup_method(self):
+        CreationLimit.objects.create(pk=1, daily_set_limit=5, daily_flashcard_limit=50, daily_collection_limit=5)
+        self.user = User.objects.create_user(username="tagger", password="testpass")
+        self.set_obj = FlashCardSet.objects.create(name="Tagged", author=self.user)
+
+    def test_names_are_normalized_and_deduplicated(self):
+        assert tags.parse_tag_names(" Spanish  Verbs, spanish verbs;Geo,, ") == ["spanish verbs", "geo"]
+
+    def test_resolve_uses_one_query_for_existing_tags(self, django_assert_num_queries):
+        Tag.objects.create(name="geo")
+        Tag.objects.create(name="french")
+        with django_assert_num_queries(1):
+            resolved = tags.resolve_tags(["Geo", "FRENCH"])
+        assert set(resolved) == {"geo", "french"}
+
+    def test_resolve_creates_missing_tags_in_bulk(self, django_assert_num_queries):
+        Tag.objects.create(name="geo")
+        with django_assert_num_queries(3):
+            resolved = tags.resolve_tags(["geo", "new1", "new2"])
+        assert all(tag.pk for tag in resolved.values())
+        assert Tag.objects.count() == 3
+
+    def test_resolve_survives_concurrent_creation(self, monkeypatch):
+        original = Tag.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            # Another request creates the same tag between our SELECT and INSERT
+            Tag.objects.create(name="raced")
+            return original(objs, **kwargs)
+
+        monkeypatch.setattr(Tag.objects, 'bulk_create', racing_bulk_create)
+        resolved = tags.resolve_tags(["raced"])
+        assert resolved["raced"].pk == Tag.objects.get(name="raced").pk
+
+    def test_unchanged_tags_cost_no_writes(self):
+        tags.set_tags(self.set_obj, ["geo", "french"])
+        with CaptureQueriesContext(connection) as ctx:
+            tags.set_tags(self.set_obj, ["French", "geo"])
+        assert not [q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+        tags.set_tags(self.set_obj, ["geo", "maps"])
+        assert sorted(self.set_obj.tags.values_list('name', flat=True)) == ["geo", "maps"]
+
+    def test_api_create_normalizes_tags(self):
+        client = APIClient()
+        client.login(username="tagger", password="testpass")
+        response = client.post(reverse('api-sets'), {"name": "New", "tag_names": "Geo, geo ,Capital  Cities"}, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        created = FlashCardSet.objects.get(pk=response.data['id'])
+        assert sorted(created.tags.values_list('name', flat=True)) == ["capital cities", "geo"]
+
+    def test_migration_merges_case_variants(self):
+        import importlib
+        from django.apps import apps
+        migration = importlib.import_module('myapp.migrations.0022_normalize_tag_names')
+        Tag.objects.bulk_create([Tag(name="Geo"), Tag(name="geo"), Tag(name="Big  Cats")])
+        other = FlashCardSet.objects.create(name="Other", author=self.user)
+        self.set_obj.tags.add(Tag.objects.get(name="Geo"))
+        other.tags.add(Tag.objects.get(name="geo"))
+
+        migration.normalize_tag_names(apps, connection.schema_editor())
+
+        assert sorted(Tag.objects.values_list('name', flat=True)) == ["big cats", "geo"]
+        assert Tag.objects.get(name="geo").sets.count() == 2
+
+
+@pytest.mark.django_db
+class TestTagAutocomplete:
+    def setup_method(self):
+        tags.tag_index.invalidate()
+        self.user = User.objects.create_user(username="suggester", password="testpass")
+        self.sets = [FlashCardSet.objects.create(name=f"S{i}", author=self.user) for i in range(3)]
+        for flashcard_set in self.sets:
+            tags.set_tags(flashcard_set, ["geo"])
+        tags.set_tags(self.sets[0], ["geo", "geometry", "world geography"])
+        Tag.objects.create(name="maths")
+
+    def teardown_method(self):
+        tags.tag_index.invalidate()
+
+    def test_prefix_matches_any_word_ranked_by_use(self):
+        response = APIClient().get(reverse('api-tag-autocomplete'), {'q': 'Geo'})
+        assert response.status_code == 200
+        assert response.data['results'] == [
+            {'name': "geo", 'set_count': 3},
+            {'name': "geometry", 'set_count': 1},
+            {'name': "world geography", 'set_count': 1},
+        ]
+        assert [t.name for t in tags.tag_index.search("geo", limit=1)] == ["geo"]
+        assert tags.tag_index.search("zzz") == []
+
+    def test_changes_apply_incrementally(self, django_assert_num_queries, django_capture_on_commit_callbacks):
+        tags.tag_index.search("g")
+        with django_capture_on_commit_callbacks(execute=True):
+            tags.set_tags(self.sets[1], ["geology"])
+            self.sets[2].delete()
+            Tag.objects.filter(name="maths").get().delete()
+        with django_assert_num_queries(0):
+            assert tags.tag_index.search("geo") == [("geo", 1), ("geology", 1), ("geometry", 1), ("world geography", 1)]
+            assert tags.tag_index.search("math") == []
+            assert "geology" in [tag.name for tag in tags.tag_index.search("g")]
+
+        renamed = Tag.objects.get(name="geometry")
+        renamed.name = "trigonometry"
+        with django_capture_on_commit_callbacks(execute=True):
+            renamed.save()
+            self.sets[0].tags.clear()
+        with django_assert_num_queries(0):
+            assert tags.tag_index.search("trig") == [("trigonometry", 0)]
+
+    def test_rolled_back_changes_are_not_applied(self, django_capture_on_commit_callbacks):
+        tags.tag_index.search("g")
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            with pytest.raises(RuntimeError), transaction.atomic():
+                tags.set_tags(self.sets[1], ["geology"])
+                raise RuntimeError
+        assert callbacks == []
+        assert tags.tag_index.search("geo")[0] == ("geo", 3)
+        assert tags.tag_index.search("geol") == []
+
+    def test_other_processes_apply_the_changes_without_reloading(
+        self, monkeypatch, django_assert_num_queries, django_capture_on_commit_callbacks
+    ):
+        other = tags.TagPrefixIndex()
+        monkeypatch.setattr(other, 'check_interval', 0)
+        other.search("geo")
+        with django_capture_on_commit_callbacks(execute=True):
+            tags.set_tags(self.sets[1], ["geology"])
+        with django_assert_num_queries(0):
+            assert other.search("geo") == [("geo", 2), ("geology", 1), ("geometry", 1), ("world geography", 1)]
+
+        # Entries that have left the cache force a reload instead
+        with django_capture_on_commit_callbacks(execute=True):
+            tags.set_tags(self.sets[2], ["geodesy"])
+        cache.delete(f"{other.log_key}:{cache.get(other.log_key)}")
+        with django_assert_num_queries(1):
+            assert other.search("geo")[0] == ("geo", 1)
+
+    def test_reloads_when_another_process_changed_tags(self, monkeypatch, django_assert_num_queries):
+        tags.tag_index.search("geo")
+        Tag.objects.bulk_create([Tag(name="geodesy")])
+        cache.set(tags.tag_index.version_key, "changed-elsewhere", None)
+        monkeypatch.setattr(tags.tag_index, 'check_interval', 0)
+        with django_assert_num_queries(1):
+            assert ("geodesy", 0) in tags.tag_index.search("geod")
+
+    def test_prefix_queries_are_fast_at_100k_tags(self):
+        index = tags.TagPrefixIndex()
+        rng = random.Random(1)
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        index.build(
+            (i, " ".join("".join(rng.choices(letters, k=rng.randint(3, 9))) for _ in range(rng.randint(1, 2))), rng.randint(0, 500))
+            for i in range(100_000)
+        )
+        index._loaded_at = index._checked_at = time.monotonic()
+        index._version = cache.get(index.version_key)
+        for prefix in ("a", "s", "qu", "tre", "mno"):
+            best = min(timeit.repeat(lambda: index.search(prefix), number=1, repeat=5))
+            assert best < 0.005, (prefix, best)
+
+
+@pytest.mark.django_db
+class TestListPageQueries:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="lister", password="testpass")
+        self.client = Client()
+        self.client.force_login(self.user)
+        set_ct = ContentType.objects.get_for_model(FlashCardSet)
+        self.sets = []
+        for i in range(5):
+            flashcard_set = FlashCardSet.objects.create(name=f"Listed {i}", author=self.user)
+            tags.set_tags(flashcard_set, [f"tag {i}", "shared"])
+            UserFavorite.objects.create(user=self.user, content_type=set_ct, object_id=flashcard_set.id)
+            self.sets.append(flashcard_set)
+        for i in range(3):
+            collection = Collection.objects.create(name=f"Collection {i}", author=self.user)
+            collection.sets.add(*self.sets[i:])
+
+    @pytest.mark.parametrize('url_name', ['home', 'flashcard-set-list', 'collection-list', 'user-favourites'])
+    def test_templates_do_not_lazy_load(self, url_name, no_template_queries):
+        response = self.client.get(reverse(url_name))
+        assert response.status_code == 200
+        assert "Listed 4" in response.content.decode()
+
+    def test_query_count_does_not_grow_with_rows(self):
+        counts = {}
+        for url_name in ['flashcard-set-list', 'collection-list', 'user-favourites']:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse(url_name))
+            counts[url_name] = len(queries)
+
+        for i in range(5, 10):
+            flashcard_set = FlashCardSet.objects.create(name=f"Listed {i}", author=self.user)
+            tags.set_tags(flashcard_set, [f"tag {i}"])
+            UserFavorite.objects.create(user=self.user, content_type=ContentType.objects.get_for_model(FlashCardSet), object_id=flashcard_set.id)
+            Collection.objects.create(name=f"Collection {i}", author=self.user).sets.add(flashcard_set)
+        for url_name, count in counts.items():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse(url_name))
+            assert len(queries) == count, url_name
+
+    def test_search_results_do_not_lazy_load(self, no_template_queries):
+        other = User.objects.create_user(username="other", password="testpass")
+        flashcard_set = FlashCardSet.objects.create(name="Listed by other", author=other)
+        tags.set_tags(flashcard_set, ["elsewhere"])
+        Collection.objects.create(name="Listed collection", author=other)
+        search.rebuild_index()
+        response = self.client.get(reverse('search'), {'q': 'Listed'})
+        assert response.status_code == 200
+        content = response.content.decode()
+        assert "Listed 4" in content and "elsewhere" in content and "By other" in content
+
+    def test_guard_reports_lazy_loads(self, no_template_queries, monkeypatch):
+        monkeypatch.setattr('myapp.views.FlashCardSetListView.get_queryset', lambda view: FlashCardSet.objects.filter(author=view.request.user))
+        with pytest.raises(AssertionError, match="sets/list.html"):
+            self.client.get(reverse('flashcard-set-list'))
+
+
+@pytest.mark.django_db
+class TestStudyEngine:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="learner", password="testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.set_obj = FlashCardSet.objects.create(name="Verbs", author=self.user)
+        self.cards = [FlashCard.objects.create(question=f"Q{i}", answer=f"A{i}", set=self.set_obj) for i in range(30)]
+        self.next_url = reverse('api-study-next')
+        self.review_url = reverse('api-study-reviews')
+
+    def test_sm2_intervals(self):
+        state = study.ReviewState(0.0, 2.5, 0, 0)
+        intervals = []
+        for _ in range(3):
+            state, delay = study.next_state(state, ReviewGrade.GOOD)
+            intervals.append(delay.days)
+        assert intervals == [1, 6, 15]
+
+        state, delay = study.next_state(state, ReviewGrade.AGAIN)
+        assert delay == study.RELEARN_DELAY
+        assert (state.repetitions, state.lapses, round(state.ease, 2)) == (0, 1, 2.18)
+        state, _ = study.next_state(state._replace(ease=1.35), ReviewGrade.HARD)
+        assert state.ease == study.MIN_EASE
+
+    def test_next_returns_one_batch_in_due_order(self):
+        response = self.client.get(self.next_url, {'set': self.set_obj.id, 'limit': 5})
+        assert response.status_code == 200
+        assert [item['card']['id'] for item in response.data['results']] == [card.id for card in self.cards[:5]]
+        assert response.data['next_due_at'] is None
+        assert CardSchedule.objects.filter(user=self.user).count() == 30
+
+    def test_enrolls_again_only_after_cards_are_added(self):
+        self.client.get(self.next_url, {'set': self.set_obj.id})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.next_url, {'set': self.set_obj.id})
+        assert not [query for query in queries if 'NOT EXISTS' in query['sql'] or 'INSERT' in query['sql']]
+
+        FlashCard.objects.create(question="New", answer="A", set=self.set_obj)
+        response = self.client.get(self.next_url, {'set': self.set_obj.id, 'limit': 100})
+        assert len(response.data['results']) == 31
+
+    def test_review_reschedules_card_and_appends_log(self):
+        study.enroll(self.user, self.set_obj)
+        response = self.client.post(self.review_url, {'card': self.cards[0].id, 'grade': ReviewGrade.GOOD}, format='json')
+        assert response.status_code == 201
+        assert response.data['interval'] == 1.0 and response.data['repetitions'] == 1
+
+        due = self.client.get(self.next_url, {'set': self.set_obj.id, 'limit': 100}).data
+        assert self.cards[0].id not in [item['card']['id'] for item in due['results']]
+        assert len(due['results']) == 29
+        assert due['next_due_at'] is not None
+        assert not ReviewEvent.objects.exists()
+        review_events.flush()
+        log = ReviewEvent.objects.get()
+        assert (log.user, log.card, log.grade, log.interval, log.correct) == (self.user, self.cards[0], ReviewGrade.GOOD, 1.0, True)
+
+    def test_review_rejects_unknown_grade(self):
+        response = self.client.post(self.review_url, {'card': self.cards[0].id, 'grade': 7}, format='json')
+        assert response.status_code == 400
+        assert not len(review_events)
+
+    def test_due_cards_are_read_from_the_index(self):
+        study.enroll(self.user, self.set_obj)
+        later = timezone.now() + timedelta(days=1)
+        for schedules in (CardSchedule.objects.filter(user=self.user), CardSchedule.objects.filter(user=self.user, flashcard_set=self.set_obj)):
+            plan = schedules.filter(due_at__lte=later).order_by('due_at', 'id')[:20].explain()
+            assert "schedule_user_" in plan and "SCAN" not in plan.replace("SCAN CONSTANT", ""), plan
+        assert len(study.due_cards(self.user, self.set_obj, limit=20, now=later)) == 20
+
+    def test_study_page_starts_with_due_cards(self):
+        self.client.force_login(self.user)
+        study.record_review(self.user, self.cards[0], ReviewGrade.EASY)
+        response = self.client.get(reverse('study-mode', kwargs={'pk': self.set_obj.pk}))
+        cards = json.loads(response.context['flashcards_json'])
+        assert len(cards) == study.BATCH_SIZE
+        assert cards[0]['id'] == self.cards[1].id
+
+
+@pytest.mark.django_db
+class TestRescheduling:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="rescheduler", password="testpass")
+        self.set_obj = FlashCardSet.objects.create(name="Deck", author=self.user)
+        self.now = timezone.now()
+        self.states = [(10.0, 2.5), (400.0, 1.2), (0.0, 2.0), (3.0, 2.0)]
+        for i, (interval, ease) in enumerate(self.states):
+            card = FlashCard.objects.create(question=f"Q{i}", answer="A", set=self.set_obj)
+            CardSchedule.objects.create(
+                user=self.user, card=card, flashcard_set=self.set_obj, interval=interval, ease=ease,
+                repetitions=3, last_reviewed_at=self.now, due_at=self.now + timedelta(days=interval or 0.01),
+            )
+        # Never reviewed
+        card = FlashCard.objects.create(question="New", answer="A", set=self.set_obj)
+        CardSchedule.objects.create(user=self.user, card=card, flashcard_set=self.set_obj, due_at=self.now)
+
+    def schedules(self):
+        return list(CardSchedule.objects.order_by('id').values_list('interval', 'ease', 'due_at'))
+
+    def test_reschedule_recomputes_reviewed_cards_in_chunks(self):
+        before = self.schedules()
+        assert rescheduling.reschedule(CardSchedule.objects.all(), interval_modifier=0.5, max_interval=100, chunk_size=2) == 3
+        after = self.schedules()
+
+        assert [(interval, ease) for interval, ease, _ in after[:2]] == [(5.0, 2.5), (100.0, study.MIN_EASE)]
+        assert abs(after[0][2] - (self.now + timedelta(days=5))) < timedelta(milliseconds=1)
+        assert after[2] == before[2] and after[4] == before[4]  # relearning and new cards keep their due dates
+        assert after[3][0] == 1.5
+
+    def test_reset_endpoint_starts_the_set_over(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse('api-study-reset'), {'set': self.set_obj.id}, format='json')
+        assert response.data == {'reset': 5}
+        assert set(CardSchedule.objects.values_list('interval', 'repetitions', 'last_reviewed_at')) == {(0.0, 0, None)}
+        assert client.post(reverse('api-study-reset'), {'set': 'deck'}, format='json').status_code == 400
+
+    def test_commands_reschedule_and_benchmark(self):
+        out = StringIO()
+        call_command('reschedule_cards', interval_modifier=2, set=self.set_obj.id, stdout=out)
+        assert "Rescheduled 3 cards." in out.getvalue()
+        assert self.schedules()[0][0] == 20.0
+
+        out = StringIO()
+        call_command('benchmark_rescheduling', cards=50, stdout=out, stderr=out)
+        assert "faster" in out.getvalue() and "different" not in out.getvalue()
+        assert not User.objects.filter(username='bench-rescheduling').exists()
+
+
+@pytest.mark.django_db
+class TestStudySessions:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="sessions", password="testpass")
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.set_obj = FlashCardSet.objects.create(name="Big deck", author=self.user)
+        self.cards = [FlashCard.objects.create(question=f"Q{i}", answer=f"A{i}", set=self.set_obj) for i in range(45)]
+        self.card_ids = [card.id for card in self.cards]
+
+    def start(self, shuffled=False):
+        response = self.client.post(reverse('api-study-sessions'), {'set': self.set_obj.id, 'shuffled': shuffled}, format='json')
+        assert response.status_code == 201
+        return response.data
+
+    def all_card_ids(self, session):
+        return [card_id for card_id in self.cards_by_position(session) if card_id is not None]
+
+    def cards_by_position(self, session):
+        url = reverse('api-study-session', kwargs={'pk': session['id']})
+        ids, start = {}, 0
+        while start is not None:
+            window = self.client.get(url, {'start': start}).data
+            ids.update((card['position'], card['id']) for card in window['cards'])
+            total, start = window['total'], window['next']
+        return [ids.get(position) for position in range(total)]
+
+    def test_ordered_session_is_served_in_windows(self):
+        session = self.start()
+        assert (session['total'], session['start'], session['next']) == (45, 0, study.WINDOW_SIZE)
+        assert [card['id'] for card in session['cards']] == self.card_ids[:study.WINDOW_SIZE]
+        assert self.all_card_ids(session) == self.card_ids
+
+    def test_shuffled_session_covers_every_card_once(self):
+        session = self.start(shuffled=True)
+        ids = self.all_card_ids(session)
+        assert sorted(ids) == self.card_ids and ids != self.card_ids
+
+    def test_shuffled_order_is_a_seeded_permutation(self):
+        for size in (1, 2, 3, 45, 1000):
+            order = [study.shuffled_ordinal(position, size, seed=7) for position in range(size)]
+            assert sorted(order) == list(range(size))
+        assert [study.shuffled_ordinal(p, 45, 7) for p in range(45)] != [study.shuffled_ordinal(p, 45, 8) for p in range(45)]
+
+    def test_shuffled_window_is_one_indexed_query(self):
+        session = StudySession.objects.select_related('flashcard_set').get(pk=self.start(shuffled=True)['id'])
+        with CaptureQueriesContext(connection) as queries:
+            window = study.session_window(session, 20)
+        assert len(queries) == 1 and [position for position, _ in window] == list(range(20, 40))
+        plan = FlashCard.objects.filter(
+            set_id=self.set_obj.id, ordinal__in=[card.ordinal for _, card in window]
+        ).explain()
+        assert "card_set_ordinal_idx" in plan, plan
+
+    def test_ordered_window_is_one_indexed_range(self):
+        session = StudySession.objects.select_related('flashcard_set').get(pk=self.start()['id'])
+        with CaptureQueriesContext(connection) as queries:
+            window = study.session_window(session, 40)
+        assert [(position, card.id) for position, card in window] == list(enumerate(self.card_ids[40:], 40))
+        assert len(queries) == 1 and "OFFSET" not in queries[0]['sql']
+        plan = FlashCard.objects.filter(set_id=self.set_obj.id, ordinal__gte=40, ordinal__lt=60).explain()
+        assert "card_set_ordinal_idx" in plan, plan
+
+    def test_deleting_a_card_keeps_ordinals_dense_and_in_creation_order(self):
+        session = self.start(shuffled=True)
+        assert not session['deck_changed']
+        self.cards[3].delete()
+        remaining = self.card_ids[:3] + self.card_ids[4:]
+        ordered = FlashCard.objects.filter(set=self.set_obj).order_by('ordinal').values_list('id', 'ordinal')
+        assert list(ordered) == [(card_id, ordinal) for ordinal, card_id in enumerate(remaining)]
+
+        url = reverse('api-study-session', kwargs={'pk': session['id']})
+        assert self.client.get(url).data['deck_changed']
+        after = self.cards_by_position(session)
+        # Every remaining card once; the set's old last ordinal is now empty
+        assert sorted(card_id for card_id in after if card_id is not None) == remaining
+        assert after.count(None) == 1
+        assert self.all_card_ids(self.start()) == remaining
+
+    def test_batch_delete_renumbers_the_set_once(self):
+        # Ordinals need not follow ids, e.g. after reconcile_set_counters
+        for ordinal, card_id in enumerate(reversed(self.card_ids)):
+            FlashCard.objects.filter(pk=card_id).update(ordinal=ordinal)
+        doomed = self.card_ids[5:40:3]
+        FlashCard.objects.filter(pk__in=doomed).delete()
+        remaining = [card_id for card_id in reversed(self.card_ids) if card_id not in doomed]
+        ordered = FlashCard.objects.filter(set=self.set_obj).order_by('ordinal').values_list('id', 'ordinal')
+        assert list(ordered) == [(card_id, ordinal) for ordinal, card_id in enumerate(remaining)]
+
+    def test_cards_added_later_follow_the_shuffled_deck(self):
+        session = self.start(shuffled=True)
+        before = self.cards_by_position(session)
+        added = [FlashCard.objects.create(question=f"New {i}", answer="A", set=self.set_obj).id for i in range(3)]
+        after = self.cards_by_position(session)
+        assert after == before + added
+        url = reverse('api-study-session', kwargs={'pk': session['id']})
+        assert self.client.get(url).data['deck_changed']
+
+    def test_editing_a_card_does_not_change_the_deck(self):
+        session = self.start(shuffled=True)
+        self.cards[0].question = "Fixed typo"
+        self.cards[0].save()
+        url = reverse('api-study-session', kwargs={'pk': session['id']})
+        assert not self.client.get(url).data['deck_changed']
+
+    def test_shared_ordinal_is_repaired_and_logged(self, caplog):
+        session = self.start()
+        FlashCard.objects.filter(pk=self.card_ids[1]).update(ordinal=0)
+        with caplog.at_level(logging.WARNING, logger='myapp.study'):
+            assert self.all_card_ids(session) == self.card_ids
+        assert "share ordinal 0" in caplog.text
+        ordinals = FlashCard.objects.filter(set=self.set_obj).order_by('id').values_list('ordinal', flat=True)
+        assert list(ordinals) == list(range(len(self.card_ids)))
+
+    def test_new_cards_are_numbered_after_the_last(self):
+        created = self.client.post(
+            reverse('api-set-cards-bulk', kwargs={'pk': self.set_obj.id}),
+            [{'question': 'Bulk', 'answer': 'A'}] * 2, format='json',
+        )
+        assert created.status_code == status.HTTP_201_CREATED, created.data
+        ordinals = FlashCard.objects.filter(set=self.set_obj).order_by('id').values_list('ordinal', flat=True)
+        assert list(ordinals) == list(range(47))
+
+    def test_reconcile_renumbers_cards(self):
+        FlashCard.objects.filter(pk__in=self.card_ids[:2]).update(ordinal=100)
+        out = StringIO()
+        call_command('reconcile_set_counters', stdout=out)
+        assert "the ordinals of 45 cards" in out.getvalue()
+        ordinals = FlashCard.objects.filter(set=self.set_obj).order_by('ordinal').values_list('id', flat=True)
+        assert list(ordinals) == self.card_ids[2:] + self.card_ids[:2]
+
+    def test_position_is_saved_and_resumed(self):
+        session = self.start(shuffled=True)
+        url = reverse('api-study-session', kwargs={'pk': session['id']})
+        assert self.client.patch(url, {'position': 25}, format='json').data['position'] == 25
+        assert self.client.patch(url, {'position': 45}, format='json').status_code == 400
+
+        resumed = self.client.get(url).data
+        assert resumed['start'] == 20 and resumed['cards'][5]['id'] == self.all_card_ids(session)[25]
+        page = self.client.get(reverse('flashcard-set-detail', kwargs={'pk': self.set_obj.id}))
+        assert page.context['study_window']['id'] == session['id']
+        assert page.context['study_window']['start'] == 20
+
+    def test_sessions_are_private(self):
+        session = self.start()
+        other = APIClient()
+        other.force_login(User.objects.create_user(username="other", password="testpass"))
+        assert other.get(reverse('api-study-session', kwargs={'pk': session['id']})).status_code == 404
+
+    def test_set_page_embeds_one_window(self):
+        bulk_create_flashcards(self.set_obj, [{'question': f"More {i}", 'answer': "A"} for i in range(500)])
+        response = self.client.get(reverse('flashcard-set-detail', kwargs={'pk': self.set_obj.id}))
+        window = response.context['study_window']
+        assert len(window['cards']) == study.WINDOW_SIZE
+        assert "More 1" not in response.content.decode()
+        # Viewing the set starts no session until the user moves through it
+        assert window['id'] is None and window['total'] == 545
+        assert not StudySession.objects.exists()
+
+
+
+@pytest.mark.django_db
+class TestReviewEvents:
+    def setup_method(self):
+        self.user = User.objects.create_user(username="answers", password="testpass")
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.set_obj = FlashCardSet.objects.create(name="Deck", author=self.user)
+        self.cards = [FlashCard.objects.create(question=f"Q{i}", answer=f"A{i}", set=self.set_obj) for i in range(3)]
+
+    def test_answers_are_queued_until_flushed(self):
+        url = reverse('api-study-reviews')
+        self.client.post(url, {'card': self.cards[0].id, 'grade': ReviewGrade.GOOD, 'latency_ms': 1500}, format='json')
+        self.client.post(url, {'card': self.cards[1].id, 'grade': ReviewGrade.AGAIN}, format='json')
+        self.client.post(url, {'card': self.cards[2].id, 'grade': ReviewGrade.HARD, 'correct': False}, format='json')
+        assert len(review_events) == 3 and not ReviewEvent.objects.exists()
+
+        assert review_events.flush() == 3
+        rows = ReviewEvent.objects.order_by('id').values_list('card_id', 'grade', 'correct', 'latency_ms')
+        assert list(rows) == [
+            (self.cards[0].id, ReviewGrade.GOOD, True, 1500),
+            (self.cards[1].id, ReviewGrade.AGAIN, False, None),
+            (self.cards[2].id, ReviewGrade.HARD, False, None),
+        ]
+
+    def test_negative_latency_is_rejected(self):
+        response = self.client.post(
+            reverse('api-study-reviews'), {'card': self.cards[0].id, 'grade': ReviewGrade.GOOD, 'latency_ms': -1}, format='json'
+        )
+        assert response.status_code == 400 and not len(review_events)
+
+    def test_full_buffer_is_written_in_one_query(self, settings):
+        settings.REVIEW_EVENTS = {**settings.REVIEW_EVENTS, 'FLUSH_SIZE': 3}
+        with CaptureQueriesContext(connection) as queries:
+            review_events.record(self.user.id, self.cards[0].id, True, 900)
+            review_events.record(self.user.id, self.cards[1].id, True, 800)
+        assert len(queries) == 0
+        with CaptureQueriesContext(connection) as queries:
+            review_events.record(self.user.id, self.cards[2].id, False, 700)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        assert len(inserts) == 1 and ReviewEvent.objects.count() == 3 and not len(review_events)
+
+    def test_old_queue_is_written_on_the_next_answer(self, settings, monkeypatch):
+        settings.REVIEW_EVENTS = {**settings.REVIEW_EVENTS, 'FLUSH_INTERVAL_MS': 1000}
+        clock = [100.0]
+        monkeypatch.setattr(reviewevents.time, 'monotonic', lambda: clock[0])
+        review_events.record(self.user.id, self.cards[0].id, True)
+        clock[0] += 0.5
+        review_events.record(self.user.id, self.cards[1].id, True)
+        assert not ReviewEvent.objects.exists()
+        clock[0] += 0.5
+        review_events.record(self.user.id, self.cards[2].id, True)
+        assert ReviewEvent.objects.count() == 3
+
+    def test_failed_write_keeps_the_events(self, monkeypatch):
+        review_events.record(self.user.id, self.cards[0].id, True)
+
+        def fail(*args, **kwargs):
+            raise DatabaseError("database is locked")
+
+        monkeypatch.setattr(ReviewEvent.objects, 'bulk_create', fail)
+        assert review_events.flush() == 0 and len(review_events) == 1
+        monkeypatch.undo()
+        assert review_events.flush() == 1 and ReviewEvent.objects.count() == 1
+
+    def test_compaction_rolls_old_events_into_stats(self):
+        now = timezone.now()
+        old = now - timedelta(days=40)
+        CardStat.objects.create(
+            user=self.user, card=self.cards[0], answers=2, correct=1, timed_answers=2, total_latency_ms=3000,
+            first_answered_at=old - timedelta(days=10), last_answered_at=old - timedelta(days=10),
+        )
+        events = [
+            ReviewEvent(user=self.user, card=self.cards[0], correct=True, latency_ms=1000, answered_at=old),
+            ReviewEvent(user=self.user, card=self.cards[1], correct=False, latency_ms=None, answered_at=old),
+            ReviewEvent(user=self.user, card=self.cards[0], correct=False, latency_ms=2000, answered_at=old + timedelta(hours=1)),
+            ReviewEvent(user=self.user, card=self.cards[0], correct=True, latency_ms=500, answered_at=now),
+        ]
+        ReviewEvent.objects.bulk_create(events)
+
+        assert reviewevents.compact(now - timedelta(days=30), chunk_size=2) == (3, 3)
+        assert list(ReviewEvent.objects.values_list('answered_at', flat=True)) == [now]
+        first = CardStat.objects.get(user=self.user, card=self.cards[0])
+        assert (first.answers, first.correct, first.timed_answers, first.total_latency_ms) == (4, 2, 4, 6000)
+        assert first.last_answered_at == old + timedelta(hours=1) and first.mean_latency_ms == 1500
+        second = CardStat.objects.get(user=self.user, card=self.cards[1])
+        assert (second.answers, second.accuracy, second.mean_latency_ms) == (1, 0, None)
+
+    def test_compact_command(self):
+        ReviewEvent.objects.create(
+            user=self.user, card=self.cards[0], correct=True, answered_at=timezone.now() - timedelta(days=31)
+        )
+        out = StringIO()
+        call_command('compact_review_events', stdout=out)
+        assert "Compacted 1 review events into 1 card stats" in out.getvalue()
+        assert not ReviewEvent.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_review_events_are_flushed_in_the_background(settings):
+    settings.REVIEW_EVENTS = {**settings.REVIEW_EVENTS, 'BACKGROUND_FLUSH': True, 'FLUSH_INTERVAL_MS': 50}
+    user = User.objects.create_user(username="background", password="testpass")
+    card = FlashCard.objects.create(question="Q", answer="A", set=FlashCardSet.objects.create(name="Deck", author=user))
+    review_events.record(user.id, card.id, True)
+    deadline = time.monotonic() + 5
+    while not ReviewEvent.objects.exists() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert ReviewEvent.objects.count() == 1 and not len(review_events)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_review_events_of_deleted_cards_do_not_block_the_buffer(settings):
+    settings.REVIEW_EVENTS = {**settings.REVIEW_EVENTS, 'FLUSH_SIZE': 5}
+    user = User.objects.create_user(username="deleted-card", password="testpass")
+    flashcard_set = FlashCardSet.objects.create(name="Deck", author=user)
+    doomed, kept = (FlashCard.objects.create(question=f"Q{i}", answer="A", set=flashcard_set) for i in range(2))
+    review_events.record(user.id, doomed.id, True)
+    doomed.delete()
+    for _ in range(10):
+        review_events.record(user.id, kept.id, True)
+    review_events.flush()
+    assert ReviewEvent.objects.filter(card=kept).count() == 10
+    assert not ReviewEvent.objects.filter(card_id=doomed.id).exists() and not len(review_events)
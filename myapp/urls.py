@@ -35,6 +35,10 @@ from .views import (
 
     # Search and Browse
     SearchView,
+    SearchAPIView,
+    TagAutocompleteAPIView,
+    ExportAPIView,
+    ImportAPIView,
 
     # Additional Web View
     FlashCardAddMoreView,
@@ -42,6 +46,7 @@ from .views import (
     # API Views
     FlashCardSetListCreateAPIView,
     FlashCardSetRetrieveUpdateDestroyAPIView,
+    FlashCardBulkCreateAPIView,
     FlashCardListCreateAPIView,
     FlashCardRetrieveUpdateDestroyAPIView,
     CommentListCreateAPIView,
@@ -57,6 +62,11 @@ from .views import (
     CommentUpdateView,
     ToggleFavoriteView,
     StudyModeView,
+    StudyNextAPIView,
+    StudyReviewAPIView,
+    StudyResetAPIView,
+    StudySessionCreateAPIView,
+    StudySessionAPIView,
 
     # Rating
     RateItemView
@@ -118,6 +128,7 @@ urlpatterns = [
 
     # API - Flashcards in a Set
     path('api/sets/<int:pk>/cards/', FlashCardListCreateAPIView.as_view(), name='api-set-cards'),
+    path('api/sets/<int:pk>/cards/bulk/', FlashCardBulkCreateAPIView.as_view(), name='api-set-cards-bulk'),
     path('api/sets/<int:pk>/cards/<int:cardId>/', FlashCardRetrieveUpdateDestroyAPIView.as_view(), name='api-card-detail'),
 
     # API - Comments on a Set
@@ -130,6 +141,21 @@ urlpatterns = [
     path('api/users/<int:userId>/collections/', UserCollectionListAPIView.as_view(), name='api-user-collections'),
     path('api/users/<int:userId>/collections/<int:collectionId>/', UserCollectionRetrieveUpdateDestroyAPIView.as_view(), name='api-user-collection-detail'),
 
+    # API - Study
+    path('api/study/next/', StudyNextAPIView.as_view(), name='api-study-next'),
+    path('api/study/reviews/', StudyReviewAPIView.as_view(), name='api-study-reviews'),
+    path('api/study/reset/', StudyResetAPIView.as_view(), name='api-study-reset'),
+    path('api/study/sessions/', StudySessionCreateAPIView.as_view(), name='api-study-sessions'),
+    path('api/study/sessions/<uuid:pk>/', StudySessionAPIView.as_view(), name='api-study-session'),
+
+    # API - Search
+    path('api/search/', SearchAPIView.as_view(), name='api-search'),
+    path('api/tags/autocomplete/', TagAutocompleteAPIView.as_view(), name='api-tag-autocomplete'),
+
+    # API - Export and import
+    path('api/export/', ExportAPIView.as_view(), name='api-export'),
+    path('api/import/', ImportAPIView.as_view(), name='api-import'),
+
     # API - Collections
     path('api/collections/', CollectionListCreateAPIView.as_view(), name='api-collections'),
     path('api/collections/random/', RandomCollectionRedirectView.as_view(), name='api-collections-random'),
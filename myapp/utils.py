@@ -1,18 +1,283 @@
 # myapp/utils.py
+import hashlib
+import random
+
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Avg
-from .models import Rating
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Window
+from django.db.models.functions import Greatest, RowNumber
+from django.utils import timezone
+from . import search
+from .models import Comment, FlashCard, FlashCardSet, Rating, RatingSummary, UserFavorite
 
 def get_average_rating(obj):
-    
-    content_type = ContentType.objects.get_for_model(obj)
-    
-    
-    avg = Rating.objects.filter(
-        content_type=content_type,
-        object_id=obj.id
-    ).aggregate(Avg('score'))['score__avg']
-
-    if avg is None:
-        avg = 0.0
-    return round(avg, 1)
+
+    return get_average_ratings([obj])[obj.id]
+
+
+def get_average_ratings(objs):
+    """
+    Average rating of several objects of the same model, read from their
+    RatingSummary rows in one query.
+    Returns a dict keyed by object id; unrated objects map to 0.0.
+    """
+    summaries = get_rating_summaries(objs, fields=('score_sum', 'score_count'))
+    return {object_id: summary.average for object_id, summary in summaries.items()}
+
+
+def get_rating_summaries(objs, fields=None):
+    """
+    RatingSummary of several objects of the same model in one query, keyed by
+    object id. Unrated objects get an empty unsaved summary.
+    Pass `fields` to load only some of the summary columns.
+    """
+    objs = list(objs)
+    if not objs:
+        return {}
+
+    content_type = ContentType.objects.get_for_model(objs[0])
+    object_ids = [obj.id for obj in objs]
+
+    queryset = RatingSummary.objects.filter(content_type=content_type, object_id__in=object_ids)
+    if fields:
+        queryset = queryset.only('object_id', *fields)
+
+    summaries = {
+        object_id: RatingSummary(content_type=content_type, object_id=object_id)
+        for object_id in object_ids
+    }
+    for summary in queryset:
+        summaries[summary.object_id] = summary
+    return summaries
+
+
+def get_rating_summary(content_type, object_id):
+    """The RatingSummary for one object, or an empty unsaved one if it was never rated."""
+    summary = RatingSummary.objects.filter(content_type=content_type, object_id=object_id).first()
+    return summary or RatingSummary(content_type=content_type, object_id=object_id)
+
+
+def apply_rating_change(content_type_id, object_id, old_score=None, new_score=None):
+    """
+    Adjust the summary row for one object after a rating is created
+    (old_score=None), changed, or deleted (new_score=None).
+    Uses F() expressions so concurrent ratings cannot lose updates.
+    """
+    if old_score == new_score:
+        return
+
+    changes = {}
+    score_delta = (new_score or 0) - (old_score or 0)
+    if score_delta:
+        changes['score_sum'] = F('score_sum') + score_delta
+    if old_score is None:
+        changes['score_count'] = F('score_count') + 1
+    elif new_score is None:
+        changes['score_count'] = F('score_count') - 1
+    if old_score is not None:
+        changes[f'count_{old_score}'] = F(f'count_{old_score}') - 1
+    if new_score is not None:
+        changes[f'count_{new_score}'] = F(f'count_{new_score}') + 1
+
+    with transaction.atomic():
+        summary, _ = RatingSummary.objects.get_or_create(
+            content_type_id=content_type_id,
+            object_id=object_id
+        )
+        RatingSummary.objects.filter(pk=summary.pk).update(**changes)
+
+
+def rebuild_rating_summaries(dry_run=False):
+    """
+    Recompute every RatingSummary from the Rating table.
+    Returns the number of summaries that were missing, stale or orphaned.
+    """
+    histogram = {f'count_{score}': Count('id', filter=Q(score=score)) for score in range(1, 6)}
+    rows = Rating.objects.values('content_type_id', 'object_id').annotate(
+        score_sum=Sum('score'),
+        score_count=Count('id'),
+        **histogram
+    ).order_by()
+    expected = {(row['content_type_id'], row['object_id']): row for row in rows}
+
+    fields = ['content_type_id', 'object_id', 'score_sum', 'score_count'] + list(histogram)
+    current = {
+        (row['content_type_id'], row['object_id']): row
+        for row in RatingSummary.objects.values(*fields)
+    }
+    drifted = sum(1 for key, row in expected.items() if current.get(key) != row)
+    drifted += sum(1 for key in current if key not in expected)
+
+    if drifted and not dry_run:
+        with transaction.atomic():
+            RatingSummary.objects.all().delete()
+            RatingSummary.objects.bulk_create(
+                [RatingSummary(**row) for row in expected.values()],
+                batch_size=1000
+            )
+    return drifted
+
+
+def touch_flashcard_set(set_id, *counters, **count_deltas):
+    """
+    Mark a set as edited because one of its cards changed: refresh updatedAt,
+    then bump counters and adjust counts as bump_flashcard_set() does.
+    """
+    _update_flashcard_set(set_id, counters, count_deltas, updatedAt=timezone.now())
+
+
+def bump_flashcard_set(set_id, *counters, **count_deltas):
+    """
+    Record activity on a set that is not an edit of it (comments, ratings,
+    favorites): bump the given version counters ('card_version',
+    'comment_version', 'deck_version', 'stats_version') and adjust its
+    denormalized counts, e.g. favorite_count=1, leaving updatedAt alone.
+    Uses a single UPDATE; counts never drop below zero.
+    """
+    _update_flashcard_set(set_id, counters, count_deltas)
+
+
+def _update_flashcard_set(set_id, counters, count_deltas, **changes):
+    if set_id is None:
+        return
+    for counter in counters:
+        changes[counter] = F(counter) + 1
+    for field, delta in count_deltas.items():
+        if delta > 0:
+            changes[field] = F(field) + delta
+        elif delta < 0:
+            changes[field] = Greatest(F(field) + delta, 0)
+    FlashCardSet.objects.filter(pk=set_id).update(**changes)
+
+
+def bulk_create_flashcards(flashcard_set, cards, batch_size=500):
+    """
+    Insert many cards into one set with bulk_create. bulk_create skips the
+    post_save signals, so the set's counters, validators and search entry are
+    updated here once for the whole batch.
+    `cards` is a list of dicts of FlashCard fields; returns the created cards.
+    """
+    if not cards:
+        return []
+    with transaction.atomic():
+        first = FlashCard.reserve_ordinals(flashcard_set.pk, len(cards))
+        created = FlashCard.objects.bulk_create(
+            [FlashCard(set=flashcard_set, ordinal=first + i, **card) for i, card in enumerate(cards)],
+            batch_size=batch_size
+        )
+        touch_flashcard_set(flashcard_set.pk, 'card_version')
+    search.index_sets([flashcard_set.pk])
+    return created
+
+
+SET_COUNTERS = {
+    'card_count': (FlashCard, 'set'),
+    'comment_count': (Comment, 'flashcard_set'),
+}
+
+
+def rebuild_set_counters(dry_run=False):
+    """
+    Recompute card_count, comment_count and favorite_count of every set.
+    Returns the number of sets whose counts were wrong.
+    """
+    set_ct = ContentType.objects.get_for_model(FlashCardSet)
+    expected = {}
+    for field, (model, set_field) in SET_COUNTERS.items():
+        rows = model.objects.filter(**{f'{set_field}__isnull': False}).values_list(set_field).annotate(n=Count('id')).order_by()
+        expected[field] = dict(rows)
+    favorites = UserFavorite.objects.filter(content_type=set_ct).values_list('object_id').annotate(n=Count('id')).order_by()
+    expected['favorite_count'] = dict(favorites)
+
+    fields = list(expected)
+    stale = []
+    for flashcard_set in FlashCardSet.objects.only('id', *fields).iterator(chunk_size=2000):
+        changed = False
+        for field in fields:
+            count = expected[field].get(flashcard_set.id, 0)
+            if getattr(flashcard_set, field) != count:
+                setattr(flashcard_set, field, count)
+                changed = True
+        if changed:
+            stale.append(flashcard_set)
+
+    if stale and not dry_run:
+        FlashCardSet.objects.bulk_update(stale, fields, batch_size=1000)
+    return len(stale)
+
+
+def close_card_gap(set_id, ordinal):
+    """
+    Keep a set's card ordinals dense after the card at `ordinal` was deleted
+    by moving every later card down one place, so the cards stay in the order
+    they were added. One UPDATE over the (set, ordinal) index.
+    """
+    FlashCard.objects.filter(set_id=set_id, ordinal__gt=ordinal).update(ordinal=F('ordinal') - 1)
+
+
+def rebuild_card_ordinals(dry_run=False, set_ids=None):
+    """
+    Renumber the cards of every set (or of the given sets) 0 .. n - 1,
+    keeping their current order, where gaps or duplicates crept in (e.g. from
+    concurrent inserts or a batch delete).
+    Returns the number of cards whose ordinal was wrong.
+    """
+    cards = FlashCard.objects.all() if set_ids is None else FlashCard.objects.filter(set_id__in=set_ids)
+    ranked = cards.annotate(
+        rank=Window(RowNumber(), partition_by=[F('set_id')], order_by=[F('ordinal').asc(), F('id').asc()])
+    ).values_list('id', 'ordinal', 'rank')
+    stale = [
+        FlashCard(id=card_id, ordinal=rank - 1)
+        for card_id, ordinal, rank in ranked.iterator(chunk_size=2000)
+        if ordinal != rank - 1
+    ]
+    if stale and not dry_run:
+        FlashCard.objects.bulk_update(stale, ['ordinal'], batch_size=1000)
+    return len(stale)
+
+
+def _flashcard_set_validators(request, pk):
+    # Looked up once per request
+    cache = request.__dict__.setdefault('_flashcard_set_validators', {})
+    if pk not in cache:
+        cache[pk] = FlashCardSet.objects.filter(pk=pk).values_list(
+            'updatedAt', 'card_version', 'comment_version', 'stats_version'
+        ).first()
+    return cache[pk]
+
+
+def flashcard_set_etag(request, pk, **kwargs):
+    """
+    ETag for the API representations of a set and its cards. Covers the set's
+    validators and the full path, since ?fields= etc. change the body.
+    Returns None for unknown sets so the view can answer 404 itself.
+    """
+    validators = _flashcard_set_validators(request, pk)
+    if validators is None:
+        return None
+    updated_at, card_version, comment_version, stats_version = validators
+    raw = f"{pk}:{updated_at.isoformat()}:{card_version}:{comment_version}:{stats_version}:{request.get_full_path()}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def pick_random_row(queryset, *fields):
+    """
+    Pick a random row without materializing the queryset: draw an id between
+    the smallest and largest matching id, then take the first match at or above
+    it (or, failing that, the last one below it). Each step is an indexed seek
+    on the primary key. Rows that follow a gap in the ids are slightly more
+    likely to be picked.
+    The bounds are two queries because SQLite only reads a lone MIN() or
+    MAX() from the index; asking for both in one query scans the table.
+    Returns values_list(*fields) for the row, or None if nothing matches.
+    """
+    low = queryset.aggregate(low=Min('id'))['low']
+    if low is None:
+        return None
+    high = queryset.aggregate(high=Max('id'))['high']
+    pivot = random.randint(low, high)
+    rows = queryset.values_list(*fields)
+    return (
+        rows.filter(id__gte=pivot).order_by('id').first()
+        or rows.filter(id__lt=pivot).order_by('-id').first()
+    )
@@ -1,5 +1,5 @@
 # Standard library imports
-import random
+import codecs
 import json
 # Django imports
 from django.contrib import messages
@@ -8,14 +8,14 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Avg, Q
-from django.http import JsonResponse, HttpResponseRedirect
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import JsonResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
-from django.utils import timezone
 from django.utils.decorators import method_decorator
-from django.utils.timezone import now, timedelta
 from django.views import View
+from django.views.decorators.http import condition
 from django.views.generic import (
     CreateView, 
     DeleteView, 
@@ -29,6 +29,7 @@ from django.views.generic import (
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view
 from rest_framework.exceptions import PermissionDenied, Throttled, ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -44,23 +45,41 @@ from .forms import (
 from .models import (
     Collection, 
     Comment, 
-    CreationLimit, 
     FlashCard, 
     FlashCardSet, 
     Rating, 
-    Tag, 
+    StudySession,
     User, 
-    UserDailyCreation, 
     UserFavorite,
 )
+from .parsers import NDJSONParser
+from .pagination import (
+    CollectionCursorPagination,
+    CommentCursorPagination,
+    FlashCardSetCursorPagination,
+    UserCursorPagination,
+)
 from .serializers import (
+    CardScheduleSerializer,
     CollectionSerializer, 
     CommentSerializer, 
     FlashCardSerializer, 
     FlashCardSetSerializer, 
+    FlashCardSetSummarySerializer,
+    ReviewSerializer,
+    StudySessionSerializer,
     UserSerializer,
+    resolve_sparse_fields,
+)
+from .utils import (
+    bulk_create_flashcards,
+    flashcard_set_etag,
+    get_average_rating,
+    get_average_ratings,
+    get_rating_summary,
+    pick_random_row,
 )
-from .utils import get_average_rating
+from . import export, importer, quota, rescheduling, search, study, tags
 
 
 
@@ -71,7 +90,8 @@ from .utils import get_average_rating
 def home_view(request):
     
     if request.user.is_authenticated:
-        flashcard_sets = FlashCardSet.objects.filter(author=request.user).order_by('-createdAt')[:6]  # Get the user's recent 6 sets
+        # Get the user's recent 6 sets, with only the columns the page shows
+        flashcard_sets = FlashCardSet.objects.filter(author=request.user).only('id', 'name', 'createdAt').order_by('-createdAt')[:6]
     else:
         flashcard_sets = None
     return render(request, 'index.html', {'flashcard_sets': flashcard_sets})
@@ -108,76 +128,24 @@ def version(request):
     # Used by the frontend footer or any client wanting API version info.
     return Response({"version": "1.0.0"})
 
-def reset_limits_if_needed(user_daily):
-    one_hour_ago = now() - timezone.timedelta(hours=1)
-    if user_daily.last_reset < one_hour_ago:
-        user_daily.flashcards_created = 0
-        user_daily.sets_created = 0
-        user_daily.collections_created = 0
-        user_daily.last_reset = now()
-        user_daily.save()
-
-def within_limit(user_daily, creation_limit, item_type):
-    if item_type == 'set':
-        created = user_daily.sets_created
-        limit = creation_limit.daily_set_limit
-    elif item_type == 'flashcard':
-        created = user_daily.flashcards_created
-        limit = creation_limit.daily_flashcard_limit
-    elif item_type == 'collection':
-        created = user_daily.collections_created
-        limit = creation_limit.daily_collection_limit
-    else:
-        return True, None
-
-    if created >= limit:
-        return False, f"You have reached your hourly {item_type} creation limit."
-    else:
-        # Warn if user is nearing limit 
-        remaining = limit - created
-        threshold = limit // 2
-        warning_msg = None
-        if remaining <= threshold and remaining > 0:
-            warning_msg = (f"You are nearing your hourly {item_type} creation limit. "
-                           f"You can only create {remaining} more {item_type}(s) this hour.")
-        return True, warning_msg
-
-
-
-
-def can_create_item(user, daily_field, limit_field, item_type_str):
-    """
-    Check if the user can create one more item (flashcard/set/collection).
-    user: current user
-    daily_field: str, name of the UserDailyCreation field ('sets_created', 'flashcards_created', 'collections_created')
-    limit_field: str, name of the CreationLimit field ('daily_set_limit', 'daily_flashcard_limit', 'daily_collection_limit')
-    item_type_str: str, human-readable type name ('set', 'collection', 'flashcard')
-
-    Returns True if can create, False if limit exceeded.
-    Also sets warning or error messages using Django messages.
-    """
-    today = timezone.now().date()
-    user_daily, _ = UserDailyCreation.objects.get_or_create(user=user, date=today)
-    creation_limit, _ = CreationLimit.objects.get_or_create(pk=1)
-
-    daily_created = getattr(user_daily, daily_field)
-    limit = getattr(creation_limit, limit_field)
-
-    # If limit is 0 or None, treat as no limit
-    if limit == 0:
-        return True
-
-    # Check if limit exceeded
-    if daily_created >= limit:
-        messages.error(user, f"You have reached the daily {item_type_str} creation limit ({limit}).")
-        return False
-
-    # If halfway or beyond the limit, show a warning
-    if daily_created >= limit / 2:
-        left = limit - daily_created
-        messages.warning(user, f"You are nearing your daily {item_type_str} creation limit. Only {left} {item_type_str}(s) left today.")
+# A study session with its window of cards from `start`, as returned by the study session API.
+def study_session_window(session, start, limit=study.WINDOW_SIZE):
+    data = StudySessionSerializer(session).data
+    end = start + limit
+    data.update(
+        start=start,
+        cards=[
+            {**FlashCardSerializer(card).data, 'position': position}
+            for position, card in study.session_window(session, start, limit)
+        ],
+        next=end if end < session.card_total else None,
+    )
+    return data
 
-    return True
+# Tells the user how much of today's allowance is left once half of it is used.
+def notify_allowance(request, item_type, allowance):
+    if allowance.limit and allowance.remaining <= allowance.limit // 2:
+        messages.warning(request, f"You can create {allowance.remaining} more {item_type}(s) today.")
 
 
 
@@ -194,7 +162,8 @@ class FlashCardSetListView(LoginRequiredMixin, ListView):
     context_object_name = 'sets'
 
     def get_queryset(self):
-        return FlashCardSet.objects.filter(author=self.request.user)
+        # The template lists every set's tags
+        return FlashCardSet.objects.filter(author=self.request.user).prefetch_related('tags')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -214,24 +183,19 @@ class FlashCardSetCreateView(LoginRequiredMixin, CreateView):
     template_name = 'sets/add.html'
 
     def form_valid(self, form):
-        today = timezone.now().date()
         user = self.request.user
-        user_daily, _ = UserDailyCreation.objects.get_or_create(user=user, date=today)
-        creation_limit, _ = CreationLimit.objects.get_or_create(pk=1)
 
-        # Check daily set limit
-        if user_daily.sets_created >= creation_limit.daily_set_limit and not user.is_superuser:
-            messages.error(self.request, f"You have reached the daily limit of {creation_limit.daily_set_limit} sets.")
+        # Reserve one set from the daily limit and create the set in one transaction
+        try:
+            with transaction.atomic():
+                allowance = quota.consume(user, 'set')
+                obj = form.save(commit=False)
+                obj.author = user
+                obj.save()
+        except quota.QuotaExceeded as exc:
+            messages.error(self.request, str(exc))
             return self.form_invalid(form)
-        
-        # If passed the check, create the set
-        obj = form.save(commit=False)
-        obj.author = user
-        obj.save()
-
-        # Increment daily count
-        user_daily.sets_created += 1
-        user_daily.save()
+        notify_allowance(self.request, 'set', allowance)
 
         # Redirect to sets list after creation
         return HttpResponseRedirect(reverse('flashcard-set-list'))
@@ -275,18 +239,19 @@ class FlashCardSetDetailView(LoginRequiredMixin, DetailView):
      # Gathers flashcards, comments, and rating info for display
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Retrieve flashcards with 'id', 'question', 'answer', and now 'difficulty' to ensure the difficulty level is available in the JSON data
-        context['flashcards'] = list(self.object.cards.values('id', 'question', 'answer', 'difficulty'))
+        # Only the window of cards around the user's place in their study
+        # session; the page fetches the others from the session API as needed
+        session = study.current_session(self.request.user, self.object)
+        start = session.position - session.position % study.WINDOW_SIZE
+        context['study_window'] = study_session_window(session, start)
+        context['study_window_size'] = study.WINDOW_SIZE
 
         # Retrieve comments for display
-        content_type = ContentType.objects.get_for_model(FlashCardSet)
-        comments = Comment.objects.filter(content_type=content_type, object_id=self.object.id).order_by('-created_at')
-        context['comments'] = comments
+        context['comments'] = Comment.objects.for_set(self.object)
         context['comment_form'] = CommentForm()
 
         # Calculate the average rating 
-        average_rating = Rating.objects.filter(content_type=content_type, object_id=self.object.id).aggregate(Avg('score'))['score__avg'] or 0
-        context['average_rating'] = round(average_rating, 1)
+        context['average_rating'] = get_average_rating(self.object)
 
         return context
 
@@ -298,7 +263,7 @@ class FlashCardSetDetailView(LoginRequiredMixin, DetailView):
             if form.is_valid():
                 comment = form.save(commit=False)
                 comment.author = request.user
-                comment.content_object = self.object
+                comment.flashcard_set = self.object
                 comment.save()
                 return redirect('flashcard-set-detail', pk=self.object.pk)
         return super().get(request, *args, **kwargs)
@@ -329,23 +294,18 @@ class FlashCardCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         user = self.request.user
-        today = timezone.now().date()
-        user_daily, _ = UserDailyCreation.objects.get_or_create(user=user, date=today)
-        creation_limit, _ = CreationLimit.objects.get_or_create(pk=1)
 
-        # Check daily flashcard limit
-        if user_daily.flashcards_created >= creation_limit.daily_flashcard_limit and not user.is_superuser:
-            messages.error(self.request, f"You have reached the daily limit of {creation_limit.daily_flashcard_limit} flashcards.")
+        # Reserve one flashcard from the daily limit and create it in one transaction
+        try:
+            with transaction.atomic():
+                allowance = quota.consume(user, 'flashcard')
+                obj = form.save(commit=False)
+                obj.set = self.flashcard_set
+                obj.save()
+        except quota.QuotaExceeded as exc:
+            messages.error(self.request, str(exc))
             return self.form_invalid(form)
-
-        # Create the flashcard
-        obj = form.save(commit=False)
-        obj.set = self.flashcard_set
-        obj.save()
-
-        # Increment daily count
-        user_daily.flashcards_created += 1
-        user_daily.save()
+        notify_allowance(self.request, 'flashcard', allowance)
 
         # Redirect to the add_more page after creation
         return HttpResponseRedirect(reverse('flashcard-add-more', kwargs={'pk': self.flashcard_set.pk}))
@@ -377,7 +337,7 @@ class CommentList(APIView):
     
     def get(self, request, pk):
         flashcard_set = get_object_or_404(FlashCardSet, pk=pk)
-        comments = Comment.objects.filter(flashcard_set=flashcard_set)
+        comments = Comment.objects.for_set(flashcard_set)
         serializer = CommentSerializer(comments, many=True)
         return Response(serializer.data)
 
@@ -409,10 +369,6 @@ class CommentDeleteView(LoginRequiredMixin, DeleteView):
 
     def get_success_url(self):
         flashcard_set = self.object.flashcard_set
-        if not flashcard_set:
-            # If flashcard_set is None, comment should have a content_object that's a FlashCardSet
-            if self.object.content_object and isinstance(self.object.content_object, FlashCardSet):
-                flashcard_set = self.object.content_object
         if flashcard_set:
             return reverse_lazy('flashcard-set-detail', kwargs={'pk': flashcard_set.id})
         return reverse_lazy('flashcard-set-list')
@@ -441,8 +397,6 @@ class CommentUpdateView(LoginRequiredMixin, UpdateView):
     def get_success_url(self):
 
         flashcard_set = self.object.flashcard_set
-        if not flashcard_set and self.object.content_object and isinstance(self.object.content_object, FlashCardSet):
-            flashcard_set = self.object.content_object
         if flashcard_set:
             return reverse_lazy('flashcard-set-detail', kwargs={'pk': flashcard_set.id})
         return reverse_lazy('flashcard-set-list')
@@ -453,6 +407,8 @@ class CommentUpdateView(LoginRequiredMixin, UpdateView):
 # Returns a list of sets matching the query.
 class SearchView(LoginRequiredMixin, TemplateView):
     template_name = 'search/results.html'
+    max_set_results = 200
+    max_tag_results = 50
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -470,27 +426,21 @@ class SearchView(LoginRequiredMixin, TemplateView):
             })
             return context
 
-        # Find tags matching the query
-        matching_tags = Tag.objects.filter(name__icontains=query)
+        # Find tags with a word starting with the query, most used first
+        matching_tags = tags.tag_index.search(query, limit=self.max_tag_results)
 
-        # Find sets matching by name, question in cards, or tags
-        sets_query = FlashCardSet.objects.filter(
-            Q(name__icontains=query) | 
-            Q(cards__question__icontains=query) | 
-            Q(tags__in=matching_tags)
-        ).distinct()
+        # Find sets matching by name, question in cards, or tags, best match first
+        sets_query = search.search_sets(query, limit=self.max_set_results)
 
         # Find collections by name
-        collections_query = Collection.objects.filter(name__icontains=query)
+        collections_query = Collection.objects.filter(name__icontains=query).select_related('author')
 
         # Find users by username
         users_query = User.objects.filter(username__icontains=query)
 
-        # Calculate ratings for sets
-        rated_sets = []
-        for s in sets_query:
-            avg_rating = get_average_rating(s)  # This should return a float rating
-            rated_sets.append({'object': s, 'rating': avg_rating})
+        # Calculate ratings for all matched sets in one query
+        ratings = get_average_ratings(sets_query)
+        rated_sets = [{'object': s, 'rating': ratings[s.id]} for s in sets_query]
 
         rated_collections = list(collections_query)
         found_tags = list(matching_tags)
@@ -523,6 +473,89 @@ class SearchView(LoginRequiredMixin, TemplateView):
 
 
 
+# JSON search over flashcard sets, answered from the full-text index.
+# GET /api/search/?q=<text>&limit=<n>
+class SearchAPIView(APIView):
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, self.max_limit))
+
+        results = search.search_sets(query, limit=limit) if query else []
+        serializer = FlashCardSetSummarySerializer(results, many=True)
+        return Response({'query': query, 'results': serializer.data})
+
+
+
+# Suggests tags for a prefix from the in-memory tag index, most used first.
+class TagAutocompleteAPIView(APIView):
+    default_limit = 10
+    max_limit = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, self.max_limit))
+
+        suggestions = tags.tag_index.search(query, limit=limit)
+        return Response({
+            'query': query,
+            'results': [{'name': tag.name, 'set_count': tag.set_count} for tag in suggestions],
+        })
+
+# Streams the user's sets (with cards, tags and rating summary) and collections
+# as NDJSON. Superusers can export another user with ?user=<id> or the whole
+# site with ?all=true.
+class ExportAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        author = request.user
+        if request.user.is_superuser:
+            if request.query_params.get('all', '').lower() in ('true', '1', 'yes'):
+                author = None
+            elif request.query_params.get('user'):
+                user_id = request.query_params['user']
+                if not user_id.isdigit():
+                    return Response({'error': 'user must be a user id'}, status=status.HTTP_400_BAD_REQUEST)
+                author = get_object_or_404(User, pk=user_id)
+        elif 'user' in request.query_params or 'all' in request.query_params:
+            raise PermissionDenied('Only admins can export other users.')
+
+        response = StreamingHttpResponse(export.iter_ndjson(author=author), content_type='application/x-ndjson')
+        filename = f"flashcards-{author.username if author else 'all'}.ndjson"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+# Imports sets and cards from an uploaded CSV or NDJSON file (multipart field
+# "file"). The file is read and written chunk by chunk, and the response streams
+# one NDJSON event per rejected row, per finished chunk and a final summary.
+class ImportAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['Upload a CSV or NDJSON file.']})
+        file_format = request.data.get('format') or ('csv' if upload.name.lower().endswith('.csv') else 'ndjson')
+        if file_format not in importer.FORMATS:
+            raise ValidationError({'format': [f"Use one of: {', '.join(importer.FORMATS)}."]})
+
+        lines = codecs.iterdecode(upload, 'utf-8-sig')
+        rows = importer.iter_csv_rows(lines) if file_format == 'csv' else importer.iter_ndjson_rows(lines)
+        events = (json.dumps(event) + '\n' for event in importer.run_import(rows, request.user))
+        return StreamingHttpResponse(events, content_type='application/x-ndjson')
     
 # Updates an existing flashcard set.
 # Checks permissions so only the author can update.
@@ -537,18 +570,10 @@ class FlashCardSetUpdateView(LoginRequiredMixin, UpdateView):
     def form_valid(self, form):
         response = super().form_valid(form)
         # After the set is saved, handle tags
-        tag_names = self.request.POST.get('tag_names', '')
-        tag_list = [t.strip() for t in tag_names.split(',') if t.strip()]
-
-        # Create any new tags not in DB
-        from .models import Tag
-        final_tags = []
-        for name in tag_list:
-            tag, created = Tag.objects.get_or_create(name=name)
-            final_tags.append(tag)
-
-        # Assign the tags to the instance
-        self.object.tags.set(final_tags)
+        tag_list = tags.parse_tag_names(self.request.POST.get('tag_names', ''))
+
+        # Create any new tags and write only the changed memberships
+        tags.set_tags(self.object, tag_list)
         return response
 
     def get_success_url(self):
@@ -562,7 +587,10 @@ class CollectionListView(LoginRequiredMixin, ListView):
     context_object_name = 'collections'
 
     def get_queryset(self):
-        return Collection.objects.filter(author=self.request.user)
+        # The template links every set in each collection
+        return Collection.objects.filter(author=self.request.user).prefetch_related(
+            Prefetch('sets', queryset=FlashCardSet.objects.only('id', 'name'))
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -579,23 +607,18 @@ class CollectionCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         user = self.request.user
-        today = timezone.now().date()
-        user_daily, _ = UserDailyCreation.objects.get_or_create(user=user, date=today)
-        creation_limit, _ = CreationLimit.objects.get_or_create(pk=1)
 
-        # Check daily collection limit
-        if user_daily.collections_created >= creation_limit.daily_collection_limit and not user.is_superuser:
-            messages.error(self.request, f"You have reached the daily limit of {creation_limit.daily_collection_limit} collections.")
+        # Reserve one collection from the daily limit and create it in one transaction
+        try:
+            with transaction.atomic():
+                allowance = quota.consume(user, 'collection')
+                obj = form.save(commit=False)
+                obj.author = user
+                obj.save()
+        except quota.QuotaExceeded as exc:
+            messages.error(self.request, str(exc))
             return self.form_invalid(form)
-
-        # Create the collection
-        obj = form.save(commit=False)
-        obj.author = user
-        obj.save()
-
-        # Increment daily count
-        user_daily.collections_created += 1
-        user_daily.save()
+        notify_allowance(self.request, 'collection', allowance)
 
         # Redirect to collections list after creation
         return HttpResponseRedirect(reverse('collection-list'))
@@ -697,49 +720,96 @@ class RemoveSetFromCollection(LoginRequiredMixin, View):
 # FlashCardSet API Views
 
 
+# Consumes the user's daily creation quota for API creates. Exceeding it answers
+# 429, and successful creates report what is left in an X-Quota-Remaining header.
+class CreationQuotaMixin:
+    quota_allowance = None
+
+    def consume_quota(self, item_type, amount=1):
+        try:
+            self.quota_allowance = quota.consume(self.request.user, item_type, amount)
+        except quota.QuotaExceeded as exc:
+            raise Throttled(detail=str(exc))
+        return self.quota_allowance
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.quota_allowance is not None and self.quota_allowance.remaining is not None:
+            response['X-Quota-Remaining'] = str(self.quota_allowance.remaining)
+        return response
+
+
+# Reads ?fields= and ?include= (comma-separated) on GET requests and hands them to
+# the serializer. get_requested_fields() lets get_queryset skip unneeded joins.
+class SparseFieldsAPIMixin:
+
+    def _query_list(self, name):
+        if self.request.method not in permissions.SAFE_METHODS or name not in self.request.query_params:
+            return None
+        raw = self.request.query_params.get(name, '')
+        return [part.strip() for part in raw.split(',') if part.strip()]
+
+    def get_requested_fields(self):
+        serializer_class = self.get_serializer_class()
+        return resolve_sparse_fields(
+            serializer_class.Meta.fields,
+            getattr(serializer_class, 'optional_fields', ()),
+            self._query_list('fields'),
+            self._query_list('include'),
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self._query_list('fields')
+        context['include'] = self._query_list('include')
+        return context
+
 
 # Lists all flashcard sets, and allows creating a new one if within daily limit.
-class FlashCardSetListCreateAPIView(generics.ListCreateAPIView):
-    queryset = FlashCardSet.objects.all()
+class FlashCardSetListCreateAPIView(CreationQuotaMixin, SparseFieldsAPIMixin, generics.ListCreateAPIView):
     serializer_class = FlashCardSetSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = FlashCardSetCursorPagination
+
+    def get_queryset(self):
+        return FlashCardSet.objects.with_api_relations(self.get_requested_fields())
 
     def perform_create(self, serializer):
         user = self.request.user
-        today = timezone.now().date()
-        user_daily, _ = UserDailyCreation.objects.get_or_create(user=user, date=today)
-        creation_limit = CreationLimit.objects.get(pk=1)
 
-        if user_daily.sets_created >= creation_limit.daily_set_limit and not user.is_superuser:
-            raise Throttled(detail=f"You have reached the daily limit of {creation_limit.daily_set_limit} sets.")
+        tag_list = tags.parse_tag_names(self.request.data.get('tag_names', ''))
+        if len(tag_list) > tags.MAX_TAGS_PER_SET:
+            raise ValidationError(f"A set cannot have more than {tags.MAX_TAGS_PER_SET} tags.")
 
-        tag_names = self.request.data.get('tag_names', '')
-        tag_list = [t.strip() for t in tag_names.split(',') if t.strip()]
-        if len(tag_list) > 8:
-            raise ValidationError("A set cannot have more than 8 tags.")
+        # The quota, the set and its tags are committed together or not at all
+        with transaction.atomic():
+            self.consume_quota('set')
+            set_obj = serializer.save(author=user)
+            tags.set_tags(set_obj, tag_list)
 
-        set_obj = serializer.save(author=user)
-        user_daily.sets_created += 1
-        user_daily.save()
 
-        # Assign tags
-        from .models import Tag
-        tags = []
-        for name in tag_list:
-            tag_obj, created = Tag.objects.get_or_create(name=name)
-            tags.append(tag_obj)
-        set_obj.tags.set(tags)
+# Answers conditional GETs (If-None-Match) for a set and its cards with 304 Not
+# Modified before anything is serialized. There is no Last-Modified: updatedAt
+# does not follow comments, ratings or favorites, and HTTP dates cannot tell
+# apart two changes in the same second.
+flashcard_set_conditional = method_decorator(
+    condition(etag_func=flashcard_set_etag),
+    name='get',
+)
 
 
 # Retrieves, updates, or deletes a single flashcard set.
 # Checks permissions to ensure only the author can modify or delete.
-class FlashCardSetRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = FlashCardSet.objects.all()
+@flashcard_set_conditional
+class FlashCardSetRetrieveUpdateDestroyAPIView(SparseFieldsAPIMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = FlashCardSetSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        return FlashCardSet.objects.with_api_relations(self.get_requested_fields())
+
     def perform_update(self, serializer):
-        if self.request.user != self.get_object().author:
+        if self.request.user != serializer.instance.author:
             raise PermissionDenied('You are not allowed to update this flashcard set.')
         serializer.save()
 
@@ -760,7 +830,8 @@ class FlashCardSetRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPI
 
 
 # Lists flashcards for a given set and allows creating new ones if not hitting the daily limit.
-class FlashCardListCreateAPIView(generics.ListCreateAPIView):
+@flashcard_set_conditional
+class FlashCardListCreateAPIView(CreationQuotaMixin, generics.ListCreateAPIView):
     serializer_class = FlashCardSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
@@ -769,25 +840,54 @@ class FlashCardListCreateAPIView(generics.ListCreateAPIView):
         return FlashCard.objects.filter(set_id=pk)
 
     def perform_create(self, serializer):
-        user = self.request.user
-        today = timezone.now().date()
-
         pk = self.kwargs['pk']
         flashcard_set = get_object_or_404(FlashCardSet, id=pk)
 
-        # Get or create the UserDailyCreation instance for the user and today
-        user_daily_creation, _ = UserDailyCreation.objects.get_or_create(user=user, date=today)
+        # Reserve one flashcard from the daily limit and create it in one transaction
+        with transaction.atomic():
+            self.consume_quota('flashcard')
+            serializer.save(set=flashcard_set)
 
-        # Get the global creation limits
-        creation_limit, _ = CreationLimit.objects.get_or_create(pk=1)
+# Creates many flashcards in a set at once, from a JSON array or NDJSON body.
+# The whole batch is validated in one pass, charged against the daily limit once
+# and inserted with bulk_create; the response reports a result per item.
+class FlashCardBulkCreateAPIView(CreationQuotaMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser]
+    max_batch_size = 1000
+
+    def post(self, request, pk):
+        flashcard_set = get_object_or_404(FlashCardSet, pk=pk)
+        if request.user != flashcard_set.author and not request.user.is_superuser:
+            raise PermissionDenied('You are not allowed to add flashcards to this set.')
+
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'error': 'Expected a non-empty list of flashcards.'})
+        if len(items) > self.max_batch_size:
+            raise ValidationError({'error': f'At most {self.max_batch_size} flashcards can be created per request.'})
+
+        valid, results = [], []
+        for index, item in enumerate(items):
+            card = FlashCardSerializer(data=item)
+            if card.is_valid():
+                valid.append((index, card.validated_data))
+            else:
+                results.append({'index': index, 'status': 'error', 'errors': card.errors})
+        if not valid:
+            return Response({'created': 0, 'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            self.consume_quota('flashcard', amount=len(valid))
+            created = bulk_create_flashcards(flashcard_set, [data for _, data in valid])
+
+        for (index, _), card in zip(valid, created):
+            results.append({'index': index, 'status': 'created', 'card': FlashCardSerializer(card).data})
+        results.sort(key=lambda result: result['index'])
+
+        response_status = status.HTTP_201_CREATED if len(created) == len(items) else status.HTTP_207_MULTI_STATUS
+        return Response({'created': len(created), 'results': results}, status=response_status)
 
-        # Check if the user has exceeded the daily flashcard creation limit
-        if user_daily_creation.flashcards_created >= creation_limit.daily_flashcard_limit and not user.is_superuser:
-            raise Throttled(detail='You have reached the daily limit of {} flashcards.'.format(creation_limit.daily_flashcard_limit))
-        else:
-            serializer.save(set=flashcard_set)
-            user_daily_creation.flashcards_created += 1
-            user_daily_creation.save()
 
 # Retrieves, updates, or deletes a single flashcard.
 # Usually restricted to the set's author.
@@ -806,10 +906,11 @@ class FlashCardRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIVie
 class CommentListCreateAPIView(generics.ListCreateAPIView):
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CommentCursorPagination
 
     def get_queryset(self):
         pk = self.kwargs['pk']
-        return Comment.objects.filter(flashcard_set_id=pk)
+        return Comment.objects.for_set(pk)
 
     def perform_create(self, serializer):
         pk = self.kwargs['pk']
@@ -822,12 +923,13 @@ class CommentListCreateAPIView(generics.ListCreateAPIView):
 
 
 # Lists all users and creates new users.
-class UserListCreateAPIView(generics.ListCreateAPIView):
+class UserListCreateAPIView(SparseFieldsAPIMixin, generics.ListCreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = UserCursorPagination
 
 
-class UserRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class UserRetrieveUpdateDestroyAPIView(SparseFieldsAPIMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
@@ -838,12 +940,13 @@ class UserRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # Lists all flashcard sets created by a specific user.
-class UserFlashCardSetListAPIView(generics.ListAPIView):
+class UserFlashCardSetListAPIView(SparseFieldsAPIMixin, generics.ListAPIView):
     serializer_class = FlashCardSetSerializer
+    pagination_class = FlashCardSetCursorPagination
 
     def get_queryset(self):
         user_id = self.kwargs['userId']
-        return FlashCardSet.objects.filter(author_id=user_id)
+        return FlashCardSet.objects.filter(author_id=user_id).with_api_relations(self.get_requested_fields())
 
 
 
@@ -851,17 +954,18 @@ class UserFlashCardSetListAPIView(generics.ListAPIView):
 
 
 # Lists all collections created by a specific user.
-class UserCollectionListAPIView(generics.ListAPIView):
+class UserCollectionListAPIView(SparseFieldsAPIMixin, generics.ListAPIView):
     serializer_class = CollectionSerializer
+    pagination_class = CollectionCursorPagination
 
     def get_queryset(self):
         user_id = self.kwargs['userId']
-        return Collection.objects.filter(author_id=user_id)
+        return Collection.objects.filter(author_id=user_id).select_related('author')
 
 # Retrieves, updates, or deletes a specific collection by a user.
 # Ensure permission checks are in place.
-class UserCollectionRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Collection.objects.all()
+class UserCollectionRetrieveUpdateDestroyAPIView(SparseFieldsAPIMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Collection.objects.select_related('author')
     serializer_class = CollectionSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
@@ -874,38 +978,49 @@ class UserCollectionRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyA
 
 # Lists all collections and allows creating new ones.
 # Associates the new collection with the current user.
-class CollectionListCreateAPIView(generics.ListCreateAPIView):
-    queryset = Collection.objects.all()
+class CollectionListCreateAPIView(CreationQuotaMixin, SparseFieldsAPIMixin, generics.ListCreateAPIView):
+    queryset = Collection.objects.select_related('author')
     serializer_class = CollectionSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CollectionCursorPagination
 
     def perform_create(self, serializer):
-        user = self.request.user
-        today = timezone.now().date()
-        user_daily, _ = UserDailyCreation.objects.get_or_create(user=user, date=today)
-        creation_limit = CreationLimit.objects.get(pk=1)
-
-        if user_daily.collections_created >= creation_limit.daily_collection_limit and not user.is_superuser:
-            raise Throttled(detail=f"You have reached the daily limit of {creation_limit.daily_collection_limit} collections.")
-
         # No sets required, no comment required; just save it
-        serializer.save(author=user)
-        user_daily.collections_created += 1
-        user_daily.save()
+        with transaction.atomic():
+            self.consume_quota('collection')
+            serializer.save(author=self.request.user)
 
 # Redirects to a random collection's detail page if collections exist.
-# Otherwise returns a 404.
+# Otherwise returns a 404. Optional ?author=<user id> and ?tag=<tag name> filters
+# narrow the pick to that user's collections or collections holding a set with the tag.
 class RandomCollectionRedirectView(APIView):
     def get(self, request):
         collections = Collection.objects.all()
-        if collections.exists():
-            random_collection = random.choice(collections)
-            return redirect(reverse('api-user-collection-detail', kwargs={
-                'userId': random_collection.author.id,
-                'collectionId': random_collection.id
-            }))
-        else:
+
+        author = request.query_params.get('author')
+        if author:
+            if not author.isdigit():
+                return Response({'error': 'author must be a user id'}, status=status.HTTP_400_BAD_REQUEST)
+            collections = collections.filter(author_id=int(author))
+
+        tag = request.query_params.get('tag')
+        if tag:
+            # The ids of the matching collections, found from the tag's side, so the
+            # pick looks them up by id instead of testing every collection
+            tagged = Collection.sets.through.objects.filter(
+                flashcardset__tags__name=tags.normalize_tag_name(tag),
+            ).values('collection_id')
+            collections = collections.filter(id__in=tagged)
+
+        picked = pick_random_row(collections, 'id', 'author_id')
+        if picked is None:
             return Response({'error': 'There are no flashcard set collections'}, status=status.HTTP_404_NOT_FOUND)
+
+        collection_id, author_id = picked
+        return redirect(reverse('api-user-collection-detail', kwargs={
+            'userId': author_id,
+            'collectionId': collection_id
+        }))
         
 
 
@@ -920,7 +1035,7 @@ class RateItemView(LoginRequiredMixin, View):
         content_type = ContentType.objects.get(model=model_name)
         obj = content_type.get_object_for_this_type(id=object_id)
 
-        # Save or update the rating
+        # Save or update the rating; the rating summary is adjusted in the same transaction
         Rating.objects.update_or_create(
             user=request.user,
             content_type=content_type,
@@ -928,11 +1043,8 @@ class RateItemView(LoginRequiredMixin, View):
             defaults={'score': score}
         )
 
-        # Calculate new average rating
-        average_rating = Rating.objects.filter(
-            content_type=content_type,
-            object_id=object_id
-        ).aggregate(Avg('score'))['score__avg']
+        # Read the new average from the running totals
+        average_rating = get_rating_summary(content_type, object_id).average
 
         return JsonResponse({'average_rating': average_rating})
     
@@ -999,7 +1111,7 @@ class UserFavouritesView(LoginRequiredMixin, TemplateView):
         set_ct = ContentType.objects.get_for_model(FlashCardSet)
         favourite_entries = UserFavorite.objects.filter(user=self.request.user, content_type=set_ct)
         set_ids = favourite_entries.values_list('object_id', flat=True)
-        favourite_sets = FlashCardSet.objects.filter(pk__in=set_ids)
+        favourite_sets = FlashCardSet.objects.filter(pk__in=set_ids).select_related('author')
         context['favourite_sets'] = favourite_sets
         return context
     
@@ -1036,17 +1148,120 @@ class ToggleFavoriteView(LoginRequiredMixin, APIView):
 
 
 class StudyModeView(LoginRequiredMixin, TemplateView):
-    """Displays flashcards in study mode where the user can guess the answer."""
+    """
+    Study mode for a set. The page starts with the user's first batch of due
+    cards and fetches the next batch from the study API as grades are posted.
+    """
     template_name = 'sets/study.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         flashcard_set = get_object_or_404(FlashCardSet, pk=self.kwargs['pk'])
 
-        # Fetch flashcards from this set
-        flashcards = list(flashcard_set.cards.values('question', 'answer'))
+        study.ensure_enrolled(self.request.user, flashcard_set)
+        due = study.due_cards(self.request.user, flashcard_set)
 
         # Convert flashcards to JSON so we can use them easily in JS
-        context['flashcards_json'] = json.dumps(flashcards)
+        context['flashcards_json'] = json.dumps(
+            [{'id': schedule.card.id, 'question': schedule.card.question, 'answer': schedule.card.answer} for schedule in due]
+        )
         context['set'] = flashcard_set
-        return context
\ No newline at end of file
+        return context
+
+
+# The user's next due cards, optionally in one set (?set=<id>), earliest first.
+# Only one batch (?limit=, default 20) is returned; next_due_at tells the client
+# when the first card that is not due yet becomes due.
+class StudyNextAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', study.BATCH_SIZE))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, study.MAX_BATCH_SIZE))
+
+        flashcard_set = None
+        set_id = request.query_params.get('set')
+        if set_id is not None:
+            if not set_id.isdigit():
+                return Response({'error': 'set must be a set id'}, status=status.HTTP_400_BAD_REQUEST)
+            flashcard_set = get_object_or_404(FlashCardSet, pk=set_id)
+            study.ensure_enrolled(request.user, flashcard_set)
+
+        due = study.due_cards(request.user, flashcard_set, limit=limit)
+        return Response({
+            'next_due_at': study.next_due_at(request.user, flashcard_set),
+            'results': CardScheduleSerializer(due, many=True).data,
+        })
+
+
+# Records the user's grade for a card and returns its new schedule. The answer
+# (whether it was correct, and optionally latency_ms) is queued for the answer log.
+class StudyReviewAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ReviewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        card, grade, correct = (serializer.validated_data[field] for field in ('card', 'grade', 'correct'))
+        schedule = study.record_review(
+            request.user, card, grade, correct=correct, latency_ms=serializer.validated_data['latency_ms']
+        )
+        return Response(CardScheduleSerializer(schedule).data, status=status.HTTP_201_CREATED)
+
+
+# Starts a study session over a set's cards, in card order or shuffled
+# (POST {"set": <id>, "shuffled": true}), and returns its first window of cards.
+class StudySessionCreateAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = StudySessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = study.start_session(
+            request.user, serializer.validated_data['flashcard_set'], serializer.validated_data.get('shuffled', False)
+        )
+        return Response(study_session_window(session, 0), status=status.HTTP_201_CREATED)
+
+
+# GET returns a window of the session's cards from ?start= (by default the saved
+# position, rounded down to a window) and ?limit=. PATCH {"position": n} saves
+# the user's place so the session resumes there on any device.
+class StudySessionAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_session(self, request, pk):
+        return get_object_or_404(StudySession.objects.select_related('flashcard_set'), pk=pk, user=request.user)
+
+    def get(self, request, pk):
+        session = self.get_session(request, pk)
+        default_start = session.position - session.position % study.WINDOW_SIZE
+        try:
+            start = int(request.query_params.get('start', default_start))
+            limit = int(request.query_params.get('limit', study.WINDOW_SIZE))
+        except ValueError:
+            return Response({'error': 'start and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, study.MAX_WINDOW_SIZE))
+        return Response(study_session_window(session, max(start, 0), limit))
+
+    def patch(self, request, pk):
+        session = self.get_session(request, pk)
+        serializer = StudySessionSerializer(session, data={'position': request.data.get('position')}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+
+# Starts a set over for the current user: every card becomes new and due now.
+class StudyResetAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        set_id = str(request.data.get('set', ''))
+        if not set_id.isdigit():
+            return Response({'error': 'set must be a set id'}, status=status.HTTP_400_BAD_REQUEST)
+        flashcard_set = get_object_or_404(FlashCardSet, pk=set_id)
+        return Response({'reset': rescheduling.reset(request.user, flashcard_set)})
+